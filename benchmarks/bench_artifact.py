@@ -0,0 +1,103 @@
+"""
+Reports size, cold and warm load time, memory and accuracy of the compact model artifact against the joblib model.
+
+Usage: python -m benchmarks.bench_artifact --train-rows 20000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_absolute_error
+
+from constants import TRAIN_DATA_PATH
+from src.etl import DataProcessor
+from src.model import ModelHandler
+
+# Loads a model in a fresh interpreter and prints its load time, the first predict time and the RSS both added, then
+# the time of loading it again from the process-level model cache
+MEASURE_SCRIPT = '''
+import json, os, sys, time
+import numpy as np
+from src.model import ModelHandler
+
+def rss_mb():
+    return int(open('/proc/self/statm').read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+X = np.zeros((1, int(sys.argv[2])), dtype=np.float32)
+rss_before = rss_mb()
+start_time = time.perf_counter()
+model = ModelHandler().load_model(sys.argv[1])
+load_seconds = time.perf_counter() - start_time
+start_time = time.perf_counter()
+model.predict(X)
+predict_seconds = time.perf_counter() - start_time
+rss_added_mb = rss_mb() - rss_before
+ModelHandler().load_model(sys.argv[1])
+stats = ModelHandler.load_stats()
+print(json.dumps({'load_ms': load_seconds * 1000, 'warm_load_ms': stats['warm_ms'],
+                  'first_predict_ms': predict_seconds * 1000, 'rss_mb': rss_added_mb}))
+'''
+
+# Formats compared, with the function writing a model in each
+FORMATS = [
+    ('joblib (compress=3)', lambda model, path: ModelHandler().save_model(model, path, compress=3)),
+    ('joblib (compress=0)', lambda model, path: ModelHandler().save_model(model, path, compress=0)),
+    ('forest (float32 leaves)', lambda model, path: ModelHandler().export_model(model, path)),
+    ('forest (16-bit leaves)', lambda model, path: ModelHandler().export_model(model, path, leaf_bits=16)),
+    ('forest (8-bit leaves)', lambda model, path: ModelHandler().export_model(model, path, leaf_bits=8)),
+]
+
+
+def measure_load(model_path, n_features, repeat=3):
+    """
+    Loads a model file in fresh interpreters and returns the fastest of the measurements.
+    """
+    project_root = Path(__file__).parent.parent
+    runs = [json.loads(subprocess.run([sys.executable, '-c', MEASURE_SCRIPT, model_path, str(n_features)],
+                                      cwd=project_root, check=True, capture_output=True, text=True).stdout)
+            for _ in range(repeat)]
+    return {metric: min(run[metric] for run in runs) for metric in runs[0]}
+
+
+def bench_artifact(train_rows=None):
+    """
+    Trains a forest on the housing data with the default TRAINING_CONFIG, writes it in every format and compares them.
+
+    :param train_rows: Optional cap on the number of training rows.
+    :return: List of dictionaries with the format, file size, load measurements, test MAE, MAE delta against the
+             original model and the largest absolute prediction difference.
+    """
+    processor = DataProcessor()
+    X_train, X_test, y_train, y_test = processor.split_data(*processor.extract_data(str(TRAIN_DATA_PATH)))
+    if train_rows:
+        X_train, y_train = X_train[:train_rows], y_train[:train_rows]
+    model = ModelHandler().train(X_train, y_train)
+    expected = ModelHandler().predict(X_test, model)
+    original_mae = mean_absolute_error(y_test, expected)
+
+    results = []
+    with tempfile.TemporaryDirectory() as model_dir:
+        for i, (name, write) in enumerate(FORMATS):
+            model_path = os.path.join(model_dir, f'model_{i}')
+            write(model, model_path)
+            predictions = ModelHandler().predict(X_test, ModelHandler().load_model(model_path, use_cache=False))
+            mae = mean_absolute_error(y_test, predictions)
+            results.append({'format': name, 'size_mb': os.path.getsize(model_path) / 2 ** 20,
+                            **measure_load(model_path, X_test.shape[1]), 'test_mae': mae,
+                            'mae_delta': mae - original_mae,
+                            'max_abs_diff': float(np.abs(predictions - expected).max())})
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--train-rows', type=int)
+    args = parser.parse_args()
+
+    print(pd.DataFrame(bench_artifact(args.train_rows)).to_string(index=False))
@@ -0,0 +1,61 @@
+"""
+Compares DatabaseHandler.bulk_load against DataFrame.to_sql when writing transformed_data.
+
+Usage: python -m benchmarks.bench_database --rows 1000000 10000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_housing_frame
+from src.database import DatabaseHandler, close_pools
+from src.etl import DataProcessor
+
+
+def make_features(n_rows):
+    """
+    Generates transformed features with the same schema DataProcessor writes.
+
+    :param n_rows: Number of rows to generate.
+    :return: DataFrame of transformed features.
+    """
+    processor = DataProcessor()
+    df, _ = processor.clean_data(make_housing_frame(n_rows, null_fraction=0))
+    return processor.transform_data(df)[0]
+
+
+def bench_database(n_rows):
+    """
+    Writes the same features once with to_sql and once with bulk_load into fresh database files.
+
+    :param n_rows: Number of rows to write.
+    :return: Dictionary with the seconds taken by each method.
+    """
+    df = make_features(n_rows)
+    results = {'rows': len(df)}
+
+    with tempfile.TemporaryDirectory() as database_dir:
+        to_sql_handler = DatabaseHandler(os.path.join(database_dir, 'to_sql.db'))
+        start_time = time.perf_counter()
+        to_sql_handler.save_to_database(df)
+        results['to_sql_seconds'] = time.perf_counter() - start_time
+
+        bulk_load_handler = DatabaseHandler(os.path.join(database_dir, 'bulk_load.db'))
+        start_time = time.perf_counter()
+        bulk_load_handler.bulk_load(df)
+        results['bulk_load_seconds'] = time.perf_counter() - start_time
+        close_pools()
+
+    results['speedup'] = results['to_sql_seconds'] / results['bulk_load_seconds']
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    args = parser.parse_args()
+
+    print(pd.DataFrame([bench_database(n_rows) for n_rows in args.rows]).to_string(index=False))
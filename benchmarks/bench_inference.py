@@ -0,0 +1,62 @@
+"""
+Compares CompiledForest with sklearn's RandomForestRegressor.predict on the production model shape, per batch size.
+
+Usage: python -m benchmarks.bench_inference --batch-sizes 1 10 100 1000 100000 --repeat 20
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_scoring import make_features
+from src.model import ModelHandler
+
+
+def best_seconds(function, X, repeat):
+    """
+    Returns the fastest of repeat calls of function on X.
+    """
+    seconds = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function(X)
+        seconds.append(time.perf_counter() - start_time)
+    return min(seconds)
+
+
+def bench_inference(batch_sizes, repeat=20, train_rows=20_000):
+    """
+    Trains a forest with the default TRAINING_CONFIG and times both engines on batches of every size.
+
+    :param batch_sizes: Numbers of rows per predict call.
+    :param repeat: Number of calls per engine and batch size; the fastest is reported.
+    :param train_rows: Number of rows the benchmark model is trained on.
+    :return: List of dictionaries with the batch size, the seconds of both engines, the speedup and the largest
+             absolute difference between their predictions.
+    """
+    X_train, y_train = make_features(train_rows, random_state=1)
+    model = ModelHandler().train(X_train, y_train)
+    compiled = ModelHandler().compile_model(model)
+    X, _ = make_features(max(batch_sizes))
+
+    results = []
+    for batch_size in batch_sizes:
+        batch = X.iloc[:batch_size]
+        # Large batches are timed fewer times so that the run stays short
+        batch_repeat = max(3, repeat * 100 // max(batch_size, 100))
+        sklearn_seconds = best_seconds(model.predict, batch, batch_repeat)
+        compiled_seconds = best_seconds(compiled.predict, batch, batch_repeat)
+        results.append({'batch_size': batch_size, 'sklearn_ms': sklearn_seconds * 1000,
+                        'compiled_ms': compiled_seconds * 1000, 'speedup': sklearn_seconds / compiled_seconds,
+                        'max_abs_diff': float(np.abs(model.predict(batch) - compiled.predict(batch)).max())})
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 10, 100, 1000, 10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(pd.DataFrame(bench_inference(args.batch_sizes, args.repeat)).to_string(index=False))
@@ -0,0 +1,67 @@
+"""
+Reports ParallelScorer throughput in rows/sec against the number of worker processes.
+
+Usage: python -m benchmarks.bench_scoring --rows 10000000 --workers 1 4 16 32
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_housing_frame
+from src.etl import DataProcessor
+from src.model import ModelHandler
+from src.parallel import ParallelScorer
+
+
+def make_features(n_rows, random_state=0):
+    """
+    Generates transformed features and targets with the same schema DataProcessor produces.
+
+    :param n_rows: Number of rows to generate.
+    :param random_state: Seed of the random generator.
+    :return: Tuple of (features DataFrame, target array).
+    """
+    processor = DataProcessor()
+    df, _ = processor.clean_data(make_housing_frame(n_rows, null_fraction=0, random_state=random_state))
+    return processor.transform_data(df)
+
+
+def bench_scoring(n_rows, worker_counts, train_rows=20_000):
+    """
+    Trains a forest shaped like the production model and scores n_rows rows once per worker count.
+
+    :param n_rows: Number of rows to score.
+    :param worker_counts: Worker counts to benchmark.
+    :param train_rows: Number of rows the benchmark model is trained on.
+    :return: List of dictionaries with workers, seconds and rows/sec.
+    """
+    X_train, y_train = make_features(train_rows, random_state=1)
+    model = ModelHandler().train(X_train, y_train)
+    X, _ = make_features(n_rows)
+
+    results = []
+    with tempfile.TemporaryDirectory() as model_dir:
+        model_path = os.path.join(model_dir, 'model.joblib')
+        ModelHandler().save_model(model, model_path, compress=0)
+
+        for n_workers in worker_counts:
+            with ParallelScorer(model_path, n_workers=n_workers) as scorer:
+                # Start the workers and load the model before timing
+                scorer.predict(X[:n_workers])
+                start_time = time.perf_counter()
+                scorer.predict(X)
+                seconds = time.perf_counter() - start_time
+            results.append({'workers': n_workers, 'seconds': seconds, 'rows_per_sec': len(X) / seconds})
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16, 32])
+    args = parser.parse_args()
+
+    print(pd.DataFrame(bench_scoring(args.rows, args.workers)).to_string(index=False))
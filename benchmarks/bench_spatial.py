@@ -0,0 +1,74 @@
+"""
+Compares regional queries through the spatial index with the filtered table scan they replace.
+
+Usage: python -m benchmarks.bench_spatial --rows 1000000 10000000 --repeat 20
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_database import make_features
+from src.database import DatabaseHandler, close_pools
+
+
+def best_ms(function, repeat):
+    """
+    Returns the fastest of repeat calls of function, in milliseconds, and the result of the last call.
+    """
+    seconds = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = function()
+        seconds.append(time.perf_counter() - start_time)
+    return min(seconds) * 1000, result
+
+
+def bench_spatial(n_rows, repeat=20):
+    """
+    Loads n_rows synthetic rows spread over California and times box, radius and nearest-k queries around random
+    points, along with the same box query as a filtered scan of the table.
+
+    :param n_rows: Number of rows to load.
+    :param repeat: Number of calls per query; the fastest is reported.
+    :return: Dictionary with the load time, the query times and the number of rows each query returned.
+    """
+    df = make_features(n_rows)
+    rng = np.random.default_rng(0)
+    longitude, latitude = rng.uniform(-122, -117), rng.uniform(34, 38)
+    box = (longitude - 0.05, latitude - 0.05, longitude + 0.05, latitude + 0.05)
+    results = {'rows': len(df)}
+
+    with tempfile.TemporaryDirectory() as database_dir:
+        handler = DatabaseHandler(os.path.join(database_dir, 'spatial.db'))
+        start_time = time.perf_counter()
+        handler.bulk_load(df)
+        results['load_seconds'] = time.perf_counter() - start_time
+        del df
+
+        with handler:
+            results['box_ms'], rows = best_ms(lambda: handler.query_box(*box), repeat)
+            results['box_rows'] = len(rows)
+            results['radius_5km_ms'], rows = best_ms(lambda: handler.query_radius(longitude, latitude, 5), repeat)
+            results['radius_rows'] = len(rows)
+            results['nearest_10_ms'], _ = best_ms(lambda: handler.query_nearest(longitude, latitude, 10), repeat)
+            filters = [('longitude', '>=', box[0]), ('longitude', '<=', box[2]),
+                       ('latitude', '>=', box[1]), ('latitude', '<=', box[3])]
+            results['scan_box_ms'], rows = best_ms(lambda: handler.load_from_database(filters=filters), 1)
+            results['scan_rows'] = len(rows)
+        close_pools()
+
+    results['box_speedup'] = results['scan_box_ms'] / results['box_ms']
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(pd.DataFrame([bench_spatial(n_rows, args.repeat) for n_rows in args.rows]).to_string(index=False))
@@ -0,0 +1,113 @@
+"""
+Measures the import time of every main.py subcommand in a fresh interpreter and checks it against a budget.
+
+The imports of a subcommand are read from main.py itself: those of its handler and of every function and
+DataPipeline method the handler reaches, so the benchmark follows the dispatch as main.py changes.
+
+Usage: python -m benchmarks.bench_startup --repeat 5 --budget-scale 1.0
+"""
+import argparse
+import ast
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# Import time budgets in milliseconds, measured on a single core with 1.5x headroom; sklearn alone takes about 1s
+STARTUP_BUDGETS_MS = {
+    'help': 100,
+    'etl': 800,
+    'train': 2500,
+    'tune': 2800,
+    'score': 2500,
+    'predict': 2500,
+    'serve': 2800,
+}
+
+MEASURE_SCRIPT = '''
+import sys, time
+start_time = time.perf_counter()
+import main
+for statement in sys.argv[1:]:
+    exec(statement)
+print((time.perf_counter() - start_time) * 1000)
+'''
+
+
+def command_imports(command):
+    """
+    Returns the import statements main.py runs for a subcommand, following its handler through the functions and
+    methods of main.py it calls. Every branch is followed, so this is the most the subcommand can import.
+
+    :param command: Name of the subcommand, or 'help' for the parser alone.
+    :return: List of import statements, in the order they were found.
+    """
+    sys.path.insert(0, str(PROJECT_ROOT))
+    try:
+        import main
+    finally:
+        sys.path.remove(str(PROJECT_ROOT))
+    handler = main.build_parser().parse_args([] if command == 'help' else [command]).func
+    if handler is None:
+        return []
+
+    tree = ast.parse((PROJECT_ROOT / 'main.py').read_text())
+    functions = {node.name: node for node in ast.walk(tree) if isinstance(node, ast.FunctionDef)}
+    statements, pending, visited = [], [handler.__name__], set()
+    while pending:
+        name = pending.pop()
+        if name in visited:
+            continue
+        visited.add(name)
+        for node in ast.walk(functions[name]):
+            if isinstance(node, (ast.Import, ast.ImportFrom)) and ast.unparse(node) not in statements:
+                statements.append(ast.unparse(node))
+            elif isinstance(node, ast.Call):
+                called = getattr(node.func, 'id', None) or getattr(node.func, 'attr', None)
+                if called in functions:
+                    pending.append(called)
+    return statements
+
+
+def import_time_ms(statements, repeat=5):
+    """
+    Imports main and runs the given import statements in fresh interpreters and returns the fastest import time.
+
+    :param statements: Import statements run after importing main.
+    :param repeat: Number of fresh interpreters to measure.
+    :return: Import time in milliseconds.
+    """
+    return min(float(subprocess.run([sys.executable, '-c', MEASURE_SCRIPT, *statements], cwd=PROJECT_ROOT,
+                                    check=True, capture_output=True, text=True).stdout) for _ in range(repeat))
+
+
+def bench_startup(repeat=5, budget_scale=1.0):
+    """
+    Measures the import time of every subcommand.
+
+    :param repeat: Number of fresh interpreters per subcommand.
+    :param budget_scale: Factor applied to the budgets, for machines slower or faster than the reference one.
+    :return: List of dictionaries with command, import milliseconds, budget and whether it is within budget.
+    """
+    results = []
+    for command in STARTUP_BUDGETS_MS:
+        import_ms = import_time_ms(command_imports(command), repeat)
+        budget_ms = STARTUP_BUDGETS_MS[command] * budget_scale
+        results.append({'command': command, 'import_ms': import_ms, 'budget_ms': budget_ms,
+                        'within_budget': import_ms <= budget_ms})
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget-scale', type=float, default=1.0)
+    args = parser.parse_args()
+
+    results = bench_startup(args.repeat, args.budget_scale)
+    print(f"{'command':>8} {'import_ms':>10} {'budget_ms':>10}")
+    for result in results:
+        print(f"{result['command']:>8} {result['import_ms']:>10.0f} {result['budget_ms']:>10.0f}"
+              f"{'' if result['within_budget'] else '  OVER BUDGET'}")
+    sys.exit(0 if all(result['within_budget'] for result in results) else 1)
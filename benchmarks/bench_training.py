@@ -0,0 +1,48 @@
+"""
+Reports ModelHandler.train fit time against core count on synthetic housing data.
+
+Usage: python -m benchmarks.bench_training --rows 200000 --cores 1 2 4 8 16 32
+"""
+import argparse
+import os
+import time
+
+from benchmarks.synthetic import make_housing_frame
+from src.etl import DataProcessor
+from src.model import ModelHandler
+
+
+def bench_training(n_rows, core_counts, backend='random_forest'):
+    """
+    Fits a model once per core count and measures the wall time of each fit.
+
+    :param n_rows: Number of synthetic rows to train on.
+    :param core_counts: Core counts to benchmark; counts above os.cpu_count() are skipped.
+    :param backend: Training backend, as in TRAINING_CONFIG.
+    :return: List of dictionaries with cores, fit seconds and speedup over the first core count.
+    """
+    processor = DataProcessor()
+    df, _ = processor.clean_data(make_housing_frame(n_rows))
+    X, y = processor.transform_data(df)
+
+    results = []
+    for cores in [cores for cores in core_counts if cores <= os.cpu_count()]:
+        config = {'backend': backend, 'n_jobs': cores, 'max_threads': cores}
+        start_time = time.perf_counter()
+        ModelHandler().train(X, y, config)
+        fit_seconds = time.perf_counter() - start_time
+        results.append({'cores': cores, 'fit_seconds': fit_seconds,
+                        'speedup': results[0]['fit_seconds'] / fit_seconds if results else 1.0})
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--cores', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--backend', default='random_forest', choices=['random_forest', 'hist_gradient_boosting'])
+    args = parser.parse_args()
+
+    print(f"{'cores':>5} {'fit_seconds':>12} {'speedup':>8}")
+    for result in bench_training(args.rows, args.cores, args.backend):
+        print(f"{result['cores']:>5} {result['fit_seconds']:>12.2f} {result['speedup']:>8.2f}")
@@ -0,0 +1,59 @@
+"""
+Compares writing prediction batches synchronously with queuing them on a PredictionWriter.
+
+Usage: python -m benchmarks.bench_writer --batches 2000 --batch-sizes 1 100 1000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.database import DatabaseHandler, close_pools
+from src.writer import PredictionWriter, stamp_predictions
+
+
+def bench_writer(n_batches, batch_size):
+    """
+    Writes n_batches batches of batch_size predictions once with save_predictions_to_database per batch and once
+    through a PredictionWriter, into fresh database files.
+
+    :param n_batches: Number of batches.
+    :param batch_size: Number of predictions per batch.
+    :return: Dictionary with the seconds producers spent writing in both modes, the seconds until the writer had
+             written every row after close, and the number of transactions it used.
+    """
+    predictions = np.random.default_rng(0).random(batch_size)
+    results = {'batches': n_batches, 'batch_size': batch_size}
+
+    with tempfile.TemporaryDirectory() as database_dir:
+        handler = DatabaseHandler(os.path.join(database_dir, 'sync.db'))
+        start_time = time.perf_counter()
+        for _ in range(n_batches):
+            handler.save_predictions_to_database(stamp_predictions(predictions, 'benchmark'))
+        results['sync_seconds'] = time.perf_counter() - start_time
+
+        writer = PredictionWriter(os.path.join(database_dir, 'write_behind.db'))
+        start_time = time.perf_counter()
+        for _ in range(n_batches):
+            writer.put(predictions, 'benchmark')
+        results['put_seconds'] = time.perf_counter() - start_time
+        writer.close()
+        results['written_seconds'] = time.perf_counter() - start_time
+        results['transactions'] = writer.stats['writes']
+        close_pools()
+
+    results['producer_speedup'] = results['sync_seconds'] / results['put_seconds']
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--batches', type=int, default=2000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 100, 1000])
+    args = parser.parse_args()
+
+    print(pd.DataFrame([bench_writer(args.batches, batch_size) for batch_size in args.batch_sizes])
+          .to_string(index=False))
@@ -0,0 +1,74 @@
+"""
+Load generator for the online prediction server reporting p50/p99 latency and throughput.
+
+Start a server first (python -m src.server --port 8080), then:
+Usage: python -m benchmarks.load_generator --port 8080 --requests 10000 --concurrency 64 --batch-size 1
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+import numpy as np
+
+from constants import SERVER_HOST, SERVER_PORT
+from src.predictor import PredictionRunner
+from src.server import PredictionClient
+
+
+async def run_client(host, port, n_requests, batch_size, latencies):
+    """
+    Sends requests one after another over a single keep-alive connection and records each latency.
+
+    :param host: Host of the prediction server.
+    :param port: Port of the prediction server.
+    :param n_requests: Number of requests to send.
+    :param batch_size: Records per request; 1 uses the single-record endpoint.
+    :param latencies: List the request latencies in seconds are appended to.
+    """
+    records = itertools.cycle(PredictionRunner().given_input_data())
+    async with PredictionClient(host, port) as client:
+        for _ in range(n_requests):
+            start_time = time.perf_counter()
+            if batch_size == 1:
+                await client.predict(next(records))
+            else:
+                await client.predict_batch(itertools.islice(records, batch_size))
+            latencies.append(time.perf_counter() - start_time)
+
+
+async def generate_load(host, port, n_requests, concurrency, batch_size):
+    """
+    Runs concurrent clients against the server.
+
+    :return: Dictionary with latency percentiles in milliseconds, requests/sec and records/sec.
+    """
+    latencies = []
+    per_client = [n_requests // concurrency + (i < n_requests % concurrency) for i in range(concurrency)]
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(run_client(host, port, n, batch_size, latencies) for n in per_client if n))
+    seconds = time.perf_counter() - start_time
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'requests_per_sec': len(latencies) / seconds,
+        'records_per_sec': len(latencies) * batch_size / seconds,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default=SERVER_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--requests', type=int, default=10_000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--batch-size', type=int, default=1)
+    args = parser.parse_args()
+
+    results = asyncio.run(generate_load(args.host, args.port, args.requests, args.concurrency, args.batch_size))
+    for name, value in results.items():
+        print(f'{name:>16}: {value:,.2f}')
@@ -0,0 +1,354 @@
+"""
+Runs the hot path of every subsystem on synthetic housing data at several scales and compares against a baseline.
+
+Each case runs in a fresh process and prepares its inputs from the synthetic CSV before the measured section, whose
+peak RSS is measured on its own where the OS allows resetting it (Linux). Results are written as JSON, and a
+baseline file makes the run fail when a metric regresses by more than the threshold.
+
+Usage: python -m benchmarks.run_benchmarks --rows 100000 --baseline benchmarks/baseline.json
+       python -m benchmarks.run_benchmarks --rows 100000 --save-baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.bench_scoring import make_features
+from benchmarks.synthetic import write_housing_csv
+from constants import COLUMN_MAPPING
+from src.schema import CATEGORIES, DUMMY_COLUMNS, INPUT_NUMERIC_COLUMNS, INPUT_CATEGORICAL_COLUMN
+
+# Directory the synthetic CSV files are cached in between runs
+DATA_DIR = Path(__file__).parent / 'data'
+RESULTS_DIR = Path(__file__).parent / 'results'
+
+# Metrics compared against the baseline, with whether higher values are better
+COMPARED_METRICS = {'rows_per_second': True, 'p50_ms': False, 'p99_ms': False, 'peak_rss_mb': False}
+
+
+def reset_peak_rss():
+    """
+    Resets the peak resident set size of the current process to its current size, where the OS supports it (Linux),
+    so that peak_rss_mb covers the measured section only.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of the current process in MiB since the last reset_peak_rss, or over the
+    lifetime of the process where it cannot be reset; ru_maxrss is reported in KiB on Linux.
+    """
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def timed(function, *args, **kwargs):
+    """
+    Calls a function and measures its wall time.
+
+    :return: Tuple of (return value, seconds).
+    """
+    start_time = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start_time
+
+
+def csv_features(csv_path, max_rows=None):
+    """
+    Reads, cleans and transforms the synthetic CSV into the features and target the pipeline works on.
+
+    :param csv_path: Path of the synthetic CSV.
+    :param max_rows: Optional cap on the number of rows returned.
+    :return: Tuple of (features DataFrame, target array).
+    """
+    from src.etl import DataProcessor
+
+    X, y = DataProcessor().extract_data(str(csv_path))
+    if max_rows is not None and len(X) > max_rows:
+        X, y = X.iloc[:max_rows], y[:max_rows]
+    return X, y
+
+
+def input_records(X):
+    """
+    Converts transformed features back into the columnar input records PredictionRunner accepts.
+
+    :param X: Features DataFrame laid out as EXPECTED_COLUMN.
+    :return: Dictionary of input column name to array.
+    """
+    records = {col: X[col].to_numpy() for col in INPUT_NUMERIC_COLUMNS}
+    categories = np.full(len(X), CATEGORIES[0], dtype=object)
+    for category, col in zip(CATEGORIES, DUMMY_COLUMNS):
+        categories[X[COLUMN_MAPPING[col]].to_numpy() == 1] = category
+    records[INPUT_CATEGORICAL_COLUMN] = categories
+    return records
+
+
+def bench_etl(csv_path, n_rows, work_dir):
+    """
+    Runs DataProcessor.prepare_data on the synthetic CSV: read, clean, encode, bulk load and split.
+    """
+    from src.database import DatabaseHandler
+    from src.etl import DataProcessor
+    from src.profiling import PipelineProfiler
+
+    connection = DatabaseHandler(os.path.join(work_dir, 'etl.db')).create_database()
+    reset_peak_rss()
+    with PipelineProfiler('benchmark_etl', Path(work_dir)) as profiler:
+        _, seconds = timed(DataProcessor().prepare_data, str(csv_path), connection)
+    connection.close()
+    stages = {name: round(record['wall_seconds'], 4) for name, record in profiler.stages.items()}
+    return {'rows': n_rows, 'seconds': seconds, 'stage_seconds': stages}
+
+
+def bench_storage_write(csv_path, n_rows, work_dir):
+    """
+    Writes transformed features to SQLite with DatabaseHandler.bulk_load.
+    """
+    from src.database import DatabaseHandler
+
+    X, _ = csv_features(csv_path)
+    handler = DatabaseHandler(os.path.join(work_dir, 'storage.db'))
+    with handler.connect() as connection:
+        reset_peak_rss()
+        _, seconds = timed(handler.bulk_load, X, connection)
+    return {'rows': len(X), 'seconds': seconds}
+
+
+def bench_storage_read(csv_path, n_rows, work_dir):
+    """
+    Reads the transformed features table back with DatabaseHandler.load_from_database.
+    """
+    from src.database import DatabaseHandler
+
+    X, _ = csv_features(csv_path)
+    handler = DatabaseHandler(os.path.join(work_dir, 'storage.db'))
+    with handler.connect() as connection:
+        handler.bulk_load(X, connection)
+        del X
+        reset_peak_rss()
+        df, seconds = timed(handler.load_from_database, connection)
+    return {'rows': len(df), 'seconds': seconds}
+
+
+def bench_training(csv_path, n_rows, work_dir, max_train_rows):
+    """
+    Fits ModelHandler.train with the default TRAINING_CONFIG on up to max_train_rows rows.
+    """
+    from src.model import ModelHandler
+
+    X, y = csv_features(csv_path, max_train_rows)
+    reset_peak_rss()
+    _, seconds = timed(ModelHandler().train, X, y)
+    return {'rows': len(X), 'seconds': seconds}
+
+
+def trained_model_path(work_dir, train_rows=20_000):
+    """
+    Trains a forest shaped like the production model on a fixed synthetic sample, independent of the scale of the
+    run, and saves it uncompressed.
+    """
+    from src.model import ModelHandler
+
+    X, y = make_features(train_rows, random_state=1)
+    model_path = os.path.join(work_dir, 'model.joblib')
+    ModelHandler().save_model(ModelHandler().train(X, y), model_path, compress=0)
+    return model_path
+
+
+def bench_inference_batch(csv_path, n_rows, work_dir):
+    """
+    Scores every row with PredictionRunner.predict_batch: encode, predict and write the predictions.
+    """
+    from src.database import DatabaseHandler
+    from src.predictor import PredictionRunner
+
+    model_path = trained_model_path(work_dir)
+    records = input_records(csv_features(csv_path)[0])
+    with DatabaseHandler(os.path.join(work_dir, 'predictions.db')).connect() as connection:
+        runner = PredictionRunner()
+        # Load the model into the cache before timing
+        runner.predict_batch({col: values[:1] for col, values in records.items()}, model_path, connection)
+        reset_peak_rss()
+        predictions, seconds = timed(runner.predict_batch, records, model_path, connection)
+    return {'rows': len(predictions), 'seconds': seconds}
+
+
+def bench_inference_online(csv_path, n_rows, work_dir, n_requests=200):
+    """
+    Measures the latency of single-record PredictionRunner.predict_batch calls against a resident model.
+    """
+    from src.database import DatabaseHandler
+    from src.predictor import PredictionRunner
+
+    model_path = trained_model_path(work_dir)
+    records = PredictionRunner().given_input_data()
+    latencies = []
+    with DatabaseHandler(os.path.join(work_dir, 'predictions.db')).connect() as connection:
+        runner = PredictionRunner()
+        runner.predict_batch(records[:1], model_path, connection)
+        reset_peak_rss()
+        for i in range(n_requests):
+            _, seconds = timed(runner.predict_batch, [records[i % len(records)]], model_path, connection)
+            latencies.append(seconds)
+    return {'rows': n_requests, 'seconds': sum(latencies),
+            'p50_ms': float(np.percentile(latencies, 50) * 1000), 'p99_ms': float(np.percentile(latencies, 99) * 1000)}
+
+
+# Cases run at every scale; inference_online does not depend on the data size and runs once
+CASES = {
+    'etl.prepare_data': bench_etl,
+    'storage.bulk_load': bench_storage_write,
+    'storage.load_from_database': bench_storage_read,
+    'model.train': bench_training,
+    'predictor.predict_batch': bench_inference_batch,
+}
+SCALE_INDEPENDENT_CASES = {
+    'predictor.single_record': bench_inference_online,
+}
+
+
+def run_case(case, csv_path, n_rows, **kwargs):
+    """
+    Runs one benchmark case in the current process and adds throughput and memory to its result.
+
+    :param case: Name of the case in CASES or SCALE_INDEPENDENT_CASES.
+    :param csv_path: Path of the synthetic CSV with n_rows rows.
+    :param n_rows: Scale of the run.
+    :param kwargs: Additional keyword arguments of the case function.
+    :return: Dictionary of metrics.
+    """
+    function = CASES.get(case) or SCALE_INDEPENDENT_CASES[case]
+    with tempfile.TemporaryDirectory() as work_dir:
+        result = function(csv_path, n_rows, work_dir, **kwargs)
+    result = {'case': case, 'scale': n_rows, **result}
+    result['rows_per_second'] = result['rows'] / result['seconds'] if result['seconds'] else None
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def run_isolated(case, csv_path, n_rows, **kwargs):
+    """
+    Runs one benchmark case in a freshly spawned process, so that memory and caches do not leak between cases.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(run_case, case, csv_path, n_rows, **kwargs).result()
+
+
+def synthetic_csv(n_rows, data_dir=DATA_DIR):
+    """
+    Returns the path of a synthetic CSV with n_rows rows, generating it on first use.
+    """
+    data_dir.mkdir(parents=True, exist_ok=True)
+    path = data_dir / f'housing_{n_rows}.csv'
+    if not path.exists():
+        partial_path = path.with_suffix('.partial')
+        write_housing_csv(partial_path, n_rows)
+        partial_path.rename(path)
+    return path
+
+
+def run_benchmarks(scales, cases=None, max_train_rows=1_000_000, data_dir=DATA_DIR):
+    """
+    Runs the benchmark cases at every scale.
+
+    :param scales: Row counts of the synthetic datasets.
+    :param cases: Names of the cases to run; defaults to all of them.
+    :param max_train_rows: Cap on the number of rows model.train is fitted on.
+    :param data_dir: Directory the synthetic CSV files are cached in.
+    :return: Dictionary with the environment and the list of case results.
+    """
+    cases = cases or list(CASES) + list(SCALE_INDEPENDENT_CASES)
+    results = []
+    for n_rows in scales:
+        csv_path = synthetic_csv(n_rows, data_dir)
+        for case in cases:
+            if case in SCALE_INDEPENDENT_CASES and n_rows != scales[0]:
+                continue
+            kwargs = {'max_train_rows': max_train_rows} if case == 'model.train' else {}
+            result = run_isolated(case, str(csv_path), n_rows, **kwargs)
+            print(f"{case:<28} {n_rows:>10} rows  {result['seconds']:>9.3f} s  "
+                  f"{result['rows_per_second'] or 0:>12,.0f} rows/s  {result['peak_rss_mb']:>8.1f} MiB", flush=True)
+            results.append(result)
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'results': results,
+    }
+
+
+def compare(results, baseline, threshold=0.1):
+    """
+    Compares results against a baseline run.
+
+    :param results: Output of run_benchmarks.
+    :param baseline: Output of an earlier run_benchmarks.
+    :param threshold: Relative change beyond which a worse metric counts as a regression.
+    :return: List of regressions, each a dictionary with case, scale, metric, baseline, current and change.
+    """
+    baseline_results = {(result['case'], result['scale']): result for result in baseline['results']}
+    regressions = []
+    for result in results['results']:
+        previous = baseline_results.get((result['case'], result['scale']))
+        if previous is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            current, reference = result.get(metric), previous.get(metric)
+            if not current or not reference:
+                continue
+            change = (current - reference) / reference
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append({'case': result['case'], 'scale': result['scale'], 'metric': metric,
+                                    'baseline': reference, 'current': current, 'change': change})
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument('--cases', nargs='+', choices=list(CASES) + list(SCALE_INDEPENDENT_CASES))
+    parser.add_argument('--max-train-rows', type=int, default=1_000_000)
+    parser.add_argument('--data-dir', type=Path, default=DATA_DIR)
+    parser.add_argument('--output', type=Path, help='defaults to benchmarks/results/<timestamp>.json')
+    parser.add_argument('--baseline', type=Path, help='fail when a metric regresses against this results file')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative regression tolerance')
+    parser.add_argument('--save-baseline', type=Path, help='also write the results to this baseline file')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.rows, args.cases, args.max_train_rows, args.data_dir)
+
+    output = args.output or RESULTS_DIR / f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}.json"
+    for path in filter(None, [output, args.save_baseline]):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f'Wrote {path}')
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression['case']} at {regression['scale']} rows: {regression['metric']} "
+                  f"{regression['baseline']:.4g} -> {regression['current']:.4g} ({regression['change']:+.1%})")
+        sys.exit(1 if regressions else 0)
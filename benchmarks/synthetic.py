@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+from constants import RANDOM_STATE
+
+# Category frequencies observed in data/housing.csv
+OCEAN_PROXIMITY_FREQUENCIES = {
+    '<1H OCEAN': 0.4427,
+    'INLAND': 0.3171,
+    'NEAR OCEAN': 0.1288,
+    'NEAR BAY': 0.1106,
+    'ISLAND': 0.0002,
+    'OUT OF REACH': 0.0006,
+}
+
+
+def make_housing_frame(n_rows, null_fraction=0.01, random_state=RANDOM_STATE):
+    """
+    Generates raw housing data shaped like data/housing.csv.
+
+    :param n_rows: Number of rows to generate.
+    :param null_fraction: Fraction of rows that get a NaN or 'Null' value, like the real extracts.
+    :param random_state: Seed of the random generator.
+    :return: DataFrame with the raw CSV columns.
+    """
+    rng = np.random.default_rng(random_state)
+    rooms = np.round(rng.lognormal(7.6, 0.6, n_rows))
+    households = np.round(rooms / rng.uniform(4.0, 6.5, n_rows))
+    income = np.round(rng.gamma(4.0, 1.0, n_rows), 4)
+    categories = list(OCEAN_PROXIMITY_FREQUENCIES)
+    probabilities = np.array(list(OCEAN_PROXIMITY_FREQUENCIES.values()))
+
+    df = pd.DataFrame({
+        'LONGITUDE': np.round(rng.uniform(-124.35, -114.31, n_rows), 2),
+        'LAT': np.round(rng.uniform(32.54, 41.95, n_rows), 2),
+        'MEDIAN_AGE': rng.integers(1, 53, n_rows).astype(float),
+        'ROOMS': rooms,
+        'BEDROOMS': np.round(rooms * rng.uniform(0.15, 0.25, n_rows)),
+        'POP': np.round(households * rng.uniform(2.0, 4.0, n_rows)),
+        'HOUSEHOLDS': households,
+        'MEDIAN_INCOME': income,
+        'MEDIAN_HOUSE_VALUE': np.clip(np.round(income * 40000 + rng.normal(0, 50000, n_rows)), 14999, 500001),
+        'OCEAN_PROXIMITY': rng.choice(categories, n_rows, p=probabilities / probabilities.sum()),
+        'AGENCY': 'YES',
+    })
+
+    # Blank out values the way upstream extracts do
+    null_rows = rng.random(n_rows) < null_fraction
+    df.loc[null_rows & (rng.random(n_rows) < 0.5), 'BEDROOMS'] = np.nan
+    df['OCEAN_PROXIMITY'] = df['OCEAN_PROXIMITY'].where(~null_rows | df['BEDROOMS'].isna(), 'Null')
+    return df
+
+
+def write_housing_csv(path, n_rows, chunksize=1_000_000, **kwargs):
+    """
+    Writes a synthetic housing CSV in chunks so that large files can be generated with bounded memory.
+
+    :param path: Path of the CSV file to write.
+    :param n_rows: Total number of rows to generate.
+    :param chunksize: Number of rows generated and written per chunk.
+    :param kwargs: Additional keyword arguments passed to make_housing_frame.
+    :return: The path of the written file.
+    """
+    random_state = kwargs.pop('random_state', RANDOM_STATE)
+    for i, start in enumerate(range(0, n_rows, chunksize)):
+        df = make_housing_frame(min(chunksize, n_rows - start), random_state=random_state + i, **kwargs)
+        df.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+    return path
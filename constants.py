@@ -7,13 +7,84 @@ PROJECT_ROOT = Path(__file__).parent
 MODEL_PATH = PROJECT_ROOT / "models/model.joblib"
 TRAIN_DATA_PATH = PROJECT_ROOT / "data/housing.csv"
 
+# Model training
+TRAINING_CONFIG = {
+    'backend': 'random_forest',  # 'random_forest' or 'hist_gradient_boosting'
+    'n_jobs': -1,  # Parallel tree building for the random forest, -1 uses every core
+    'max_threads': None,  # Upper bound on native thread pools (OpenMP/BLAS) through threadpoolctl
+    'warm_start_estimators': 20,  # Trees added to an existing forest on incremental training
+    'random_forest': {'max_depth': 12},
+    'hist_gradient_boosting': {'max_depth': 12, 'max_iter': 200},
+}
+
+# Engine used to evaluate random forests on prediction paths: 'compiled' for src.forest.CompiledForest, 'sklearn'
+INFERENCE_ENGINE = 'compiled'
+LEAF_QUANTIZATION_BITS = None  # Leaf values of the exported compact model: None for float32, 8 or 16 to quantize
+
+# Hyperparameter tuning
+TUNING_CONFIG = {
+    'cv_folds': 5,
+    'n_jobs': -1,  # Folds fitted in parallel processes, -1 uses every core
+    'halving_factor': 3,  # Successive halving keeps 1/factor of the candidates and gives them factor times the rows
+    'min_samples': 2_000,  # Rows given to every candidate in the first successive halving round
+    'param_grid': {
+        'random_forest': {'max_depth': [8, 12, 16, None], 'min_samples_leaf': [1, 4], 'max_features': [1.0, 0.5]},
+        'hist_gradient_boosting': {'max_depth': [6, 12, None], 'learning_rate': [0.05, 0.1], 'max_iter': [200, 400]},
+    },
+}
+TUNING_CACHE_DIR = PROJECT_ROOT / "models/tuning_cache"
+
+# Rows per shard sent to a worker process by the parallel scoring engine
+SCORING_SHARD_SIZE = 100_000
+
+# Online prediction server
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 8080
+PREDICTION_BATCH_WINDOW = 0.002  # Seconds concurrent requests are collected into one predict call
+PREDICTION_MAX_BATCH_SIZE = 1024
+SERVER_MAX_BODY_SIZE = 16 * 2 ** 20  # Bytes of request body read at most; larger requests get 413
+
+# Write-behind prediction writer
+WRITER_QUEUE_SIZE = 1024  # Prediction batches queued before put blocks
+WRITER_FLUSH_ROWS = 50_000  # Rows coalesced into one transaction
+WRITER_FLUSH_INTERVAL = 0.5  # Seconds a queued prediction waits at most before it is written
+
+# Prediction cache
+PREDICTION_CACHE_SIZE = 100_000
+PREDICTION_CACHE_TTL = 3600  # Seconds
+
+# Number of loaded models kept in the process-level model cache
+MODEL_CACHE_SIZE = 4
+
 # Database constants
 DATABASE_NAME = 'housing_data.db'
+DATABASE_POOL_SIZE = 8
+BULK_LOAD_BATCH_SIZE = 100_000
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -65536,  # Negative values are KiB, i.e. a 64 MiB page cache
+}
+
+# Transformed columns indexed by the spatial index of a table, the latitude bands it is keyed on, and the Earth
+# radius used for distances
+SPATIAL_COLUMNS = ('longitude', 'latitude')
+SPATIAL_BANDS_PER_DEGREE = 100
+EARTH_RADIUS_KM = 6371.0088
+
+# Storage of table data: 'sqlite' keeps every table in DATABASE_NAME, 'parquet' keeps them as Parquet files
+# under PARQUET_DIR (requires pyarrow)
+STORAGE_BACKEND = 'sqlite'
+PARQUET_DIR = PROJECT_ROOT / "data/parquet"
+PARQUET_ROW_GROUP_SIZE = 131_072
 
 # Randomization
 RANDOM_STATE = 100
 TEST_SIZE = 0.2
 
+# Streaming
+CHUNK_SIZE = 50_000
+
 # Columns
 FILTERED_COLUMNS = [
     'LONGITUDE', 'LAT', 'MEDIAN_AGE', 'ROOMS', 'BEDROOMS', 'POP',
@@ -39,6 +110,18 @@ COLUMN_MAPPING = {
     'OCEAN_PROXIMITY_NEAR OCEAN': 'ocean_proximity_NEAR OCEAN'
 }
 
+# Placeholder values treated as missing during cleaning
+NULL_SENTINELS = ['Null']
+
+# Streaming statistics collected during the ETL
+SKETCH_RELATIVE_ACCURACY = 0.01  # Relative error of the approximate quantiles
+DRIFT_THRESHOLDS = {
+    'null_rate': 0.05,  # Increase of the null rate
+    'mean_shift': 0.5,  # Shift of the mean, in training standard deviations
+    'quantile_shift': 0.25,  # Shift of p05/p50/p95, relative to the training p05-p95 spread
+    'category_shift': 0.1,  # Total variation distance between category frequencies
+}
+
 # Columns to drop
 DROP_COLUMN = ['MEDIAN_HOUSE_VALUE', 'AGENCY']
 
@@ -51,15 +134,25 @@ EXPECTED_COLUMN = [
     'ocean_proximity_NEAR OCEAN'
 ]
 
-# Set up logging configuration
+# Logging
 LOGS_DIR = Path(__file__).parent / "logs"
-LOGS_DIR.mkdir(parents=True, exist_ok=True)
 LOG_FILE = LOGS_DIR / "logs.log"
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler(LOG_FILE)
-    ]
-)
+METRICS_DIR = LOGS_DIR / "metrics"
+
+
+def configure_logging(level=logging.DEBUG):
+    """
+    Sets up logging to stdout and LOG_FILE. Called by the entry points rather than at import time, so that importing
+    the constants has no side effects.
+
+    :param level: Logging level of the root logger.
+    """
+    LOGS_DIR.mkdir(parents=True, exist_ok=True)
+    logging.basicConfig(
+        level=level,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        handlers=[
+            logging.StreamHandler(sys.stdout),
+            logging.FileHandler(LOG_FILE)
+        ]
+    )
@@ -1,16 +1,13 @@
+import argparse
 import logging
-import sys
 
-import pandas as pd
-from sklearn.metrics import mean_absolute_error
+from constants import TRAIN_DATA_PATH, MODEL_PATH, DATABASE_NAME, EXPECTED_COLUMN, CHUNK_SIZE, SERVER_HOST, \
+    SERVER_PORT, PREDICTION_BATCH_WINDOW, PREDICTION_CACHE_SIZE, INFERENCE_ENGINE, LEAF_QUANTIZATION_BITS, \
+    configure_logging
+from src.profiling import PipelineProfiler, stage
 
-from constants import TRAIN_DATA_PATH, MODEL_PATH
-from src.database import DatabaseHandler
-from src.etl import DataProcessor
-from src.model import ModelHandler
-from src.predictor import PredictionRunner
-
-logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+# pandas, sklearn and the src modules built on them are imported inside the functions that use them, so that each
+# subcommand only pays for the modules it needs and `main.py --help` starts instantly.
 
 
 class DataPipeline:
@@ -19,12 +16,23 @@ class DataPipeline:
     It includes data preparation, model loading, prediction, and evaluation.
     """
 
-    def __init__(self):
+    def __init__(self, deep_profile=False, force=False, writer=None, database_name=DATABASE_NAME):
         """
         Initialize DataPipeline object.
+
+        Args:
+            deep_profile (bool): Trace allocations and profile the run with cProfile on top of the stage metrics.
+            force (bool): Rerun every stage of run_pipeline, even those whose inputs are unchanged.
+            writer (PredictionWriter): Optional writer perform_prediction queues predictions on instead of writing
+                them before returning.
+            database_name (str): Name of the SQLite database the pipeline reads from and writes to.
         """
+        self.database_name = database_name
         self.model = None
         self.conn = None
+        self.writer = writer
+        self.deep_profile = deep_profile
+        self.force = force
 
     def prepare_data(self):
         """
@@ -33,8 +41,19 @@ class DataPipeline:
         Returns:
             Tuple: X_train, X_test, y_train, y_test
         """
-        self.conn = DatabaseHandler().create_database()
-        return DataProcessor().prepare_data(str(TRAIN_DATA_PATH))
+        from src.database import DatabaseHandler
+        from src.encoder import FeatureEncoder
+        from src.etl import DataProcessor
+
+        self.conn = DatabaseHandler(self.database_name).create_database()
+        processor = DataProcessor(self.database_name)
+        split_data = processor.prepare_data(str(TRAIN_DATA_PATH))
+        # Later ETL runs are compared against the statistics of the data the model is trained on
+        processor.mark_training_profile()
+
+        # Persist the encoder fitted on the training categories next to the model for serving
+        processor.encoder.save(FeatureEncoder.path_for_model(MODEL_PATH))
+        return split_data
 
     def load_model(self):
         """
@@ -43,7 +62,86 @@ class DataPipeline:
         Returns:
             model: Trained machine learning model
         """
-        return ModelHandler().load_model(str(MODEL_PATH))
+        from src.model import ModelHandler
+
+        with stage('model_load'):
+            return ModelHandler().load_model(str(MODEL_PATH), compiled=INFERENCE_ENGINE == 'compiled')
+
+    def train_model(self):
+        """
+        Train a model on the training split, evaluate it and save it to the model path.
+
+        Returns:
+            model: Trained machine learning model
+        """
+        from src.model import ModelHandler
+
+        X_train, X_test, y_train, y_test = self.prepare_data()
+
+        logging.info('Training the model...')
+        with stage('train') as metrics:
+            self.model = ModelHandler().train(X_train, y_train)
+            metrics['rows'] = len(X_train)
+        ModelHandler().save_model(self.model, str(MODEL_PATH))
+        self.export_model()
+
+        logging.info('Evaluating the model...')
+        with stage('predict') as metrics:
+            y_pred_train = ModelHandler().predict(X_train, self.model)
+            y_pred_test = ModelHandler().predict(X_test, self.model)
+            metrics['rows'] = len(y_pred_train) + len(y_pred_test)
+        self.evaluate_model(y_train, y_test, y_pred_train, y_pred_test)
+        return self.model
+
+    def tune_model(self, search='grid', backend=None, cv_folds=None):
+        """
+        Tune the model with cross-validation on the training split, then fit the best candidate on the training split,
+        save it to the model path and evaluate it on the test split.
+
+        Args:
+            search (str): 'grid' or 'halving'.
+            backend (str): Training backend to tune; defaults to the one of TRAINING_CONFIG.
+            cv_folds (int): Number of cross-validation folds; defaults to the one of TUNING_CONFIG.
+
+        Returns:
+            dict: Summary of the search.
+        """
+        from src.encoder import FeatureEncoder
+        from src.etl import DataProcessor
+        from src.model import ModelHandler
+        from src.tuning import HyperparameterSearch
+
+        processor = DataProcessor(self.database_name)
+        X_train, X_test, y_train, y_test = processor.split_data(*processor.extract_data(str(TRAIN_DATA_PATH)))
+
+        logging.info('Tuning the model...')
+        tuner = HyperparameterSearch(backend, config={'cv_folds': cv_folds} if cv_folds else None)
+        with stage('tune') as metrics:
+            summary = tuner.run(X_train, y_train, search)
+            metrics['rows'] = len(X_train)
+        with stage('train') as metrics:
+            self.model = tuner.fit_best(X_train, y_train, MODEL_PATH)
+            metrics['rows'] = len(X_train)
+        processor.encoder.save(FeatureEncoder.path_for_model(MODEL_PATH))
+        processor.mark_training_profile()
+        self.export_model()
+
+        logging.info('Evaluating the model...')
+        self.evaluate_model(y_train, y_test, ModelHandler().predict(X_train, self.model),
+                            ModelHandler().predict(X_test, self.model))
+        return summary
+
+    def export_model(self):
+        """
+        Export the trained model as a compact artifact next to the model path, which the prediction paths load instead
+        of the model file. Models that cannot be compiled are not exported.
+        """
+        from src.forest import CompiledForest
+        from src.model import ModelHandler
+
+        artifact_path = CompiledForest.path_for_model(MODEL_PATH)
+        if ModelHandler().export_model(self.model, artifact_path, LEAF_QUANTIZATION_BITS):
+            logging.info(f'Exported the compact model to {artifact_path}')
 
     def evaluate_model(self, y_train, y_test, y_pred_train, y_pred_test):
         """
@@ -54,15 +152,22 @@ class DataPipeline:
             y_test (array-like): True values of the target variable for the test set.
             y_pred_train (array-like): Predicted values for the training set.
             y_pred_test (array-like): Predicted values for the test set.
+
+        Returns:
+            dict: Mean absolute error of the train and test sets.
         """
+        from sklearn.metrics import mean_absolute_error
+
         train_error = mean_absolute_error(y_train, y_pred_train)
         test_error = mean_absolute_error(y_test, y_pred_test)
         logging.info(f'Train error: {train_error}')
         logging.info(f'Test error: {test_error}')
+        return {'train_error': float(train_error), 'test_error': float(test_error)}
 
     def perform_prediction(self, data):
         """
-        Perform predictions on the provided data and save the results to the database.
+        Perform predictions on the provided data and save the results, with the model version and a timestamp, to the
+        database, or queue them on the pipeline's writer.
 
         Args:
             data (DataFrame): Data to perform predictions on.
@@ -70,43 +175,344 @@ class DataPipeline:
         Returns:
             DataFrame: Predicted values.
         """
-        predictions = ModelHandler().predict(data, self.model)
-        predictions_df = pd.DataFrame(predictions, columns=['Predicted_Value'])
-        DatabaseHandler().save_predictions_to_database(predictions_df)
+        import pandas as pd
+
+        from src.database import DatabaseHandler
+        from src.model import ModelHandler
+        from src.writer import stamp_predictions, version_id
+
+        with stage('predict') as metrics:
+            predictions = ModelHandler().predict(data, self.model)
+            metrics['rows'] = len(predictions)
+        with stage('prediction_write') as metrics:
+            predictions_df = pd.DataFrame(predictions, columns=['Predicted_Value'])
+            version = version_id(MODEL_PATH) if MODEL_PATH.exists() else None
+            if self.writer is not None:
+                self.writer.put(predictions_df, version)
+            else:
+                DatabaseHandler(self.database_name).save_predictions_to_database(
+                    stamp_predictions(predictions_df, version))
+            metrics['rows'] = len(predictions_df)
         return predictions_df
 
-    def run_pipeline(self):
+    def score_table(self, chunksize=CHUNK_SIZE, resume=True, table_name='scored_predictions', connection=None):
         """
-        Run the data engineering pipeline.
+        Score the transformed data table in bounded chunks and append each chunk's predictions, along with the rowid
+        of the scored row, in its own transaction. A crashed run resumes after the last committed chunk.
+
+        Args:
+            chunksize (int): Number of rows read and scored per chunk.
+            resume (bool): Continue from the last scored rowid instead of rescoring the whole table.
+            table_name (str): Name of the table where predictions will be saved.
+            connection (Connection): Optional SQLite connection to use.
+
+        Returns:
+            int: Number of rows scored by this call.
         """
-        try:
-            X_train, X_test, y_train, y_test = self.prepare_data()
+        import pandas as pd
 
-            logging.info('Loading the model...')
-            self.model = self.load_model()
+        from src.database import DatabaseHandler
+        from src.model import ModelHandler
 
-            logging.info('Calculating train dataset predictions...')
-            y_pred_train = ModelHandler().predict(X_train, self.model)
-            y_pred_test = ModelHandler().predict(X_test, self.model)
+        database_handler = DatabaseHandler(self.database_name)
+        if not resume:
+            database_handler.drop_table(connection, table_name)
+        last_rowid = database_handler.max_value('source_rowid', connection, table_name)
+
+        rows_scored = 0
+        for chunk in database_handler.iter_chunks(EXPECTED_COLUMN, connection, chunksize=chunksize,
+                                                  after_rowid=last_rowid):
+            with stage('predict') as metrics:
+                predictions = ModelHandler().predict(chunk[EXPECTED_COLUMN], self.model)
+                metrics['rows'] = len(predictions)
+            with stage('prediction_write') as metrics:
+                predictions_df = pd.DataFrame({'source_rowid': chunk['source_rowid'], 'Predicted_Value': predictions})
+                database_handler.save_predictions_to_database(predictions_df, connection, table_name)
+                metrics['rows'] = len(predictions_df)
+            rows_scored += len(predictions_df)
+        return rows_scored
+
+    def score_region(self, box, connection=None, table_name='transformed_data'):
+        """
+        Score the rows of the transformed data table within a longitude/latitude box, read through its spatial index.
+
+        Args:
+            box (tuple): (min_longitude, min_latitude, max_longitude, max_latitude) in degrees.
+            connection (Connection): Optional SQLite connection to use.
+            table_name (str): Name of the table to score.
+
+        Returns:
+            DataFrame: source_rowid, longitude, latitude and Predicted_Value of every row in the box, in table order.
+        """
+        from src.database import DatabaseHandler
+        from src.model import ModelHandler
+
+        with stage('region_read') as metrics:
+            rows = DatabaseHandler(self.database_name).query_box(*box, connection, table_name, EXPECTED_COLUMN)
+            rows = rows.sort_values('source_rowid', ignore_index=True)
+            metrics['rows'] = len(rows)
+        with stage('predict') as metrics:
+            predictions = ModelHandler().predict(rows[EXPECTED_COLUMN], self.model) if len(rows) else []
+            metrics['rows'] = len(rows)
+        return rows[['source_rowid', 'longitude', 'latitude']].assign(Predicted_Value=predictions)
+
+    def save_scores(self, predictions, table_name='scored_predictions'):
+        """
+        Replace the scored predictions table with predictions of the whole transformed data table, in table order.
+
+        Args:
+            predictions (array-like): One prediction per row of the transformed data table, in the order the rows
+                were loaded.
+            table_name (str): Name of the table where predictions will be saved.
+        """
+        import pandas as pd
+
+        from src.database import DatabaseHandler
+
+        with stage('prediction_write') as metrics:
+            database_handler = DatabaseHandler(self.database_name)
+            source_rowids = database_handler.rowids()
+            if len(source_rowids) != len(predictions):
+                raise ValueError(f'{len(predictions)} predictions for {len(source_rowids)} rows of the transformed '
+                                 'data table')
+            database_handler.drop_table(table_name=table_name)
+            predictions_df = pd.DataFrame({'source_rowid': source_rowids, 'Predicted_Value': predictions})
+            database_handler.save_predictions_to_database(predictions_df, table_name=table_name)
+            metrics['rows'] = len(predictions_df)
+
+    def build_graph(self):
+        """
+        Build the stage graph of the pipeline. The transformed features stay in memory from extraction to scoring,
+        and every row is evaluated by the model once: the train and test predictions used for evaluation are slices
+        of the predictions saved for the whole table.
+
+        Returns:
+            StageGraph: Graph whose targets are load, evaluate, score and sample_predictions.
+        """
+        import numpy as np
+
+        from src.cache import model_version
+        from src.database import DatabaseHandler
+        from src.encoder import FeatureEncoder
+        from src.etl import DataProcessor
+        from src.incremental import ETLManifest, file_hash
+        from src.model import ModelHandler
+        from src.pipeline import StageGraph
+        from src.predictor import PredictionRunner
+
+        processor = DataProcessor(self.database_name)
+        database_handler = DatabaseHandler(self.database_name)
+
+        def load(extracted):
+            processor.load_data(extracted[0])
+            processor.encoder.save(FeatureEncoder.path_for_model(MODEL_PATH))
+            return {'rows': len(extracted[0])}
+
+        def load_is_current(output):
+            # The incremental ETL records its sources in the manifest a full load clears
+            with database_handler.transaction() as conn:
+                modified = ETLManifest(conn).has_sources('transformed_data')
+            return not modified and database_handler.row_count() == output['rows']
+
+        def predict(extracted, model):
+            with stage('predict') as metrics:
+                predictions = ModelHandler().predict(extracted[0], model)
+                metrics['rows'] = len(predictions)
+            return predictions
+
+        def evaluate(split, predictions):
+            train_index, test_index, y_train, y_test = split
+            return self.evaluate_model(y_train, y_test, predictions[train_index], predictions[test_index])
 
-            logging.info('Evaluating the model...')
-            self.evaluate_model(y_train, y_test, y_pred_train, y_pred_test)
+        def score(predictions):
+            self.save_scores(predictions)
+            return {'rows': len(predictions)}
 
-            logging.info('Performing predictions...')
-            df = DatabaseHandler().load_from_database()
-            predicted_values = self.perform_prediction(df)
-            logging.info(predicted_values[:5])
+        def score_is_current(output):
+            return database_handler.row_count(table_name='scored_predictions') == output['rows']
 
-            predictions_list = PredictionRunner().run_prediction(str(MODEL_PATH))
-            logging.info(predictions_list)
+        graph = StageGraph(self.database_name)
+        graph.add('extract', lambda: processor.extract_data(str(TRAIN_DATA_PATH)),
+                  fingerprint=lambda: file_hash(TRAIN_DATA_PATH))
+        graph.add('load', load, ['extract'], persistent=True, is_current=load_is_current)
+        # Splitting row positions instead of rows lets the evaluation slice the predictions of the whole table
+        graph.add('split', lambda extracted: processor.split_data(np.arange(len(extracted[1])), extracted[1]),
+                  ['extract'])
+        graph.add('model', self.load_model, fingerprint=lambda: model_version(MODEL_PATH))
+        graph.add('predict', predict, ['extract', 'model'])
+        graph.add('evaluate', evaluate, ['split', 'predict'], persistent=True)
+        graph.add('score', score, ['predict'], persistent=True, is_current=score_is_current)
+        graph.add('sample_predictions',
+                  lambda model: PredictionRunner(database_name=self.database_name).run_prediction(str(MODEL_PATH)),
+                  ['model'])
+        return graph
+
+    def run_pipeline(self):
+        """
+        Run the data engineering pipeline and write the metrics of its stages to the metrics directory.
+        Stages whose inputs are unchanged since the last run are skipped.
+        """
+        from src.database import close_pools
+
+        try:
+            with PipelineProfiler(deep=self.deep_profile):
+                graph = self.build_graph()
+                outputs = graph.run(force=self.force)
+                self.model = outputs.get('model')
+                logging.info(f'Evaluation: {outputs["evaluate"]}')
+                logging.info(outputs['sample_predictions'])
+                logging.info(f'Ran stages {graph.executed}, skipped {graph.skipped}')
 
         except Exception as e:
             logging.error(f"An error occurred: {e}")
         finally:
             logging.info('Closing database connection.')
-            self.conn.close()
+            if self.conn is not None:
+                self.conn.close()
+            close_pools()
 
 
-if __name__ == '__main__':
+def run_etl(args):
+    """
+    Load the input CSV into the transformed data table, streaming it in chunks or incrementally.
+    """
+    from src.encoder import FeatureEncoder
+    from src.etl import DataProcessor
+
+    processor = DataProcessor()
+    if args.mode == 'incremental':
+        processor.incremental_data(args.input)
+    else:
+        rows_written = processor.stream_data(args.input, chunksize=args.chunksize)
+        processor.encoder.save(FeatureEncoder.path_for_model(MODEL_PATH))
+        logging.info(f'Loaded {rows_written} rows into the transformed data')
+
+
+def run_train(args):
+    """
+    Train, evaluate and save the model.
+    """
+    pipeline = DataPipeline()
+    try:
+        pipeline.train_model()
+    finally:
+        if pipeline.conn is not None:
+            pipeline.conn.close()
+
+
+def run_tune(args):
+    """
+    Tune, save and evaluate the model.
+    """
+    DataPipeline().tune_model(args.search, args.backend, args.folds)
+
+
+def run_score(args):
+    """
+    Score the transformed data table, or the rows within a box, with the saved model.
+    """
     pipeline = DataPipeline()
-    pipeline.run_pipeline()
+    pipeline.model = pipeline.load_model()
+    if args.box:
+        scores = pipeline.score_region(args.box)
+        logging.info(f'Scored {len(scores)} rows within {args.box}, mean predicted value '
+                     f'{scores["Predicted_Value"].mean():.2f}')
+        return
+    rows_scored = pipeline.score_table(args.chunksize, resume=not args.restart)
+    logging.info(f'Scored {rows_scored} rows of the transformed data')
+
+
+def run_predict(args):
+    """
+    Predict the sample input records with the saved model.
+    """
+    from src.predictor import PredictionRunner
+
+    PredictionRunner().run_prediction(str(args.model))
+
+
+def run_serve(args):
+    """
+    Serve online predictions over HTTP.
+    """
+    from src.server import serve
+
+    serve(args.model, args.host, args.port, args.batch_window, args.cache_size)
+
+
+def build_parser():
+    """
+    Build the command line parser with one subcommand per pipeline step.
+
+    Returns:
+        ArgumentParser: The parser; without a subcommand the whole pipeline runs.
+    """
+    parser = argparse.ArgumentParser(description='Housing price ETL, training and prediction pipeline.')
+    parser.add_argument('--deep-profile', action='store_true',
+                        help='trace allocations and write a cProfile report next to the stage metrics')
+    parser.add_argument('--force', action='store_true',
+                        help='rerun every pipeline stage, even those whose inputs are unchanged')
+    parser.set_defaults(func=None)
+    subparsers = parser.add_subparsers(dest='command')
+
+    etl_parser = subparsers.add_parser('etl', help='load the input CSV into the transformed data table')
+    etl_parser.add_argument('--input', default=str(TRAIN_DATA_PATH))
+    etl_parser.add_argument('--mode', default='stream', choices=['stream', 'incremental'])
+    etl_parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE)
+    etl_parser.set_defaults(func=run_etl)
+
+    train_parser = subparsers.add_parser('train', help='train, evaluate and save the model')
+    train_parser.set_defaults(func=run_train)
+
+    tune_parser = subparsers.add_parser('tune', help='tune the model with cross-validation and save the best one')
+    tune_parser.add_argument('--search', default='grid', choices=['grid', 'halving'])
+    tune_parser.add_argument('--backend', choices=['random_forest', 'hist_gradient_boosting'])
+    tune_parser.add_argument('--folds', type=int)
+    tune_parser.set_defaults(func=run_tune)
+
+    score_parser = subparsers.add_parser('score', help='score the transformed data table')
+    score_parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE)
+    score_parser.add_argument('--restart', action='store_true', help='rescore every row instead of resuming')
+    score_parser.add_argument('--box', type=float, nargs=4, metavar=('MIN_LON', 'MIN_LAT', 'MAX_LON', 'MAX_LAT'),
+                              help='only score the rows within a box, without saving the predictions')
+    score_parser.set_defaults(func=run_score)
+
+    predict_parser = subparsers.add_parser('predict', help='predict the sample input records')
+    predict_parser.add_argument('--model', default=str(MODEL_PATH))
+    predict_parser.set_defaults(func=run_predict)
+
+    serve_parser = subparsers.add_parser('serve', help='serve online predictions over HTTP')
+    serve_parser.add_argument('--model', default=str(MODEL_PATH))
+    serve_parser.add_argument('--host', default=SERVER_HOST)
+    serve_parser.add_argument('--port', type=int, default=SERVER_PORT)
+    serve_parser.add_argument('--batch-window', type=float, default=PREDICTION_BATCH_WINDOW)
+    serve_parser.add_argument('--cache-size', type=int, default=PREDICTION_CACHE_SIZE, help='0 disables the cache')
+    serve_parser.set_defaults(func=run_serve)
+    return parser
+
+
+def main(argv=None):
+    """
+    Parse the command line and run the requested subcommand.
+
+    Args:
+        argv (list): Command line arguments; defaults to sys.argv.
+    """
+    args = build_parser().parse_args(argv)
+    configure_logging()
+
+    if args.func is None:
+        DataPipeline(deep_profile=args.deep_profile, force=args.force).run_pipeline()
+    elif args.command == 'serve':
+        args.func(args)
+    else:
+        try:
+            with PipelineProfiler(args.command, deep=args.deep_profile):
+                args.func(args)
+        finally:
+            from src.database import close_pools
+            close_pools()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from constants import MODEL_PATH, PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL
+
+
+def model_version(model_path):
+    """
+    Identifies the version of a model file by its path, modification time and size.
+
+    :param model_path: Path to the trained model file.
+    :return: Version string that changes whenever the file is rewritten.
+    """
+    path = os.path.abspath(model_path)
+    stat = os.stat(path)
+    return f'{path}:{stat.st_mtime_ns}:{stat.st_size}'
+
+
+def version_id(model_path):
+    """
+    Returns a short identifier of the version of a model file, stored with every prediction it makes and used as the
+    version of cached predictions.
+
+    :param model_path: Path to the trained model file.
+    :return: 16 hexadecimal characters that change whenever the file is rewritten.
+    """
+    return hashlib.blake2b(model_version(model_path).encode(), digest_size=8).hexdigest()
+
+
+class PredictionCache:
+    """
+    Class to cache predictions keyed on the encoded feature row and the model version, with LRU and TTL eviction.
+
+    Callers holding a loaded model pass its version_id to lookup and predict, so that predictions are keyed on the
+    model that made them. Without a version the version_id of the model file is used, so both kinds of callers share
+    the cached predictions. The cache is cleared whenever the version changes.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, max_size=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL):
+        """
+        Initialize PredictionCache object.
+
+        :param model_path: Path to the model file whose predictions are cached.
+        :param max_size: Maximum number of cached predictions; the least recently used one is evicted first.
+        :param ttl: Seconds a prediction stays valid; None keeps predictions until they are evicted.
+        """
+        self.model_path = str(model_path)
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def refresh_version(self, version=None):
+        """
+        Clears the cache if the model version changed since the last lookup.
+
+        :param version: version_id of the model predictions are looked up for; defaults to the version_id of the
+                        model file, or to the last version while the file is missing, e.g. during a rewrite.
+        """
+        if version is None:
+            try:
+                version = version_id(self.model_path)
+            except FileNotFoundError:
+                if self.version is None:
+                    raise
+                version = self.version
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+    def keys(self, matrix):
+        """
+        Computes the cache key of every row of a feature matrix.
+
+        :param matrix: Feature matrix laid out as EXPECTED_COLUMN.
+        :return: List of keys.
+        """
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        version = self.version.encode()
+        return [hashlib.blake2b(version + row.tobytes(), digest_size=16).digest() for row in matrix]
+
+    def lookup(self, matrix, version=None):
+        """
+        Looks up the cached predictions of the rows of a feature matrix.
+
+        :param matrix: Feature matrix laid out as EXPECTED_COLUMN.
+        :param version: Version of the model that will predict the misses, see refresh_version.
+        :return: Tuple of (predictions with NaN for misses, boolean mask of misses, row keys).
+        """
+        with self.lock:
+            self.refresh_version(version)
+            keys = self.keys(matrix)
+            predictions = np.full(len(keys), np.nan)
+            now = time.monotonic()
+
+            for i, key in enumerate(keys):
+                entry = self.entries.get(key)
+                if entry is None:
+                    continue
+                if self.ttl is not None and entry[1] < now:
+                    del self.entries[key]
+                    continue
+                self.entries.move_to_end(key)
+                predictions[i] = entry[0]
+
+            missing = np.isnan(predictions)
+            self.misses += int(missing.sum())
+            self.hits += len(keys) - int(missing.sum())
+            return predictions, missing, keys
+
+    def store(self, keys, predictions):
+        """
+        Caches predictions under their row keys.
+
+        :param keys: Row keys returned by lookup.
+        :param predictions: Predicted values, one per key.
+        """
+        with self.lock:
+            expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+            for key, prediction in zip(keys, np.asarray(predictions).tolist()):
+                self.entries[key] = (prediction, expires_at)
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def predict(self, matrix, predict, version=None):
+        """
+        Returns predictions for a feature matrix, calling predict only for the rows that are not cached.
+
+        :param matrix: Feature matrix laid out as EXPECTED_COLUMN.
+        :param predict: Function scoring a feature matrix.
+        :param version: Version of the model predict uses, see refresh_version.
+        :return: NumPy array of predictions.
+        """
+        predictions, missing, keys = self.lookup(matrix, version)
+        if missing.any():
+            predictions[missing] = predict(matrix[missing])
+            self.store([key for key, miss in zip(keys, missing) if miss], predictions[missing])
+        return predictions
+
+    def stats(self):
+        """
+        Returns the hit and miss counters of the cache.
+
+        :return: Dictionary with hits, misses, hit rate and current size.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0,
+                    'size': len(self.entries)}
+
+    def clear(self):
+        """
+        Removes every cached prediction and resets the counters.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
@@ -1,68 +1,767 @@
+import itertools
+import math
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 
+import numpy as np
 import pandas as pd
 
-from constants import DATABASE_NAME
+from constants import DATABASE_NAME, DATABASE_POOL_SIZE, SQLITE_PRAGMAS, BULK_LOAD_BATCH_SIZE, \
+    CHUNK_SIZE, SPATIAL_COLUMNS, SPATIAL_BANDS_PER_DEGREE, EARTH_RADIUS_KM
+from src.storage import create_storage, sql_filters
+
+# Columns added to prediction tables after their first release, added to older tables on the next write
+PREDICTION_METADATA_COLUMNS = ('model_version', 'predicted_at')
+
+# Numbers of the savepoints of nested transactions
+_SAVEPOINT_IDS = itertools.count()
+
+# Shared connection pools keyed by database name
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def open_connection(database_name):
+    """
+    Opens a SQLite connection that can be shared across threads, with the bulk-write pragmas applied.
+
+    :param database_name: Name of the SQLite database.
+    :return: SQLite connection object.
+    """
+    conn = sqlite3.connect(database_name, check_same_thread=False)
+    for pragma, value in SQLITE_PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma}={value}")
+    return conn
+
+
+def sql_type(dtype):
+    """
+    Maps a pandas dtype to the SQLite column type used when creating tables.
+
+    :param dtype: pandas or NumPy dtype.
+    :return: SQLite type name.
+    """
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    return 'TEXT'
+
+
+def decimal_float64(values):
+    """
+    Widens float32 values to float64 rounded to 7 significant digits, or 8 or 9 where fewer do not convert back to
+    the same float32, so that SQLite REAL columns store -122.23 rather than -122.2300033569336. Values of other
+    dtypes are returned unchanged.
+
+    :param values: NumPy array.
+    :return: NumPy array.
+    """
+    if values.dtype != np.float32:
+        return values
+    widened = values.astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        exponents = np.floor(np.log10(np.abs(widened)))
+    exponents[~np.isfinite(exponents)] = 0
+    decimals = widened.copy()
+    pending = np.isfinite(widened)
+    # float32 has about 7 significant digits and needs at most 9 to round-trip
+    for digits in (7, 8, 9):
+        scale = 10.0 ** (digits - 1 - exponents)
+        rounded = np.round(widened * scale) / scale
+        exact = pending & (rounded.astype(np.float32) == values)
+        decimals[exact] = rounded[exact]
+        pending &= ~exact
+        if not pending.any():
+            break
+    return decimals
+
+
+def haversine_km(longitude, latitude, longitudes, latitudes):
+    """
+    Computes the great-circle distances between a point and arrays of points.
+
+    :param longitude: Longitude of the point, in degrees.
+    :param latitude: Latitude of the point, in degrees.
+    :param longitudes: Array of longitudes, in degrees.
+    :param latitudes: Array of latitudes, in degrees.
+    :return: Array of distances in kilometres.
+    """
+    lon, lat = math.radians(longitude), math.radians(latitude)
+    lons = np.radians(np.asarray(longitudes, dtype=np.float64))
+    lats = np.radians(np.asarray(latitudes, dtype=np.float64))
+    a = np.sin((lats - lat) / 2) ** 2 + math.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def bounding_box(longitude, latitude, radius_km):
+    """
+    Returns a longitude/latitude box containing every point within a great-circle distance of a point.
+
+    Boxes that would reach a pole or cross the antimeridian span every longitude instead.
+
+    :param longitude: Longitude of the point, in degrees.
+    :param latitude: Latitude of the point, in degrees.
+    :param radius_km: Distance in kilometres.
+    :return: Tuple (min_longitude, min_latitude, max_longitude, max_latitude) in degrees.
+    """
+    angle = radius_km / EARTH_RADIUS_KM
+    lat = math.radians(latitude)
+    min_lat, max_lat = lat - angle, lat + angle
+    if min_lat <= -math.pi / 2 or max_lat >= math.pi / 2 or math.sin(angle) >= math.cos(lat):
+        return -180.0, max(math.degrees(min_lat), -90.0), 180.0, min(math.degrees(max_lat), 90.0)
+
+    delta_lon = math.degrees(math.asin(math.sin(angle) / math.cos(lat)))
+    if longitude - delta_lon < -180 or longitude + delta_lon > 180:
+        return -180.0, math.degrees(min_lat), 180.0, math.degrees(max_lat)
+    return longitude - delta_lon, math.degrees(min_lat), longitude + delta_lon, math.degrees(max_lat)
+
+
+def spatial_index_name(table_name):
+    """
+    Returns the name of the spatial index of a table.
+    """
+    return f'idx_{table_name}_spatial'.replace(' ', '_')
+
+
+def spatial_band_sql():
+    """
+    Returns the SQL expression of the latitude band of a row, the leading key of the spatial index.
+    """
+    return f'CAST(("{SPATIAL_COLUMNS[1]}" + 90) * {SPATIAL_BANDS_PER_DEGREE} AS INTEGER)'
+
+
+def spatial_filter(box, max_bands=1000):
+    """
+    Builds a WHERE clause that selects the rows within a longitude/latitude box, inclusive, through the spatial index.
+
+    Listing the latitude bands of the box lets SQLite seek the longitude range within each of them. Boxes spanning
+    more than max_bands bands use a range of bands instead.
+
+    :param box: Tuple (min_longitude, min_latitude, max_longitude, max_latitude) in degrees.
+    :param max_bands: Largest number of bands listed in the clause.
+    :return: Tuple of the WHERE clause and its parameters.
+    """
+    min_lon, min_lat, max_lon, max_lat = box
+    lon, lat = (f'"{col}"' for col in SPATIAL_COLUMNS)
+    # The band of a latitude is computed as in spatial_band_sql, so both round the same way
+    first_band, last_band = (int((value + 90) * SPATIAL_BANDS_PER_DEGREE) for value in (min_lat, max_lat))
+    if last_band - first_band < max_bands:
+        bands = list(range(first_band, last_band + 1))
+        band_clause = f'{spatial_band_sql()} IN ({", ".join("?" for _ in bands)})'
+    else:
+        bands = [first_band, last_band]
+        band_clause = f'{spatial_band_sql()} BETWEEN ? AND ?'
+    return (f' WHERE {band_clause} AND {lon} BETWEEN ? AND ? AND {lat} BETWEEN ? AND ?',
+            [*bands, min_lon, max_lon, min_lat, max_lat])
+
+
+def get_pool(database_name=DATABASE_NAME):
+    """
+    Returns the shared connection pool of a database, creating it on first use.
+
+    :param database_name: Name of the SQLite database.
+    :return: ConnectionPool object.
+    """
+    with _POOLS_LOCK:
+        if database_name not in _POOLS:
+            _POOLS[database_name] = ConnectionPool(database_name)
+        return _POOLS[database_name]
+
+
+def close_pools():
+    """
+    Closes every shared connection pool.
+    """
+    with _POOLS_LOCK:
+        for pool in _POOLS.values():
+            pool.close()
+        _POOLS.clear()
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of SQLite connections to a single database file.
+    """
+
+    def __init__(self, database_name, max_size=DATABASE_POOL_SIZE):
+        """
+        Initialize ConnectionPool object.
+
+        :param database_name: Name of the SQLite database.
+        :param max_size: Maximum number of open connections; acquire blocks once they are all in use.
+        """
+        self.database_name = database_name
+        self.max_size = max_size
+        self.idle = []
+        self.size = 0
+        self.closed = False
+        self.available = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """
+        Takes a connection from the pool, opening a new one while the pool is below max_size.
+
+        :param timeout: Seconds to wait for a connection when the pool is exhausted; None waits forever.
+        :return: SQLite connection object.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.available:
+            while not self.idle and self.size >= self.max_size:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise Exception(f"No database connection available after {timeout} seconds")
+                self.available.wait(remaining)
+            if self.idle:
+                return self.idle.pop()
+            self.size += 1
+
+        try:
+            return open_connection(self.database_name)
+        except sqlite3.Error as e:
+            with self.available:
+                self.size -= 1
+                self.available.notify()
+            raise Exception(f"Database connection failed: {e}")
+
+    def release(self, conn):
+        """
+        Returns a connection to the pool, rolling back any transaction left open. Connections returned to a closed
+        pool are closed.
+
+        :param conn: SQLite connection previously returned by acquire.
+        """
+        if conn.in_transaction:
+            conn.rollback()
+        with self.available:
+            if not self.closed:
+                self.idle.append(conn)
+                self.available.notify()
+                return
+            self.size -= 1
+            self.available.notify()
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager that borrows a connection from the pool for the duration of the block.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """
+        Closes the idle connections of the pool, and the connections in use once they are released. A closed pool
+        still hands out connections, but closes them on release instead of keeping them.
+        """
+        with self.available:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.size -= len(idle)
+            self.available.notify_all()
+        for conn in idle:
+            conn.close()
 
 
 class DatabaseHandler:
     """
     Class to handle interactions with a SQLite database.
+
+    Connections are borrowed from a shared pool per operation. Use the handler as a context manager to hold one
+    connection for several operations, and transaction() to group writes into a single commit.
+
+    Table data can be kept in a columnar StorageBackend instead of SQLite; the table methods then delegate to it and
+    their connection argument is ignored. append_rows, transaction and the spatial queries always operate on SQLite.
+
+    Tables with the SPATIAL_COLUMNS get a spatial index, built after bulk loads and kept current by SQLite on every
+    later write, which query_box, query_radius and query_nearest search.
     """
 
-    def __init__(self, database_name=DATABASE_NAME):
+    def __init__(self, database_name=DATABASE_NAME, storage=None):
         """
         Initialize DatabaseHandler object.
 
         :param database_name: Name of the SQLite database.
+        :param storage: Optional StorageBackend for table data; defaults to the one configured by STORAGE_BACKEND.
         """
         self.database_name = database_name
-        self.connection = self.create_database()
+        self.pool = get_pool(database_name)
+        self.connection = None
+        self.storage = storage if storage is not None else create_storage()
+
+    def __enter__(self):
+        """
+        Borrows a connection from the pool, used by every operation until the handler exits.
+        """
+        self.connection = self.pool.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Returns the borrowed connection to the pool.
+        """
+        self.pool.release(self.connection)
+        self.connection = None
 
     def create_database(self):
         """
-        Creates a connection to the SQLite database.
+        Creates a connection to the SQLite database. The caller owns the connection and is responsible for closing it.
 
         :return: SQLite connection object.
         """
         try:
-            conn = sqlite3.connect(self.database_name)
-            return conn
+            return open_connection(self.database_name)
         except sqlite3.Error as e:
             raise Exception(f"Database connection failed: {e}")
 
-    def save_to_database(self, df, table_name='transformed_data'):
+    @contextmanager
+    def connect(self, connection=None):
+        """
+        Context manager yielding the given connection, the handler's held connection, or one borrowed from the pool.
+
+        :param connection: Optional SQLite connection to use.
+        """
+        if connection is not None or self.connection is not None:
+            yield connection or self.connection
+        else:
+            with self.pool.connection() as conn:
+                yield conn
+
+    @contextmanager
+    def transaction(self, connection=None):
+        """
+        Context manager that commits every write made in the block at once, or rolls them all back on error.
+
+        On a connection already in a transaction, the block runs in a savepoint instead: its writes are undone on
+        error and otherwise left for the enclosing transaction to commit or roll back.
+
+        Writes through DataFrame.to_sql commit on their own and must not be used inside the block.
+
+        :param connection: Optional SQLite connection to use.
+        """
+        with self.connect(connection) as conn:
+            if conn.in_transaction:
+                savepoint = f'transaction_{next(_SAVEPOINT_IDS)}'
+                conn.execute(f'SAVEPOINT "{savepoint}"')
+                try:
+                    yield conn
+                except Exception:
+                    conn.execute(f'ROLLBACK TO "{savepoint}"')
+                    raise
+                finally:
+                    conn.execute(f'RELEASE "{savepoint}"')
+                return
+            try:
+                # Begin explicitly so that schema changes are part of the transaction too
+                conn.execute('BEGIN')
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def save_to_database(self, df, connection=None, table_name='transformed_data', if_exists='replace'):
         """
         Saves a DataFrame to the specified table in the database.
 
         :param df: DataFrame to be saved to the database.
+        :param connection: Optional SQLite connection to use instead of a pooled connection.
         :param table_name: Name of the table where the DataFrame will be saved.
+        :param if_exists: Behaviour when the table already exists ('replace' or 'append').
         """
         try:
-            df.to_sql(table_name, self.connection, if_exists='replace', index=False)
+            if self.storage is not None:
+                return self.storage.write(df, table_name, if_exists)
+            with self.connect(connection) as conn:
+                float32_columns = [col for col, dtype in df.dtypes.items() if dtype == np.float32]
+                if float32_columns:
+                    df = df.assign(**{col: decimal_float64(df[col].to_numpy()) for col in float32_columns})
+                df.to_sql(table_name, conn, if_exists=if_exists, index=False)
         except Exception as e:
             raise Exception(f"Saving data to database failed: {e}")
 
-    def load_from_database(self, table_name='transformed_data'):
+    def load_from_database(self, connection=None, table_name='transformed_data', columns=None, filters=None):
         """
         Loads data from the specified table in the database into a DataFrame.
 
+        :param connection: Optional SQLite connection to use instead of a pooled connection.
         :param table_name: Name of the table to load data from.
+        :param columns: Columns to load; defaults to every column.
+        :param filters: Iterable of (column, operator, value) tuples the loaded rows must all match, e.g.
+            [('ocean_proximity', '==', 'INLAND'), ('median_income', '>', 3)].
         :return: DataFrame containing data from the specified table.
         """
         try:
-            return pd.read_sql(f"SELECT * FROM {table_name}", self.connection)
+            if self.storage is not None:
+                return self.storage.read(table_name, columns, filters)
+            select = ', '.join(f'"{col}"' for col in columns) if columns else '*'
+            where, params = sql_filters(filters)
+            with self.connect(connection) as conn:
+                return pd.read_sql(f'SELECT {select} FROM "{table_name}"{where}', conn, params=params)
+        except Exception as e:
+            raise Exception(f"Loading data from database failed: {e}")
+
+    def load_matrix(self, columns, connection=None, table_name='transformed_data', filters=None, dtype=np.float32):
+        """
+        Loads columns of a table straight into a NumPy matrix, without building a DataFrame.
+
+        :param columns: Columns to load, in matrix column order.
+        :param connection: Optional SQLite connection to use instead of a pooled connection.
+        :param table_name: Name of the table to load data from.
+        :param filters: Iterable of (column, operator, value) tuples the loaded rows must all match.
+        :param dtype: dtype of the matrix.
+        :return: C-contiguous NumPy matrix with one row per loaded row.
+        """
+        try:
+            if self.storage is not None:
+                return self.storage.read_numpy(table_name, columns, filters, dtype)
+            select = ', '.join(f'"{col}"' for col in columns)
+            where, params = sql_filters(filters)
+            with self.connect(connection) as conn:
+                rows = conn.execute(f'SELECT {select} FROM "{table_name}"{where}', params).fetchall()
+            return np.array(rows, dtype=dtype).reshape(len(rows), len(columns))
         except Exception as e:
             raise Exception(f"Loading data from database failed: {e}")
 
-    def save_predictions_to_database(self, predictions, table_name='predictions'):
+    def iter_chunks(self, columns, connection=None, table_name='transformed_data', chunksize=CHUNK_SIZE,
+                    after_rowid=0):
+        """
+        Reads a table in bounded chunks in rowid order, using the rowid as a cursor instead of OFFSET.
+
+        :param columns: Columns to read.
+        :param connection: Optional SQLite connection to use instead of a pooled connection.
+        :param table_name: Name of the table to read.
+        :param chunksize: Maximum number of rows per chunk.
+        :param after_rowid: Only rows with a larger rowid are read, e.g. to resume an interrupted job.
+        :return: Generator of DataFrames with a 'source_rowid' column followed by the requested columns.
+        """
+        if self.storage is not None:
+            yield from self.storage.iter_chunks(table_name, columns, chunksize, after_rowid)
+            return
+        select = ', '.join(f'"{col}"' for col in columns)
+        query = f'SELECT rowid AS source_rowid, {select} FROM "{table_name}" WHERE rowid > ? ORDER BY rowid LIMIT ?'
+        with self.connect(connection) as conn:
+            while True:
+                try:
+                    chunk = pd.read_sql(query, conn, params=(after_rowid, chunksize))
+                except Exception as e:
+                    raise Exception(f"Loading data from database failed: {e}")
+                if chunk.empty:
+                    return
+                yield chunk
+                after_rowid = int(chunk['source_rowid'].iloc[-1])
+
+    def max_value(self, column, connection=None, table_name='transformed_data', default=0):
+        """
+        Returns the largest value of a column, or a default when the table is missing or empty.
+
+        :param column: Column to aggregate.
+        :param connection: Optional SQLite connection to use instead of a pooled connection.
+        :param table_name: Name of the table to query.
+        :param default: Value returned for a missing or empty table.
+        :return: The largest value of the column.
+        """
+        if self.storage is not None:
+            return self.storage.max_value(table_name, column, default)
+        with self.connect(connection) as conn:
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                (table_name,)).fetchone():
+                return default
+            value = conn.execute(f'SELECT MAX("{column}") FROM "{table_name}"').fetchone()[0]
+            return default if value is None else value
+
+    def row_count(self, connection=None, table_name='transformed_data'):
+        """
+        Returns the number of rows of a table, or 0 when the table is missing.
+
+        :param connection: Optional SQLite connection to use instead of a pooled connection.
+        :param table_name: Name of the table to count.
+        :return: Number of rows.
+        """
+        if self.storage is not None:
+            return self.storage.row_count(table_name)
+        with self.connect(connection) as conn:
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                (table_name,)).fetchone():
+                return 0
+            return conn.execute(f'SELECT COUNT(*) FROM "{table_name}"').fetchone()[0]
+
+    def rowids(self, connection=None, table_name='transformed_data'):
+        """
+        Returns the rowids of a table in rowid order, which is the order its rows were loaded in.
+
+        :param connection: Optional SQLite connection to use instead of a pooled connection.
+        :param table_name: Name of the table to read.
+        :return: NumPy array of rowids, as reported in the 'source_rowid' column of iter_chunks.
+        """
+        if self.storage is not None:
+            return np.arange(1, self.storage.row_count(table_name) + 1)
+        with self.connect(connection) as conn:
+            cursor = conn.execute(f'SELECT rowid FROM "{table_name}" ORDER BY rowid')
+            return np.fromiter((row[0] for row in cursor), dtype=np.int64)
+
+    def drop_table(self, connection=None, table_name='transformed_data'):
+        """
+        Drops a table if it exists.
+
+        :param connection: Optional SQLite connection to use instead of a pooled connection.
+        :param table_name: Name of the table to drop.
+        """
+        if self.storage is not None:
+            return self.storage.drop(table_name)
+        with self.transaction(connection) as conn:
+            conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+
+    def append_rows(self, conn, df, table_name, batch_size=BULK_LOAD_BATCH_SIZE):
+        """
+        Appends the rows of a DataFrame to a table with executemany, creating the table if needed. Does not commit.
+
+        Rows are converted from the underlying NumPy arrays batch_size rows at a time, so no full copy of the frame
+        as Python objects is built; float32 values are written as rounded decimals (see decimal_float64).
+        Tables with the SPATIAL_COLUMNS get their spatial index built if it is missing.
+
+        :param conn: SQLite connection to write through.
+        :param df: DataFrame whose rows are appended.
+        :param table_name: Name of the table to append to.
+        :param batch_size: Number of rows passed to each executemany call.
+        """
+        columns = ', '.join(f'"{col}"' for col in df.columns)
+        column_types = ', '.join(f'"{col}" {sql_type(dtype)}' for col, dtype in df.dtypes.items())
+        placeholders = ', '.join('?' for _ in df.columns)
+        insert_sql = f'INSERT INTO "{table_name}" ({columns}) VALUES ({placeholders})'
+
+        conn.execute(f'CREATE TABLE IF NOT EXISTS "{table_name}" ({column_types})')
+        arrays = [df[col].to_numpy() for col in df.columns]
+        for start in range(0, len(df), batch_size):
+            conn.executemany(insert_sql, zip(*(decimal_float64(array[start:start + batch_size]).tolist()
+                                               for array in arrays)))
+        if set(SPATIAL_COLUMNS) <= set(df.columns):
+            self.create_spatial_index(conn, table_name)
+
+    def add_missing_columns(self, conn, df, table_name, columns):
+        """
+        Adds the given columns of a DataFrame that an existing table lacks; existing rows get NULL in them. Other
+        columns are left to fail on insert. Does not commit.
+
+        :param conn: SQLite connection to write through.
+        :param df: DataFrame whose columns are added.
+        :param table_name: Name of the table to migrate.
+        :param columns: Names of the columns that may be added.
+        """
+        existing_columns = {row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')}
+        if existing_columns:
+            for col, dtype in df.dtypes.items():
+                if col in columns and col not in existing_columns:
+                    conn.execute(f'ALTER TABLE "{table_name}" ADD COLUMN "{col}" {sql_type(dtype)}')
+
+    def bulk_load(self, df, connection=None, table_name='transformed_data', if_exists='replace',
+                  batch_size=BULK_LOAD_BATCH_SIZE, index_columns=()):
+        """
+        Loads a DataFrame into a table with a typed schema through batched executemany calls in one transaction.
+
+        Unlike save_to_database, an existing table with the same schema is kept and emptied rather than dropped, and
+        the given indexes and the spatial index are only built once every row is loaded.
+
+        :param df: DataFrame to be saved to the database.
+        :param connection: Optional SQLite connection to use instead of a pooled connection.
+        :param table_name: Name of the table where the DataFrame will be saved.
+        :param if_exists: Behaviour when the table already exists ('replace' or 'append').
+        :param batch_size: Number of rows passed to each executemany call.
+        :param index_columns: Columns to index after the load; not used by columnar storage.
+        """
+        try:
+            if self.storage is not None:
+                return self.storage.write(df, table_name, if_exists)
+            with self.transaction(connection) as conn:
+                expected_schema = [(col, sql_type(dtype)) for col, dtype in df.dtypes.items()]
+                existing_schema = [(row[1], row[2]) for row in conn.execute(f'PRAGMA table_info("{table_name}")')]
+
+                if existing_schema and existing_schema != expected_schema:
+                    if if_exists == 'append':
+                        raise ValueError(f"table '{table_name}' does not match the schema of the data")
+                    conn.execute(f'DROP TABLE "{table_name}"')
+                elif existing_schema and if_exists == 'replace':
+                    conn.execute(f'DELETE FROM "{table_name}"')
+
+                index_names = {col: f'idx_{table_name}_{col}'.replace(' ', '_') for col in index_columns}
+                for index_name in [*index_names.values(), spatial_index_name(table_name)]:
+                    conn.execute(f'DROP INDEX IF EXISTS "{index_name}"')
+
+                self.append_rows(conn, df, table_name, batch_size)
+
+                for col, index_name in index_names.items():
+                    conn.execute(f'CREATE INDEX "{index_name}" ON "{table_name}" ("{col}")')
+        except Exception as e:
+            raise Exception(f"Bulk loading data to database failed: {e}")
+
+    def save_predictions_to_database(self, predictions, connection=None, table_name='predictions'):
         """
-        Appends prediction results to the specified table in the database.
+        Appends prediction results to the specified table in the database in a single transaction. The
+        PREDICTION_METADATA_COLUMNS are added first to tables written before they existed.
 
-        :param predictions: DataFrame containing prediction results.
+        :param predictions: DataFrame, or list of DataFrames, containing prediction results.
+        :param connection: Optional SQLite connection to use instead of a pooled connection.
         :param table_name: Name of the table where predictions will be saved.
         """
         try:
-            predictions.to_sql(table_name, self.connection, if_exists='append', index=False)
+            if isinstance(predictions, pd.DataFrame):
+                predictions = [predictions]
+            if self.storage is not None:
+                return self.storage.write(pd.concat(predictions, ignore_index=True), table_name, if_exists='append')
+            with self.transaction(connection) as conn:
+                for predictions_df in predictions:
+                    self.add_missing_columns(conn, predictions_df, table_name, PREDICTION_METADATA_COLUMNS)
+                    self.append_rows(conn, predictions_df, table_name)
         except Exception as e:
             raise Exception(f"Saving predictions to database failed: {e}")
+
+    def create_spatial_index(self, conn, table_name):
+        """
+        Creates the spatial index of a table if it is missing. Does not commit.
+
+        The index is a B-tree over the latitude band of 1 / SPATIAL_BANDS_PER_DEGREE degrees, the longitude and the
+        latitude of every row, so a box query seeks the longitude range of each band it overlaps and reads only index
+        entries within the box.
+
+        :param conn: SQLite connection to write through.
+        :param table_name: Name of the indexed table.
+        """
+        lon, lat = (f'"{col}"' for col in SPATIAL_COLUMNS)
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "{spatial_index_name(table_name)}" '
+                     f'ON "{table_name}" ({spatial_band_sql()}, {lon}, {lat})')
+
+    def select_box(self, conn, table_name, columns, box):
+        """
+        Reads the rows of a table within a longitude/latitude box, inclusive, through its spatial index.
+
+        :param conn: SQLite connection to read through.
+        :param table_name: Name of the table to read.
+        :param columns: Columns to read.
+        :param box: Tuple (min_longitude, min_latitude, max_longitude, max_latitude) in degrees.
+        :return: DataFrame with a 'source_rowid' column followed by the requested columns.
+        """
+        if self.storage is not None:
+            raise ValueError("spatial queries use the SQLite spatial index and require the sqlite backend")
+        select = ', '.join(f'"{col}"' for col in columns)
+        where, params = spatial_filter(box)
+        return pd.read_sql(f'SELECT rowid AS source_rowid, {select} FROM "{table_name}"{where}', conn, params=params)
+
+    def box_count(self, conn, table_name, box):
+        """
+        Counts the rows of a table within a longitude/latitude box from its spatial index alone.
+
+        :param conn: SQLite connection to read through.
+        :param table_name: Name of the indexed table.
+        :param box: Tuple (min_longitude, min_latitude, max_longitude, max_latitude) in degrees.
+        :return: Number of rows.
+        """
+        where, params = spatial_filter(box)
+        return conn.execute(f'SELECT COUNT(*) FROM "{table_name}"{where}', params).fetchone()[0]
+
+    def query_box(self, min_longitude, min_latitude, max_longitude, max_latitude, connection=None,
+                  table_name='transformed_data', columns=None):
+        """
+        Loads the rows of a table whose coordinates lie within a bounding box, inclusive.
+
+        :param min_longitude: Western edge of the box, in degrees.
+        :param min_latitude: Southern edge of the box, in degrees.
+        :param max_longitude: Eastern edge of the box, in degrees.
+        :param max_latitude: Northern edge of the box, in degrees.
+        :param connection: Optional SQLite connection to use instead of a pooled connection.
+        :param table_name: Name of the table to query.
+        :param columns: Columns to load; defaults to every column.
+        :return: DataFrame with a 'source_rowid' column followed by the requested columns, in no particular order.
+        """
+        try:
+            with self.connect(connection) as conn:
+                columns = columns or [row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')]
+                return self.select_box(conn, table_name, columns,
+                                       (min_longitude, min_latitude, max_longitude, max_latitude))
+        except Exception as e:
+            raise Exception(f"Loading data from database failed: {e}")
+
+    def query_radius(self, longitude, latitude, radius_km, connection=None, table_name='transformed_data',
+                     columns=None):
+        """
+        Loads the rows of a table within a great-circle distance of a point.
+
+        :param longitude: Longitude of the point, in degrees.
+        :param latitude: Latitude of the point, in degrees.
+        :param radius_km: Distance in kilometres.
+        :param connection: Optional SQLite connection to use instead of a pooled connection.
+        :param table_name: Name of the table to query.
+        :param columns: Columns to load; defaults to every column.
+        :return: DataFrame with a 'source_rowid' column, the requested columns and a 'distance_km' column, nearest
+                 first.
+        """
+        try:
+            with self.connect(connection) as conn:
+                columns = columns or [row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')]
+                candidates = self.select_box(conn, table_name, list(dict.fromkeys([*columns, *SPATIAL_COLUMNS])),
+                                             bounding_box(longitude, latitude, radius_km))
+            return self.by_distance(candidates, longitude, latitude, columns, max_distance=radius_km)
+        except Exception as e:
+            raise Exception(f"Loading data from database failed: {e}")
+
+    def query_nearest(self, longitude, latitude, k, connection=None, table_name='transformed_data', columns=None,
+                      initial_radius_km=1.0):
+        """
+        Loads the k rows of a table nearest to a point by great-circle distance.
+
+        The search radius grows fourfold until its bounding box holds k rows, then the rows within the distance of the
+        k-th nearest candidate are read, so that no row outside the result can be nearer.
+
+        :param longitude: Longitude of the point, in degrees.
+        :param latitude: Latitude of the point, in degrees.
+        :param k: Number of rows to load.
+        :param connection: Optional SQLite connection to use instead of a pooled connection.
+        :param table_name: Name of the table to query.
+        :param columns: Columns to load; defaults to every column.
+        :param initial_radius_km: Radius of the first search box.
+        :return: DataFrame with a 'source_rowid' column, the requested columns and a 'distance_km' column, nearest
+                 first. Ties at the k-th distance are broken arbitrarily.
+        """
+        try:
+            with self.connect(connection) as conn:
+                columns = columns or [row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')]
+                fetched = list(dict.fromkeys([*columns, *SPATIAL_COLUMNS]))
+                radius_km = initial_radius_km
+                # A radius of half the Earth's circumference covers every point
+                while radius_km < math.pi * EARTH_RADIUS_KM and \
+                        self.box_count(conn, table_name, bounding_box(longitude, latitude, radius_km)) < k:
+                    radius_km *= 4
+                candidates = self.select_box(conn, table_name, fetched, bounding_box(longitude, latitude, radius_km))
+
+                distances = haversine_km(longitude, latitude, candidates[SPATIAL_COLUMNS[0]],
+                                         candidates[SPATIAL_COLUMNS[1]])
+                kth_distance = float(np.partition(distances, k - 1)[k - 1]) if len(distances) >= k > 0 else 0.0
+                # Rows in the corners of the box can be farther than rows just outside it
+                if kth_distance > radius_km:
+                    candidates = self.select_box(conn, table_name, fetched,
+                                                 bounding_box(longitude, latitude, kth_distance))
+            return self.by_distance(candidates, longitude, latitude, columns).head(k).reset_index(drop=True)
+        except Exception as e:
+            raise Exception(f"Loading data from database failed: {e}")
+
+    def by_distance(self, candidates, longitude, latitude, columns, max_distance=None):
+        """
+        Adds the distance to a point to candidate rows and sorts them by it.
+
+        :param candidates: DataFrame with a 'source_rowid' column, the requested columns and SPATIAL_COLUMNS.
+        :param longitude: Longitude of the point, in degrees.
+        :param latitude: Latitude of the point, in degrees.
+        :param columns: Requested columns, kept in the result.
+        :param max_distance: Optional distance in kilometres beyond which rows are dropped.
+        :return: DataFrame with 'source_rowid', the requested columns and 'distance_km', nearest first.
+        """
+        distances = haversine_km(longitude, latitude, candidates[SPATIAL_COLUMNS[0]], candidates[SPATIAL_COLUMNS[1]])
+        result = candidates[['source_rowid', *columns]].assign(distance_km=distances)
+        if max_distance is not None:
+            result = result[distances <= max_distance]
+        return result.sort_values('distance_km', kind='stable').reset_index(drop=True)
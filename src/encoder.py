@@ -0,0 +1,141 @@
+from collections.abc import Mapping
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from constants import EXPECTED_COLUMN, COLUMN_MAPPING
+from src.schema import CATEGORIES, DUMMY_COLUMNS, INPUT_NUMERIC_COLUMNS, INPUT_CATEGORICAL_COLUMN
+
+
+class FeatureEncoder:
+    """
+    Class to encode raw input records into model features laid out as EXPECTED_COLUMN, without building DataFrames.
+    """
+
+    def __init__(self, categories=CATEGORIES):
+        """
+        Initialize FeatureEncoder object.
+
+        :param categories: Categories that get a one-hot column; defaults to every category known to the schema.
+        """
+        self.numeric_index = [(EXPECTED_COLUMN.index(col), col) for col in INPUT_NUMERIC_COLUMNS]
+        self.category_index = {}
+        self.row = np.zeros(len(EXPECTED_COLUMN), dtype=np.float32)
+        self.set_categories(categories)
+
+    def set_categories(self, categories):
+        """
+        Rebuilds the category to column index lookup. Categories the schema does not know are ignored.
+
+        :param categories: Iterable of category values.
+        """
+        observed = set(categories)
+        self.category_index = {category: EXPECTED_COLUMN.index(COLUMN_MAPPING[col])
+                               for category, col in zip(CATEGORIES, DUMMY_COLUMNS) if category in observed}
+
+    def fit(self, values):
+        """
+        Fits the encoder on the categorical values seen in the training data.
+
+        :param values: Array-like of OCEAN_PROXIMITY values.
+        :return: The fitted encoder.
+        """
+        self.set_categories(pd.unique(np.asarray(values, dtype=object)))
+        return self
+
+    def partial_fit(self, values):
+        """
+        Extends the fitted categories with the values seen in another chunk of training data.
+
+        :param values: Array-like of OCEAN_PROXIMITY values.
+        :return: The fitted encoder.
+        """
+        self.set_categories(list(self.category_index) + list(pd.unique(np.asarray(values, dtype=object))))
+        return self
+
+    def encode(self, record, out=None):
+        """
+        Encodes a single input record into a float32 row.
+
+        :param record: Dictionary shaped like PredictionRunner.given_input_data entries.
+        :param out: Optional float32 buffer to write into; defaults to a buffer reused across calls.
+        :return: The filled row buffer.
+        """
+        row = self.row if out is None else out
+        row.fill(0)
+        for index, col in self.numeric_index:
+            row[index] = record[col]
+        index = self.category_index.get(record[INPUT_CATEGORICAL_COLUMN])
+        if index is not None:
+            row[index] = 1
+        return row
+
+    def encode_batch(self, records):
+        """
+        Encodes a batch of input records into a preallocated feature matrix in one vectorized step.
+
+        :param records: Iterable of dictionaries, or a columnar mapping (dictionary of array-likes or DataFrame).
+        :return: A float32 NumPy matrix with one row per record and one column per EXPECTED_COLUMN entry.
+        """
+        if not isinstance(records, (Mapping, pd.DataFrame)):
+            records = list(records)
+            records = {col: [record[col] for record in records]
+                       for col in INPUT_NUMERIC_COLUMNS + [INPUT_CATEGORICAL_COLUMN]}
+
+        categories = np.asarray(records[INPUT_CATEGORICAL_COLUMN], dtype=object)
+        matrix = np.zeros((len(categories), len(EXPECTED_COLUMN)), dtype=np.float32)
+
+        for index, col in self.numeric_index:
+            matrix[:, index] = records[col]
+        for category, index in self.category_index.items():
+            matrix[:, index] = categories == category
+        return matrix
+
+    def save(self, filename):
+        """
+        Save the encoder to a file.
+
+        :param filename: Path where the encoder will be saved.
+        """
+        try:
+            Path(filename).parent.mkdir(parents=True, exist_ok=True)
+            joblib.dump(sorted(self.category_index, key=self.category_index.get), filename)
+        except Exception as e:
+            raise IOError(f"Failed to save encoder: {e}")
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Load an encoder from the specified file.
+
+        :param filename: Path to the file containing the saved encoder.
+        :return: Loaded FeatureEncoder.
+        """
+        try:
+            return cls(joblib.load(filename))
+        except Exception as e:
+            raise IOError(f"Failed to load encoder: {e}")
+
+    @staticmethod
+    def path_for_model(model_filename):
+        """
+        Returns the path of the encoder persisted next to a model file.
+
+        :param model_filename: Path to the model file.
+        :return: Path of the encoder file.
+        """
+        model_filename = Path(model_filename)
+        return model_filename.with_name(f'{model_filename.stem}.encoder.joblib')
+
+    @classmethod
+    def for_model(cls, model_filename):
+        """
+        Load the encoder persisted next to a model, falling back to the schema defaults when there is none.
+
+        :param model_filename: Path to the model file.
+        :return: FeatureEncoder matching the model.
+        """
+        filename = cls.path_for_model(model_filename)
+        return cls.load(filename) if filename.exists() else cls()
@@ -1,8 +1,16 @@
+import logging
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
 
-from constants import RANDOM_STATE, TEST_SIZE, FILTERED_COLUMNS, DROP_COLUMN, COLUMN_MAPPING
+from constants import DATABASE_NAME, RANDOM_STATE, TEST_SIZE, DROP_COLUMN, COLUMN_MAPPING, CHUNK_SIZE, NULL_SENTINELS
 from src.database import DatabaseHandler
+from src.encoder import FeatureEncoder
+from src.incremental import ETLManifest, file_hash, row_keys
+from src.profiling import stage
+from src.statistics import DatasetProfile, ProfileStore
+from src.schema import CATEGORICAL_COLUMN, TARGET_COLUMN, read_raw_csv, conform_features
 
 
 class DataProcessor:
@@ -10,46 +18,326 @@ class DataProcessor:
     Class for processing housing data and preparing it for training.
     """
 
-    def prepare_data(self, input_data_path):
+    def __init__(self, database_name=DATABASE_NAME):
+        """
+        Initialize DataProcessor object.
+
+        :param database_name: Name of the SQLite database the transformed data and statistics are written to.
+        """
+        self.database_name = database_name
+        self.encoder = FeatureEncoder()
+        # Statistics of the raw data of the last run, recorded in the database by record_profile
+        self.profile = None
+        self.profile_source = None
+        self.profile_run_id = None
+
+    def clean_data(self, df):
+        """
+        Removes incomplete rows from the raw housing data in a single boolean-mask pass.
+
+        A row is dropped when any value is NaN or any non-numeric value is one of NULL_SENTINELS. Rows matching both
+        reasons are counted under 'nan'.
+
+        :param df: DataFrame containing raw housing data.
+        :return: Tuple containing the cleaned DataFrame and a dictionary of dropped row counts per reason.
+        """
+        nan_mask = df.isna().any(axis=1).to_numpy()
+        sentinel_mask = df.select_dtypes(exclude='number').isin(NULL_SENTINELS).any(axis=1).to_numpy() & ~nan_mask
+
+        drop_counts = {'nan': int(nan_mask.sum()), 'sentinel': int(sentinel_mask.sum())}
+        return df[~(nan_mask | sentinel_mask)], drop_counts
+
+    def transform_data(self, df):
+        """
+        One-hot encodes and renames cleaned housing data against the fixed schema in src.schema.
+
+        Categories missing from the input are filled with zeros, so every chunk of a file produces the same columns
+        with the same compact dtypes.
+
+        :param df: DataFrame containing cleaned housing data.
+        :return: Tuple containing the transformed features and the target values.
+        """
+        # Separate features and target variable
+        df_features = df.drop(DROP_COLUMN, axis=1)
+        y = df[TARGET_COLUMN].to_numpy(dtype='float32')
+
+        # One-hot encode categorical features
+        df_features = pd.get_dummies(df_features, columns=[CATEGORICAL_COLUMN])
+
+        # Rename columns for consistency and conform them to the fixed schema
+        df_features = df_features.rename(columns=COLUMN_MAPPING)
+        df_features = conform_features(df_features)
+        return df_features, y
+
+    def extract_data(self, input_data_path):
+        """
+        Reads, cleans and transforms the housing data from a given CSV file, and fits the serving encoder on it.
+        The statistics of the raw data are kept in self.profile until load_data records them.
+
+        :param input_data_path: Path to the CSV file containing housing data.
+        :return: Tuple containing the transformed features and the target values.
+        """
+        try:
+            # Read the data from CSV
+            with stage('csv_read') as metrics:
+                df = read_raw_csv(input_data_path)
+                metrics['rows'] = len(df)
+
+            with stage('statistics') as metrics:
+                self.start_profile(input_data_path).update(df)
+                metrics['rows'] = len(df)
+
+            with stage('cleaning') as metrics:
+                df, drop_counts = self.clean_data(df)
+                metrics['rows'] = len(df)
+            self.profile.record_drops(drop_counts)
+            logging.info(f'Dropped rows during cleaning: {drop_counts}')
+
+            with stage('encoding') as metrics:
+                df_features, y = self.transform_data(df)
+                # Fit the serving encoder on the training categories
+                self.encoder.fit(df[CATEGORICAL_COLUMN])
+                metrics['rows'] = len(df_features)
+            return df_features, y
+
+        except Exception as e:
+            raise Exception(f"Error in data extraction: {e}")
+
+    def load_data(self, df_features, connection=None, table_name='transformed_data'):
+        """
+        Saves transformed data to the database, replacing the table, and records the statistics collected by
+        extract_data.
+
+        :param df_features: DataFrame of transformed features.
+        :param connection: Optional SQLite connection the transformed data is written to.
+        :param table_name: Name of the table where the transformed data will be saved.
+        """
+        with stage('sqlite_write') as metrics:
+            DatabaseHandler(self.database_name).bulk_load(df_features, connection, table_name)
+            self.reset_manifest(connection, table_name)
+            metrics['rows'] = len(df_features)
+        if self.profile is not None:
+            self.record_profile(connection, table_name)
+
+    def split_data(self, df_features, y):
+        """
+        Performs the train-test split of transformed data.
+
+        :param df_features: DataFrame of transformed features.
+        :param y: Target values.
+        :return: Tuple containing split data (X_train, X_test, y_train, y_test).
+        """
+        # Imported here so that the streaming and incremental modes do not load sklearn
+        from sklearn.model_selection import train_test_split
+
+        with stage('split') as metrics:
+            split = train_test_split(df_features, y, test_size=TEST_SIZE, random_state=RANDOM_STATE)
+            metrics['rows'] = len(df_features)
+        return split
+
+    def prepare_data(self, input_data_path, connection=None):
         """
         Processes the housing data from a given CSV file and saves the transformed data to the database.
         The function also performs a train-test split on the data.
 
         :param input_data_path: Path to the CSV file containing housing data.
+        :param connection: Optional SQLite connection the transformed data is written to.
         :return: Tuple containing split data (X_train, X_test, y_train, y_test).
         """
         try:
-            # Read the data from CSV
-            df = pd.read_csv(input_data_path)
-            # Drop rows with NaN values
-            df = df.dropna()
+            df_features, y = self.extract_data(input_data_path)
+            self.load_data(df_features, connection)
+            return self.split_data(df_features, y)
 
-            # Drop rows with 'Null' values in categorical columns
-            for col in df.columns[df.dtypes == 'O']:
-                df.drop(df[df[col] == 'Null'].index, inplace=True)
+        except Exception as e:
+            raise Exception(f"Error in data preparation: {e}")
 
-            # Separate features and target variable
-            df_features = df.drop(DROP_COLUMN, axis=1)
-            y = df['MEDIAN_HOUSE_VALUE'].values
+    def stream_data(self, input_data_path, connection=None, chunksize=CHUNK_SIZE, table_name='transformed_data'):
+        """
+        Processes the housing data from a given CSV file in bounded chunks and writes each transformed chunk to the
+        database as soon as it is ready, so memory usage does not grow with the size of the input.
+        The resulting table matches the one written by prepare_data row for row.
 
-            # One-hot encode categorical features
-            df_features = pd.get_dummies(df_features, columns=['OCEAN_PROXIMITY'])
+        :param input_data_path: Path to the CSV file containing housing data.
+        :param connection: Optional SQLite connection the transformed data is written to.
+        :param chunksize: Number of CSV rows read per chunk.
+        :param table_name: Name of the table where the transformed data will be saved.
+        :return: Number of transformed rows written to the database.
+        """
+        try:
+            database_handler = DatabaseHandler(self.database_name)
+            if_exists = 'replace'
+            rows_written = 0
+            total_drop_counts = {}
+            self.encoder = FeatureEncoder([])
+            self.start_profile(input_data_path)
 
-            # Filter relevant columns
-            filtered_columns = FILTERED_COLUMNS
-            df_features = df_features.loc[:, filtered_columns]
+            chunks = read_raw_csv(input_data_path, chunksize=chunksize)
+            while True:
+                with stage('csv_read') as metrics:
+                    chunk = next(chunks, None)
+                    metrics['rows'] = 0 if chunk is None else len(chunk)
+                if chunk is None:
+                    break
 
-            # Rename columns for consistency
-            column_mapping = COLUMN_MAPPING
-            df_features.rename(columns=column_mapping, inplace=True)
+                with stage('statistics') as metrics:
+                    self.profile.update(chunk)
+                    metrics['rows'] = len(chunk)
 
-            # Save transformed data to the database
-            DatabaseHandler().save_to_database(df_features)
+                with stage('cleaning') as metrics:
+                    chunk, drop_counts = self.clean_data(chunk)
+                    metrics['rows'] = len(chunk)
+                self.profile.record_drops(drop_counts)
+                for reason, count in drop_counts.items():
+                    total_drop_counts[reason] = total_drop_counts.get(reason, 0) + count
 
-            # Perform train-test split
-            X_train, X_test, y_train, y_test = train_test_split(df_features, y, test_size=TEST_SIZE,
-                                                                random_state=RANDOM_STATE)
-            return X_train, X_test, y_train, y_test
+                with stage('encoding') as metrics:
+                    df_features, _ = self.transform_data(chunk)
+                    self.encoder.partial_fit(chunk[CATEGORICAL_COLUMN])
+                    metrics['rows'] = len(df_features)
+
+                with stage('sqlite_write') as metrics:
+                    database_handler.bulk_load(df_features, connection, table_name, if_exists=if_exists)
+                    metrics['rows'] = len(df_features)
+                if_exists = 'append'
+                rows_written += len(df_features)
+
+            logging.info(f'Dropped rows during cleaning: {total_drop_counts}')
+            self.reset_manifest(connection, table_name)
+            self.record_profile(connection, table_name)
+            return rows_written
 
         except Exception as e:
-            raise Exception(f"Error in data preparation: {e}")
+            raise Exception(f"Error in streaming data preparation: {e}")
+
+    def incremental_data(self, input_data_path, connection=None, table_name='transformed_data'):
+        """
+        Processes the housing data from a given CSV file incrementally: an unchanged file is skipped using its content
+        hash, otherwise only rows that are new since the last run are transformed and inserted, and rows that are no
+        longer in the file are deleted. A changed row counts as one deleted and one new row. The statistics of the
+        whole file are recorded unless it is skipped.
+
+        Tables built by prepare_data or stream_data are replaced on the first incremental run.
+
+        :param input_data_path: Path to the CSV file containing housing data.
+        :param connection: Optional SQLite connection the transformed data is written to.
+        :param table_name: Name of the table where the transformed data will be saved.
+        :return: Dictionary with the number of inserted and deleted rows and whether the file was unchanged.
+        """
+        try:
+            source = str(Path(input_data_path).resolve())
+            content_hash = file_hash(input_data_path)
+            database_handler = DatabaseHandler(self.database_name)
+            if database_handler.storage is not None:
+                raise ValueError("the incremental ETL diffs rows by SQLite rowid and requires the sqlite backend")
+
+            with database_handler.transaction(connection) as conn:
+                manifest = ETLManifest(conn)
+                if manifest.content_hash(table_name, source) == content_hash:
+                    logging.info(f'Skipping unchanged input {source}')
+                    return {'inserted': 0, 'deleted': 0, 'unchanged': True}
+
+                with stage('csv_read') as metrics:
+                    df = read_raw_csv(input_data_path)
+                    metrics['rows'] = len(df)
+                with stage('statistics') as metrics:
+                    self.start_profile(input_data_path).update(df)
+                    metrics['rows'] = len(df)
+                with stage('cleaning') as metrics:
+                    df, drop_counts = self.clean_data(df)
+                    metrics['rows'] = len(df)
+                self.profile.record_drops(drop_counts)
+                logging.info(f'Dropped rows during cleaning: {drop_counts}')
+                keys = row_keys(df)
+
+                # A table without manifest entries was written by a full load and cannot be diffed
+                if not manifest.has_sources(table_name):
+                    conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+
+                known_keys, known_rowids = manifest.row_index(table_name, source)
+                removed = ~np.isin(known_keys, keys)
+                added = ~np.isin(keys, known_keys)
+
+                if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                (table_name,)).fetchone():
+                    conn.executemany(f'DELETE FROM "{table_name}" WHERE rowid = ?',
+                                     ((rowid,) for rowid in known_rowids[removed].tolist()))
+                    max_rowid = conn.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM "{table_name}"').fetchone()[0]
+                else:
+                    max_rowid = 0
+                manifest.delete_rows(table_name, source, known_keys[removed])
+
+                # SQLite assigns max(rowid) + 1 to every appended row, so the new rowids are known in advance
+                with stage('encoding') as metrics:
+                    df_features, _ = self.transform_data(df[added])
+                    metrics['rows'] = len(df_features)
+                with stage('sqlite_write') as metrics:
+                    database_handler.append_rows(conn, df_features, table_name)
+                    manifest.add_rows(table_name, source, keys[added],
+                                      np.arange(1, len(df_features) + 1) + max_rowid)
+                    metrics['rows'] = len(df_features)
+                manifest.record(table_name, source, content_hash, len(df))
+
+            self.record_profile(connection, table_name)
+            changes = {'inserted': int(added.sum()), 'deleted': int(removed.sum()), 'unchanged': False}
+            logging.info(f'Incremental load of {source}: {changes}')
+            return changes
+
+        except Exception as e:
+            raise Exception(f"Error in incremental data preparation: {e}")
+
+    def reset_manifest(self, connection=None, table_name='transformed_data'):
+        """
+        Clears the incremental ETL manifest of a table after it was rewritten by a full load.
+
+        :param connection: Optional SQLite connection to use.
+        :param table_name: Name of the rewritten table.
+        """
+        with DatabaseHandler(self.database_name).transaction(connection) as conn:
+            ETLManifest(conn).reset(table_name)
+
+    def start_profile(self, input_data_path):
+        """
+        Starts collecting the statistics of a new run.
+
+        :param input_data_path: Path to the CSV file the run reads.
+        :return: The empty DatasetProfile of the run.
+        """
+        self.profile = DatasetProfile()
+        self.profile_source = str(Path(input_data_path).resolve())
+        self.profile_run_id = None
+        return self.profile
+
+    def record_profile(self, connection=None, table_name='transformed_data'):
+        """
+        Records the statistics of the last run in the database and compares them against the training profile.
+        Every difference beyond DRIFT_THRESHOLDS is logged as a warning and stored with the run.
+
+        :param connection: Optional SQLite connection to use.
+        :param table_name: Name of the table the run loaded.
+        :return: List of drift findings, empty when nothing drifted or no training profile was recorded yet.
+        """
+        if self.profile is None:
+            raise ValueError("no statistics were collected; extract, stream or incrementally load data first")
+        with DatabaseHandler(self.database_name).transaction(connection) as conn:
+            store = ProfileStore(conn)
+            reference = store.training_profile()
+            drift = self.profile.compare(reference) if reference is not None else []
+            self.profile_run_id = store.save(table_name, self.profile_source, self.profile, drift)
+        for finding in drift:
+            logging.warning(f'Drift in {finding["column"]} {finding["metric"]}: {finding["value"]:.4g} against '
+                            f'{finding["reference"]:.4g} at training (threshold {finding["threshold"]})')
+        return drift
+
+    def mark_training_profile(self, connection=None, table_name='transformed_data'):
+        """
+        Makes the statistics of the last run the training profile later runs are compared against, recording them
+        first if needed.
+
+        :param connection: Optional SQLite connection to use.
+        :param table_name: Name of the table the run loaded, used when the statistics were not recorded yet.
+        """
+        if self.profile_run_id is None:
+            self.record_profile(connection, table_name)
+        with DatabaseHandler(self.database_name).transaction(connection) as conn:
+            ProfileStore(conn).mark_training(self.profile_run_id)
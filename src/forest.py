@@ -0,0 +1,337 @@
+import hashlib
+import os
+import struct
+from pathlib import Path
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor
+
+# (tree, row) pairs traversed together; their working arrays stay in cache across levels
+TILE_SIZE = 32_768
+
+# Compact artifact: a fixed header followed by the node arrays, each aligned so that it can be memory-mapped in place
+ARTIFACT_MAGIC = b'CFOREST\x00'
+ARTIFACT_VERSION = 2
+# Version 1 artifacts lack the direction of missing values and are still loaded
+SUPPORTED_ARTIFACT_VERSIONS = (1, 2)
+# magic, version, leaf encoding, n_trees, n_nodes, max_depth, n_features, leaf scale, leaf offset, payload checksum
+ARTIFACT_HEADER = struct.Struct('<8sHHIIIIdd32s')
+ARTIFACT_ALIGNMENT = 64
+# Leaf value dtype per encoding stored in the header; integer encodings are scaled back with the header's scale/offset
+LEAF_ENCODINGS = {0: np.dtype('<f4'), 1: np.dtype('u1'), 2: np.dtype('<u2')}
+
+
+def float32_thresholds(thresholds):
+    """
+    Rounds split thresholds down to float32, so that comparing float32 features against them gives the same result as
+    sklearn comparing the features against the float64 thresholds.
+
+    :param thresholds: float64 thresholds.
+    :return: float32 thresholds.
+    """
+    rounded = thresholds.astype(np.float32)
+    above = rounded.astype(np.float64) > thresholds
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+
+def aligned(offset):
+    """
+    Rounds a file offset up to the artifact alignment.
+    """
+    return -(-offset // ARTIFACT_ALIGNMENT) * ARTIFACT_ALIGNMENT
+
+
+def artifact_layout(n_trees, n_nodes, leaf_dtype, version):
+    """
+    Returns where every array of a compact artifact is stored.
+
+    :param n_trees: Number of trees.
+    :param n_nodes: Number of nodes of all trees.
+    :param leaf_dtype: dtype of the stored leaf values.
+    :param version: Format version of the artifact.
+    :return: List of (name, dtype, offset, count) tuples, in file order, and the total file size.
+    """
+    arrays = [('roots', np.dtype('<i4'), n_trees), ('feature', np.dtype('u1'), n_nodes),
+              ('threshold', np.dtype('<f4'), n_nodes), ('left', np.dtype('<i4'), n_nodes),
+              ('value', leaf_dtype, n_nodes)]
+    if version >= 2:
+        arrays.append(('missing_right', np.dtype('u1'), n_nodes))
+    layout = []
+    offset = aligned(ARTIFACT_HEADER.size)
+    for name, dtype, count in arrays:
+        layout.append((name, dtype, offset, count))
+        offset = aligned(offset + dtype.itemsize * count)
+    return layout, offset
+
+
+def breadth_first_order(tree):
+    """
+    Returns the nodes of a fitted sklearn tree in breadth-first order, so that the two children of every split are
+    adjacent.
+
+    :param tree: sklearn Tree object.
+    :return: Array of node indices.
+    """
+    levels = [np.zeros(1, dtype=np.int64)]
+    while True:
+        splits = levels[-1][tree.children_left[levels[-1]] != -1]
+        if not len(splits):
+            return np.concatenate(levels)
+        levels.append(np.stack([tree.children_left[splits], tree.children_right[splits]], axis=1).reshape(-1))
+
+
+class CompiledForest:
+    """
+    Class to evaluate a fitted regression forest from flat NumPy arrays instead of sklearn's per-tree estimators.
+
+    The nodes of all trees are concatenated into contiguous arrays, each tree in breadth-first order so that the right
+    child of a split directly follows its left child. A batch is traversed in tiles of (tree, row) pairs that advance
+    one level per step with a handful of vectorized operations: small batches take every tree in one tile, so the
+    Python overhead depends on the depth of the trees rather than on their number, and large batches take few trees
+    per tile, so that the nodes they touch stay in cache.
+    """
+
+    def __init__(self, feature, threshold, left, value, roots, max_depth, n_features, value_scale=1.0,
+                 value_offset=0.0, missing_right=None):
+        """
+        Initialize CompiledForest object. Use from_estimator to compile a fitted model.
+
+        :param feature: Feature index of every node; 0 for leaves.
+        :param threshold: float32 split threshold of every node; rows whose feature is > threshold go right. Leaves
+                          have a threshold of +inf.
+        :param left: Index of the left child of every node, the right child being the next node. Leaves point to
+                     themselves, so that a traversal can run for max_depth levels without branching.
+        :param value: Prediction of every node, possibly quantized.
+        :param roots: Index of the root node of every tree.
+        :param max_depth: Depth of the deepest tree.
+        :param n_features: Number of input features.
+        :param value_scale: Scale of quantized values; a node predicts value * value_scale + value_offset.
+        :param value_offset: Offset of quantized values.
+        :param missing_right: Whether rows whose feature is missing (NaN) go right at every node, as sklearn's
+                              missing_go_to_left decides; 0 for leaves. None when unknown, in which case predicting
+                              rows with missing values raises a ValueError.
+
+        The arrays may be read-only memory maps of a compact artifact, see load.
+        """
+        self.feature = np.asarray(feature)
+        self.threshold = np.asarray(threshold, dtype=np.float32)
+        self.left = np.asarray(left)
+        self.value = np.asarray(value)
+        self.roots = np.asarray(roots, dtype=np.int64)
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.value_scale = float(value_scale)
+        self.value_offset = float(value_offset)
+        self.missing_right = None if missing_right is None else np.asarray(missing_right, dtype=np.uint8)
+        # Left child and feature packed in one integer, so that a level reads both with a single gather
+        self.feature_bits = max(1, (self.n_features - 1).bit_length())
+        self.packed = (self.left.astype(np.int64) << self.feature_bits) | self.feature
+
+    @classmethod
+    def from_estimator(cls, model):
+        """
+        Compiles a fitted RandomForestRegressor or DecisionTreeRegressor with a single output.
+
+        :param model: Fitted estimator.
+        :return: CompiledForest instance.
+        """
+        if isinstance(model, RandomForestRegressor):
+            trees = [estimator.tree_ for estimator in model.estimators_]
+        elif isinstance(model, DecisionTreeRegressor):
+            trees = [model.tree_]
+        else:
+            raise ValueError(f"cannot compile a {type(model).__name__}")
+        if trees[0].n_outputs != 1:
+            raise ValueError("only single-output models can be compiled")
+
+        feature, threshold, left, value, roots, missing_right = [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            order = breadth_first_order(tree)
+            position = np.empty(tree.node_count, dtype=np.int64)
+            position[order] = np.arange(tree.node_count) + offset
+            leaf = tree.children_left[order] == -1
+
+            feature.append(np.where(leaf, 0, tree.feature[order]))
+            threshold.append(np.where(leaf, np.float32(np.inf), float32_thresholds(tree.threshold[order])))
+            left.append(np.where(leaf, position[order], position[np.maximum(tree.children_left[order], 0)]))
+            value.append(tree.value[order, 0, 0])
+            # Trees of sklearn releases without missing value support reject NaN inputs, and so does the compiled forest
+            if hasattr(tree, 'missing_go_to_left'):
+                missing_right.append(np.where(leaf, 0, 1 - tree.missing_go_to_left[order]))
+            roots.append(offset)
+            offset += tree.node_count
+
+        return cls(np.concatenate(feature), np.concatenate(threshold), np.concatenate(left), np.concatenate(value),
+                   roots, max(tree.max_depth for tree in trees), model.n_features_in_,
+                   missing_right=np.concatenate(missing_right) if missing_right else None)
+
+    def save(self, filename, leaf_bits=None):
+        """
+        Writes the forest as a compact artifact: uint8 feature ids, float32 thresholds, int32 left children,
+        float32 leaf values, or leaf values quantized to leaf_bits unsigned integers, and the uint8 direction of
+        missing values. The header records the format version and a checksum of the arrays. The file is written under
+        a temporary name and then renamed.
+
+        :param filename: Path of the artifact.
+        :param leaf_bits: None to store float32 leaf values, or 8 or 16 to quantize them linearly over their range.
+        """
+        try:
+            if self.n_features > 256:
+                raise ValueError(f"{self.n_features} features do not fit uint8 feature ids")
+            if len(self.left) >= 2 ** 31:
+                raise ValueError(f"{len(self.left)} nodes do not fit int32 child indices")
+
+            value = self.value * self.value_scale + self.value_offset
+            if leaf_bits is None:
+                encoding, scale, offset = 0, 1.0, 0.0
+                stored_value = value
+            elif leaf_bits in (8, 16):
+                encoding = 1 if leaf_bits == 8 else 2
+                offset = float(value.min())
+                scale = max(float(value.max()) - offset, 1e-12) / (2 ** leaf_bits - 1)
+                stored_value = np.rint((value - offset) / scale)
+            else:
+                raise ValueError(f"unsupported leaf_bits {leaf_bits}")
+
+            if self.missing_right is None:
+                raise ValueError("the direction of missing values is unknown")
+            arrays = {'roots': self.roots, 'feature': self.feature, 'threshold': self.threshold, 'left': self.left,
+                      'value': stored_value, 'missing_right': self.missing_right}
+            layout, size = artifact_layout(self.n_trees, len(self.left), LEAF_ENCODINGS[encoding], ARTIFACT_VERSION)
+            payload = bytearray(size - aligned(ARTIFACT_HEADER.size))
+            for name, dtype, array_offset, count in layout:
+                start = array_offset - aligned(ARTIFACT_HEADER.size)
+                payload[start:start + dtype.itemsize * count] = np.asarray(arrays[name]).astype(dtype).tobytes()
+
+            header = ARTIFACT_HEADER.pack(ARTIFACT_MAGIC, ARTIFACT_VERSION, encoding, self.n_trees, len(self.left),
+                                          self.max_depth, self.n_features, scale, offset,
+                                          hashlib.blake2b(payload, digest_size=32).digest())
+            partial_filename = f'{filename}.partial'
+            with open(partial_filename, 'wb') as file:
+                file.write(header.ljust(aligned(ARTIFACT_HEADER.size), b'\x00'))
+                file.write(payload)
+            os.replace(partial_filename, filename)
+        except Exception as e:
+            raise IOError(f"Failed to save compiled forest: {e}")
+
+    @classmethod
+    def load(cls, filename, verify=True):
+        """
+        Loads a compact artifact written by save. The node arrays are read-only memory maps of the file, so loading
+        does not copy them and processes serving the same file share its pages.
+
+        :param filename: Path of the artifact.
+        :param verify: Whether to check the payload against the checksum of the header.
+        :return: CompiledForest instance.
+        """
+        try:
+            data = np.memmap(filename, dtype=np.uint8, mode='r')
+            header_size = aligned(ARTIFACT_HEADER.size)
+            if len(data) < header_size:
+                raise ValueError("file is too short")
+            magic, version, encoding, n_trees, n_nodes, max_depth, n_features, scale, offset, checksum = \
+                ARTIFACT_HEADER.unpack_from(data)
+            if magic != ARTIFACT_MAGIC:
+                raise ValueError("not a compiled forest artifact")
+            if version not in SUPPORTED_ARTIFACT_VERSIONS:
+                raise ValueError(f"unsupported artifact version {version}")
+            layout, size = artifact_layout(n_trees, n_nodes, LEAF_ENCODINGS[encoding], version)
+            if len(data) != size:
+                raise ValueError(f"expected {size} bytes, found {len(data)}")
+            if verify and hashlib.blake2b(data[header_size:], digest_size=32).digest() != checksum:
+                raise ValueError("checksum mismatch")
+
+            arrays = {name: data[array_offset:array_offset + dtype.itemsize * count].view(dtype)
+                      for name, dtype, array_offset, count in layout}
+            return cls(arrays['feature'], arrays['threshold'], arrays['left'], arrays['value'], arrays['roots'],
+                       max_depth, n_features, scale, offset, arrays.get('missing_right'))
+        except Exception as e:
+            raise IOError(f"Failed to load compiled forest: {e}")
+
+    @staticmethod
+    def path_for_model(model_filename):
+        """
+        Returns the path of the compact artifact exported next to a model file.
+
+        :param model_filename: Path to the model file.
+        :return: Path of the artifact.
+        """
+        model_filename = Path(model_filename)
+        return model_filename.with_name(f'{model_filename.stem}.forest')
+
+    @staticmethod
+    def is_artifact(filename):
+        """
+        Returns whether a file starts with the compact artifact magic.
+        """
+        with open(filename, 'rb') as file:
+            return file.read(len(ARTIFACT_MAGIC)) == ARTIFACT_MAGIC
+
+    @property
+    def n_trees(self):
+        """
+        Number of trees of the forest.
+        """
+        return len(self.roots)
+
+    def apply(self, X, roots, has_missing=False):
+        """
+        Returns the leaf reached by every row in every given tree.
+
+        :param X: float32 C-contiguous matrix of shape (n_rows, n_features).
+        :param roots: Root nodes of the trees to traverse.
+        :param has_missing: Whether X contains NaN, which then follows missing_right instead of going left.
+        :return: Array of shape (n_trees, n_rows) of node indices.
+        """
+        flat_X = X.reshape(-1)
+        row_offsets = np.arange(len(X), dtype=np.int64) * self.n_features
+        feature_mask = (1 << self.feature_bits) - 1
+
+        nodes = np.repeat(roots[:, None], len(X), axis=1)
+        packed = np.empty_like(nodes)
+        index = np.empty_like(nodes)
+        values = np.empty(nodes.shape, dtype=np.float32)
+        thresholds = np.empty(nodes.shape, dtype=np.float32)
+        go_right = np.empty(nodes.shape, dtype=bool)
+        missing = np.empty(nodes.shape, dtype=bool) if has_missing else None
+        for _ in range(self.max_depth):
+            np.take(self.packed, nodes, out=packed, mode='clip')
+            np.bitwise_and(packed, feature_mask, out=index)
+            index += row_offsets
+            np.take(flat_X, index, out=values, mode='clip')
+            np.take(self.threshold, nodes, out=thresholds, mode='clip')
+            np.greater(values, thresholds, out=go_right)
+            if has_missing:
+                np.isnan(values, out=missing)
+                missing &= np.take(self.missing_right, nodes, mode='clip').view(bool)
+                go_right |= missing
+            np.right_shift(packed, self.feature_bits, out=nodes)
+            nodes += go_right
+        return nodes
+
+    def predict(self, X):
+        """
+        Predicts the target of every row as the mean of the tree predictions, like RandomForestRegressor.predict.
+
+        :param X: Feature matrix or DataFrame with the columns the model was trained on, in the same order.
+        :return: float64 array of predictions.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"expected {self.n_features} features, got an array of shape {X.shape}")
+        has_missing = bool(np.isnan(X).any())
+        if has_missing and self.missing_right is None:
+            raise ValueError("the input contains NaN and the forest does not record where missing values go")
+
+        block_rows = max(1, min(len(X), TILE_SIZE))
+        block_trees = max(1, TILE_SIZE // block_rows)
+        predictions = np.zeros(len(X))
+        for start in range(0, len(X), block_rows):
+            block = X[start:start + block_rows]
+            for first_tree in range(0, self.n_trees, block_trees):
+                leaves = self.apply(block, self.roots[first_tree:first_tree + block_trees], has_missing)
+                predictions[start:start + len(block)] += self.value[leaves].sum(axis=0, dtype=np.float64)
+        return predictions / self.n_trees * self.value_scale + self.value_offset
@@ -0,0 +1,115 @@
+import hashlib
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+# Tables tracking what the incremental ETL has already loaded
+MANIFEST_TABLE = 'etl_manifest'
+ROW_INDEX_TABLE = 'etl_row_index'
+
+
+def file_hash(path, block_size=1 << 20):
+    """
+    Computes the SHA-256 digest of a file's content without loading it into memory at once.
+
+    :param path: Path to the file.
+    :param block_size: Number of bytes read per block.
+    :return: Hex digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def row_keys(df):
+    """
+    Computes a stable key per row from its content. Identical rows get distinct keys by their order of occurrence,
+    so duplicates in a source are tracked individually.
+
+    :param df: DataFrame of raw rows.
+    :return: int64 NumPy array with one key per row.
+    """
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    occurrence = pd.Series(hashes).groupby(hashes).cumcount().to_numpy()
+    keys = pd.util.hash_pandas_object(pd.DataFrame({'row': hashes, 'occurrence': occurrence}), index=False)
+    return keys.to_numpy().view(np.int64)
+
+
+class ETLManifest:
+    """
+    Class to read and update the manifest of inputs processed by the incremental ETL.
+
+    The manifest stores the content hash of every source file loaded into a table, and the row index maps the key of
+    every loaded row to its rowid in that table.
+    """
+
+    def __init__(self, conn):
+        """
+        Initialize ETLManifest object and create its tables if needed.
+
+        :param conn: SQLite connection, usually inside a DatabaseHandler.transaction scope.
+        """
+        self.conn = conn
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} ('
+                          'table_name TEXT, source TEXT, content_hash TEXT, row_count INTEGER, processed_at TEXT, '
+                          'PRIMARY KEY (table_name, source))')
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS {ROW_INDEX_TABLE} ('
+                          'table_name TEXT, source TEXT, row_key INTEGER, data_rowid INTEGER, '
+                          'PRIMARY KEY (table_name, source, row_key)) WITHOUT ROWID')
+
+    def content_hash(self, table_name, source):
+        """
+        Returns the content hash recorded for a source, or None if it was never loaded into the table.
+        """
+        row = self.conn.execute(f'SELECT content_hash FROM {MANIFEST_TABLE} WHERE table_name = ? AND source = ?',
+                                (table_name, source)).fetchone()
+        return row[0] if row else None
+
+    def has_sources(self, table_name):
+        """
+        Returns whether any source was loaded incrementally into the table.
+        """
+        return self.conn.execute(f'SELECT 1 FROM {MANIFEST_TABLE} WHERE table_name = ? LIMIT 1',
+                                 (table_name,)).fetchone() is not None
+
+    def row_index(self, table_name, source):
+        """
+        Returns the keys and rowids of the rows loaded from a source.
+
+        :return: Tuple of int64 NumPy arrays (row keys, data rowids).
+        """
+        rows = self.conn.execute(f'SELECT row_key, data_rowid FROM {ROW_INDEX_TABLE} '
+                                 'WHERE table_name = ? AND source = ?', (table_name, source)).fetchall()
+        index = np.array(rows, dtype=np.int64).reshape(-1, 2)
+        return index[:, 0], index[:, 1]
+
+    def add_rows(self, table_name, source, keys, rowids):
+        """
+        Records the keys and rowids of rows newly loaded from a source.
+        """
+        self.conn.executemany(f'INSERT INTO {ROW_INDEX_TABLE} VALUES (?, ?, ?, ?)',
+                              ((table_name, source, key, rowid) for key, rowid in zip(keys.tolist(), rowids.tolist())))
+
+    def delete_rows(self, table_name, source, keys):
+        """
+        Forgets rows of a source that are no longer present in it.
+        """
+        self.conn.executemany(f'DELETE FROM {ROW_INDEX_TABLE} WHERE table_name = ? AND source = ? AND row_key = ?',
+                              ((table_name, source, key) for key in keys.tolist()))
+
+    def record(self, table_name, source, content_hash, row_count):
+        """
+        Records that a source was processed with the given content hash.
+        """
+        self.conn.execute(f'INSERT OR REPLACE INTO {MANIFEST_TABLE} VALUES (?, ?, ?, ?, ?)',
+                          (table_name, source, content_hash, row_count, datetime.now(timezone.utc).isoformat()))
+
+    def reset(self, table_name):
+        """
+        Forgets every source of a table, e.g. after the table was rewritten by a full load.
+        """
+        self.conn.execute(f'DELETE FROM {MANIFEST_TABLE} WHERE table_name = ?', (table_name,))
+        self.conn.execute(f'DELETE FROM {ROW_INDEX_TABLE} WHERE table_name = ?', (table_name,))
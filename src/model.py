@@ -1,5 +1,38 @@
+import copy
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
 import joblib
-from sklearn.ensemble import RandomForestRegressor
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from threadpoolctl import threadpool_limits
+
+from constants import MODEL_CACHE_SIZE, TRAINING_CONFIG
+from src.forest import CompiledForest
+
+# Process-level registry of loaded models keyed by (path, mtime, mmap_mode, compiled), in least recently used order
+_MODEL_CACHE = OrderedDict()
+_MODEL_CACHE_LOCK = threading.Lock()
+
+# Number and total seconds of the load_model calls served from the cache (warm) and from the file (cold)
+_LOAD_STATS = {'warm_loads': 0, 'warm_seconds': 0.0, 'cold_loads': 0, 'cold_seconds': 0.0}
+
+
+def record_load(path, warm, seconds):
+    """
+    Logs a model load and adds it to the load statistics.
+
+    :param path: Path of the loaded file.
+    :param warm: Whether the model was served from the process-level cache.
+    :param seconds: Time load_model took.
+    """
+    kind = 'warm' if warm else 'cold'
+    with _MODEL_CACHE_LOCK:
+        _LOAD_STATS[f'{kind}_loads'] += 1
+        _LOAD_STATS[f'{kind}_seconds'] += seconds
+    logging.debug(f'Loaded model {path} ({kind}) in {seconds * 1000:.3f}ms')
 
 
 class ModelHandler:
@@ -13,17 +46,42 @@ class ModelHandler:
         """
         self.model = None
 
-    def train(self, X_train, y_train):
+    def train(self, X_train, y_train, config=None, model=None):
         """
-        Train a RandomForestRegressor model on the provided training data.
+        Train a model on the provided training data.
 
         :param X_train: Features of the training data.
         :param y_train: Target variable of the training data.
-        :return: Trained RandomForestRegressor model.
+        :param config: Optional overrides of TRAINING_CONFIG (backend, n_jobs, max_threads, estimator parameters).
+                       Estimator parameters are merged into the defaults of their backend.
+        :param model: Optional fitted RandomForestRegressor to grow with warm_start_estimators new trees fitted on
+                      the provided data instead of training from scratch. The model itself is left unchanged and a
+                      grown copy is returned.
+        :return: Trained model.
         """
         try:
-            regr = RandomForestRegressor(max_depth=12)
-            regr.fit(X_train, y_train)
+            overrides = config or {}
+            config = {**TRAINING_CONFIG, **overrides}
+            # Estimator parameters override the defaults of their backend one by one instead of replacing them
+            for backend in ('random_forest', 'hist_gradient_boosting'):
+                config[backend] = {**TRAINING_CONFIG[backend], **overrides.get(backend, {})}
+
+            if model is not None:
+                if not isinstance(model, RandomForestRegressor):
+                    raise ValueError("warm start is only supported for RandomForestRegressor models")
+                # Grow a copy, since the given model may be shared through the model cache
+                regr = copy.deepcopy(model).set_params(
+                    warm_start=True, n_jobs=config['n_jobs'],
+                    n_estimators=model.n_estimators + config['warm_start_estimators'])
+            elif config['backend'] == 'random_forest':
+                regr = RandomForestRegressor(n_jobs=config['n_jobs'], **config['random_forest'])
+            elif config['backend'] == 'hist_gradient_boosting':
+                regr = HistGradientBoostingRegressor(**config['hist_gradient_boosting'])
+            else:
+                raise ValueError(f"unknown backend '{config['backend']}'")
+
+            with threadpool_limits(limits=config['max_threads']):
+                regr.fit(X_train, y_train)
             return regr
         except Exception as e:
             raise ValueError(f"Training failed: {e}")
@@ -41,27 +99,120 @@ class ModelHandler:
         except Exception as e:
             raise ValueError(f"Prediction failed: {e}")
 
-    def save_model(self, model, filename):
+    def save_model(self, model, filename, compress=3):
         """
         Save the given machine learning model to a file.
 
         :param model: Machine learning model to be saved.
         :param filename: Path where the model will be saved.
+        :param compress: joblib compression level. Use 0 to write an uncompressed file that can be loaded with
+                         mmap_mode='r'.
         """
         try:
-            with open(filename, 'wb') as file:
-                joblib.dump(model, file, compress=3)
+            joblib.dump(model, filename, compress=compress)
         except Exception as e:
             raise IOError(f"Failed to save model: {e}")
 
-    def load_model(self, filename):
+    def export_model(self, model, filename, leaf_bits=None):
+        """
+        Export a random forest or decision tree as a compact CompiledForest artifact.
+
+        :param model: Trained machine learning model.
+        :param filename: Path where the artifact will be saved.
+        :param leaf_bits: None to store float32 leaf values, or 8 or 16 to quantize them.
+        :return: Whether the model could be exported; other estimators are skipped.
+        """
+        compiled = self.compile_model(model)
+        if not isinstance(compiled, CompiledForest):
+            return False
+        compiled.save(filename, leaf_bits)
+        return True
+
+    def compile_model(self, model):
+        """
+        Compile a model into a CompiledForest for fast inference, when it is a random forest or a decision tree.
+
+        :param model: Trained machine learning model.
+        :return: CompiledForest, or the model itself when it cannot be compiled.
+        """
+        try:
+            return CompiledForest.from_estimator(model)
+        except ValueError:
+            return model
+
+    def load_model(self, filename, mmap_mode=None, use_cache=True, compiled=False):
         """
         Load a machine learning model from the specified file.
 
+        Loaded models are kept in a process-level LRU cache keyed by path and modification time, so repeated loads
+        return the resident estimator and a rewritten file is picked up automatically. Compact artifacts written by
+        export_model are memory-mapped; with compiled=True the artifact exported next to the model file is used
+        when it is at least as recent as the model. The time of warm (cached) and cold loads is reported by
+        load_stats.
+
         :param filename: Path to the file containing the saved model.
+        :param mmap_mode: Optional joblib memory-map mode (e.g. 'r') for files saved with compress=0.
+        :param use_cache: Whether to look up and store the model in the process-level cache.
+        :param compiled: Whether to return the model compiled by compile_model, for prediction only.
         :return: Loaded machine learning model.
         """
         try:
-            return joblib.load(filename)
+            start_time = time.perf_counter()
+            path = os.path.abspath(filename)
+            if compiled:
+                artifact_path = CompiledForest.path_for_model(path)
+                if artifact_path.exists() and artifact_path.stat().st_mtime_ns >= os.stat(path).st_mtime_ns:
+                    path = str(artifact_path)
+            key = (path, os.stat(path).st_mtime_ns, mmap_mode, compiled)
+
+            if use_cache:
+                with _MODEL_CACHE_LOCK:
+                    model = _MODEL_CACHE.get(key)
+                    if model is not None:
+                        _MODEL_CACHE.move_to_end(key)
+                if model is not None:
+                    record_load(path, True, time.perf_counter() - start_time)
+                    return model
+
+            if CompiledForest.is_artifact(path):
+                model = CompiledForest.load(path)
+            else:
+                model = joblib.load(path, mmap_mode=mmap_mode)
+                if compiled:
+                    model = self.compile_model(model)
+
+            if use_cache:
+                with _MODEL_CACHE_LOCK:
+                    # Drop entries for older versions of the same file before adding the new one
+                    for stale_key in [cached_key for cached_key in _MODEL_CACHE
+                                      if cached_key[0] == path and cached_key[1] != key[1]]:
+                        del _MODEL_CACHE[stale_key]
+                    _MODEL_CACHE[key] = model
+                    while len(_MODEL_CACHE) > MODEL_CACHE_SIZE:
+                        _MODEL_CACHE.popitem(last=False)
+            record_load(path, False, time.perf_counter() - start_time)
+            return model
         except Exception as e:
             raise IOError(f"Failed to load model: {e}")
+
+    @staticmethod
+    def clear_cache():
+        """
+        Remove every model from the process-level model cache.
+        """
+        with _MODEL_CACHE_LOCK:
+            _MODEL_CACHE.clear()
+
+    @staticmethod
+    def load_stats():
+        """
+        Returns the number and mean time of the warm (served from the cache) and cold load_model calls so far.
+
+        :return: Dictionary with warm_loads, warm_ms, cold_loads and cold_ms; the means are None before any load.
+        """
+        with _MODEL_CACHE_LOCK:
+            stats = dict(_LOAD_STATS)
+        return {'warm_loads': stats['warm_loads'],
+                'warm_ms': stats['warm_seconds'] * 1000 / stats['warm_loads'] if stats['warm_loads'] else None,
+                'cold_loads': stats['cold_loads'],
+                'cold_ms': stats['cold_seconds'] * 1000 / stats['cold_loads'] if stats['cold_loads'] else None}
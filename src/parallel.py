@@ -0,0 +1,95 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from constants import SCORING_SHARD_SIZE, INFERENCE_ENGINE
+from src.model import ModelHandler
+
+# Model loaded once per worker process by the pool initializer
+_worker_model = None
+
+
+def _init_worker(model_path, mmap_mode):
+    """
+    Loads the model in a worker process. Tree building threads are disabled since the pool already uses every core.
+
+    :param model_path: Path to the trained model file.
+    :param mmap_mode: joblib memory-map mode used to load the model.
+    """
+    global _worker_model
+    _worker_model = ModelHandler().load_model(model_path, mmap_mode=mmap_mode, compiled=INFERENCE_ENGINE == 'compiled')
+    if hasattr(_worker_model, 'get_params') and 'n_jobs' in _worker_model.get_params():
+        _worker_model.set_params(n_jobs=1)
+
+
+def _score_shard(shard):
+    """
+    Scores one shard of the feature matrix with the worker's model.
+
+    :param shard: Rows of the feature matrix.
+    :return: Predictions for the shard.
+    """
+    return ModelHandler().predict(shard, _worker_model)
+
+
+class ParallelScorer:
+    """
+    Class to score large feature matrices by splitting them into shards scored in a pool of worker processes.
+
+    Each worker loads the model once; with a model saved with compress=0 the file is memory-mapped. The pool is kept
+    alive between predict calls until close is called, so use the scorer as a context manager.
+    """
+
+    def __init__(self, model_path, n_workers=None, shard_size=SCORING_SHARD_SIZE, mmap_mode='r'):
+        """
+        Initialize ParallelScorer object.
+
+        :param model_path: Path to the trained model file.
+        :param n_workers: Number of worker processes; defaults to the number of cores.
+        :param shard_size: Number of rows sent to a worker at a time.
+        :param mmap_mode: joblib memory-map mode used by the workers to load the model.
+        """
+        self.model_path = str(model_path)
+        self.n_workers = n_workers or os.cpu_count()
+        self.shard_size = shard_size
+        self.mmap_mode = mmap_mode
+        self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        """
+        Starts the worker processes if they are not running yet.
+        """
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.n_workers, initializer=_init_worker,
+                                                initargs=(self.model_path, self.mmap_mode))
+
+    def predict(self, X):
+        """
+        Make predictions on the given data, scoring its shards in parallel and reassembling them in input order.
+
+        :param X: Feature matrix (DataFrame or NumPy array).
+        :return: NumPy array of predictions.
+        """
+        try:
+            self.start()
+            rows = X.iloc if hasattr(X, 'iloc') else X
+            shards = (rows[start:start + self.shard_size] for start in range(0, len(X), self.shard_size))
+            predictions = list(self.executor.map(_score_shard, shards))
+            return np.concatenate(predictions) if predictions else np.empty(0)
+        except Exception as e:
+            raise ValueError(f"Parallel prediction failed: {e}")
+
+    def close(self):
+        """
+        Shuts the worker processes down.
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone
+
+from constants import DATABASE_NAME
+from src.database import DatabaseHandler
+from src.profiling import stage
+
+# Table recording the input key and output of every persistent stage that completed
+STATE_TABLE = 'pipeline_state'
+
+
+class Stage:
+    """
+    A step of a StageGraph.
+    """
+
+    def __init__(self, name, func, inputs=(), fingerprint=None, persistent=False, is_current=None):
+        """
+        Initialize Stage object.
+
+        :param name: Name of the stage, also the name of its output.
+        :param func: Function called with the outputs of the input stages, in order.
+        :param inputs: Names of the stages whose outputs the stage consumes.
+        :param fingerprint: Optional function returning a string that identifies the external inputs of the stage,
+            e.g. the hash of a file it reads.
+        :param persistent: Whether the effects of the stage outlive the run, so that it can be skipped when its
+            inputs are unchanged. The output of a persistent stage must be JSON-serializable.
+        :param is_current: Optional function called with the recorded output of a persistent stage, returning whether
+            its effects are still in place.
+        """
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.fingerprint = fingerprint
+        self.persistent = persistent
+        self.is_current = is_current
+
+
+class StageGraph:
+    """
+    Class to run pipeline stages as a DAG whose intermediates are shared in memory.
+
+    Stages run on demand: running a target runs the stages it depends on, each at most once per run. Every stage has
+    an input key derived from its fingerprint and the keys of its inputs, computed without running anything. A
+    persistent stage whose key matches the one recorded by its last completed run is skipped, together with every
+    stage only it depended on, and returns its recorded output instead.
+    """
+
+    def __init__(self, database_name=DATABASE_NAME):
+        """
+        Initialize StageGraph object.
+
+        :param database_name: Name of the SQLite database the stage state is recorded in.
+        """
+        self.database_handler = DatabaseHandler(database_name)
+        self.stages = {}
+        self.keys = {}
+        self.outputs = {}
+        self.executed = []
+        self.skipped = []
+
+    def add(self, name, func, inputs=(), fingerprint=None, persistent=False, is_current=None):
+        """
+        Adds a stage to the graph; its inputs must already be part of it.
+
+        :return: The added Stage.
+        """
+        if name in self.stages:
+            raise ValueError(f"stage '{name}' is already defined")
+        missing = [input_name for input_name in inputs if input_name not in self.stages]
+        if missing:
+            raise ValueError(f"stage '{name}' depends on unknown stages {missing}")
+        self.stages[name] = Stage(name, func, inputs, fingerprint, persistent, is_current)
+        return self.stages[name]
+
+    def targets(self):
+        """
+        Returns the stages no other stage depends on, in the order they were added.
+        """
+        consumed = {input_name for stage_ in self.stages.values() for input_name in stage_.inputs}
+        return [name for name in self.stages if name not in consumed]
+
+    def key(self, name):
+        """
+        Returns the input key of a stage.
+        """
+        if name not in self.keys:
+            stage_ = self.stages[name]
+            parts = [name, stage_.fingerprint() if stage_.fingerprint else '']
+            parts += [self.key(input_name) for input_name in stage_.inputs]
+            self.keys[name] = hashlib.sha256('|'.join(parts).encode()).hexdigest()
+        return self.keys[name]
+
+    def recorded(self, conn, name):
+        """
+        Returns the (input key, output) recorded for a persistent stage, or None.
+        """
+        row = conn.execute(f'SELECT input_key, output FROM {STATE_TABLE} WHERE stage = ?', (name,)).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def resolve(self, conn, name, force):
+        """
+        Returns the output of a stage, running it and its inputs if needed.
+        """
+        if name in self.outputs:
+            return self.outputs[name]
+
+        stage_ = self.stages[name]
+        if stage_.persistent and not force:
+            recorded = self.recorded(conn, name)
+            if recorded and recorded[0] == self.key(name) and (stage_.is_current is None or
+                                                               stage_.is_current(recorded[1])):
+                logging.info(f"Skipping stage '{name}', its inputs are unchanged")
+                self.skipped.append(name)
+                self.outputs[name] = recorded[1]
+                return recorded[1]
+
+        inputs = [self.resolve(conn, input_name, force) for input_name in stage_.inputs]
+        logging.info(f"Running stage '{name}'")
+        with stage(f'pipeline.{name}'):
+            output = stage_.func(*inputs)
+        self.executed.append(name)
+        self.outputs[name] = output
+
+        if stage_.persistent:
+            with self.database_handler.transaction(conn):
+                conn.execute(f'INSERT OR REPLACE INTO {STATE_TABLE} VALUES (?, ?, ?, ?)',
+                             (name, self.key(name), json.dumps(output), datetime.now(timezone.utc).isoformat()))
+        return output
+
+    def run(self, targets=None, force=False):
+        """
+        Runs the given stages and whatever they depend on.
+
+        :param targets: Names of the stages to run; defaults to every stage no other stage depends on.
+        :param force: Run persistent stages even when their inputs are unchanged.
+        :return: Dictionary of the outputs of every stage that was run or skipped.
+        """
+        self.keys, self.outputs, self.executed, self.skipped = {}, {}, [], []
+        with self.database_handler.connect() as conn:
+            with self.database_handler.transaction(conn):
+                conn.execute(f'CREATE TABLE IF NOT EXISTS {STATE_TABLE} ('
+                             'stage TEXT PRIMARY KEY, input_key TEXT, output TEXT, completed_at TEXT)')
+            for name in targets or self.targets():
+                self.resolve(conn, name, force)
+        return dict(self.outputs)
+
+    def reset(self):
+        """
+        Forgets the recorded state of every stage, so that the next run executes all of them.
+        """
+        with self.database_handler.transaction() as conn:
+            conn.execute(f'DROP TABLE IF EXISTS {STATE_TABLE}')
@@ -1,10 +1,16 @@
 import logging
+import os
 
+import numpy as np
 import pandas as pd
 
-from constants import EXPECTED_COLUMN
+from constants import DATABASE_NAME, EXPECTED_COLUMN, INFERENCE_ENGINE
 from src.database import DatabaseHandler
+from src.encoder import FeatureEncoder
 from src.model import ModelHandler
+from src.profiling import stage
+from src.schema import FEATURE_DTYPES
+from src.writer import stamp_predictions, version_id
 
 
 class PredictionRunner:
@@ -12,6 +18,42 @@ class PredictionRunner:
     Class to handle running predictions on given input data.
     """
 
+    def __init__(self, encoder=None, writer=None, database_name=DATABASE_NAME):
+        """
+        Initialize PredictionRunner object.
+
+        :param encoder: Fitted FeatureEncoder; defaults to the encoder persisted next to the model being used.
+        :param writer: Optional PredictionWriter predictions are queued on instead of being written before returning.
+        :param database_name: Name of the SQLite database predictions are written to without a writer.
+        """
+        self.encoder = encoder
+        self.writer = writer
+        self.database_name = database_name
+        # Encoders loaded for models, keyed by encoder path, with the modification time they were loaded at
+        self.encoders = {}
+
+    def load_encoder(self, model_name=None):
+        """
+        Returns the encoder used to prepare input data.
+
+        Encoders are loaded once per runner and kept until their file is rewritten, like models in the model cache.
+
+        :param model_name: Path to the trained model file whose persisted encoder is used when none was given.
+        :return: FeatureEncoder instance.
+        """
+        if self.encoder is not None:
+            return self.encoder
+        path = FeatureEncoder.path_for_model(os.path.abspath(model_name)) if model_name else None
+        try:
+            mtime = path.stat().st_mtime_ns if path else None
+        except FileNotFoundError:
+            mtime = None
+        cached = self.encoders.get(path)
+        if cached is None or cached[0] != mtime:
+            encoder = FeatureEncoder.load(path) if mtime is not None else FeatureEncoder()
+            cached = self.encoders[path] = (mtime, encoder)
+        return cached[1]
+
     def given_input_data(self):
         """
         Creates a set of test input data for prediction.
@@ -59,25 +101,68 @@ class PredictionRunner:
     def prepare_input_data(self, input_data):
         """
         Prepares a single instance of input data for prediction, including one-hot encoding and ensuring all expected
-        columns are present.
+        columns are present. Prefer FeatureEncoder.encode directly on latency-sensitive paths.
 
         :param input_data: A dictionary containing the input data.
         :return: A DataFrame ready for prediction.
         """
         try:
-            input_df = pd.DataFrame([input_data])
-            input_df = pd.get_dummies(input_df)
+            # A buffer of its own, as the encoder's reusable row is shared by every caller of the runner
+            row = self.load_encoder().encode(input_data, out=np.empty(len(EXPECTED_COLUMN), dtype=np.float32))
+            input_df = pd.DataFrame({col: row[i:i + 1].astype(FEATURE_DTYPES[col])
+                                     for i, col in enumerate(EXPECTED_COLUMN)})
+            return input_df
+        except Exception as e:
+            logging.error(f"Error in preparing input data: {e}")
+            raise
 
-            expected_columns = EXPECTED_COLUMN
+    def encode_batch(self, records):
+        """
+        Encodes a batch of input records into a feature matrix laid out as EXPECTED_COLUMN in one vectorized step.
 
-            for col in expected_columns:
-                if col not in input_df.columns:
-                    input_df[col] = 0
+        :param records: Iterable of dictionaries shaped like given_input_data, or a columnar mapping (dictionary of
+                        array-likes or DataFrame) with the same keys.
+        :return: A float32 NumPy matrix with one row per record and one column per EXPECTED_COLUMN entry.
+        """
+        return self.load_encoder().encode_batch(records)
 
-            input_df = input_df[expected_columns]
-            return input_df
+    def predict_batch(self, records, model_name, connection=None, cache=None):
+        """
+        Scores a batch of input records with a single model call and saves all predictions, with the model version
+        and a timestamp, in one transaction. Without a connection, predictions are queued on the runner's writer if it
+        has one.
+
+        :param records: Iterable of dictionaries or columnar mapping, as accepted by encode_batch.
+        :param model_name: Path to the trained model file.
+        :param connection: Optional SQLite connection the predictions are written to right away.
+        :param cache: Optional PredictionCache for model_name; only records missing from it are scored.
+        :return: NumPy array of predicted values, in input order.
+        """
+        try:
+            with stage('model_load'):
+                # Taken before loading, so that cached and saved predictions are not attributed to a newer file
+                version = version_id(model_name)
+                model = ModelHandler().load_model(model_name, compiled=INFERENCE_ENGINE == 'compiled')
+            with stage('encoding') as metrics:
+                features = self.load_encoder(model_name).encode_batch(records)
+                metrics['rows'] = len(features)
+
+            def predict(matrix):
+                return ModelHandler().predict(pd.DataFrame(matrix, columns=EXPECTED_COLUMN, copy=False), model)
+
+            with stage('predict') as metrics:
+                predictions = cache.predict(features, predict, version) if cache is not None else predict(features)
+                metrics['rows'] = len(predictions)
+            with stage('prediction_write') as metrics:
+                if self.writer is not None and connection is None:
+                    self.writer.put(predictions, version)
+                else:
+                    predictions_df = stamp_predictions(predictions, version)
+                    DatabaseHandler(self.database_name).save_predictions_to_database(predictions_df, connection)
+                metrics['rows'] = len(predictions)
+            return predictions
         except Exception as e:
-            logging.error(f"Error in preparing input data: {e}")
+            logging.error(f"Error during batch prediction: {e}")
             raise
 
     def run_prediction(self, model_name):
@@ -85,23 +170,21 @@ class PredictionRunner:
         Runs predictions on a set of test data, logs the results, and saves predictions to the database.
 
         :param model_name: Path to the trained model file.
+        :return: List of formatted prediction strings, one per test data instance.
         """
         try:
-            model = ModelHandler().load_model(model_name)
             input_data = self.given_input_data()
 
-            all_predictions = []
-
             logging.info('Performing predictions...')
-            for data in input_data:
-                predicts_value = ModelHandler().predict(self.prepare_input_data(data), model)
-                logging.info(f'Predicted Value: {predicts_value}')
-                predictions_df = pd.DataFrame(predicts_value, columns=['Predicted_Value'])
-                DatabaseHandler().save_predictions_to_database(predictions_df)
+            predictions = self.predict_batch(input_data, model_name)
 
+            all_predictions = []
+            for i in range(len(predictions)):
+                predicts_value = predictions[i:i + 1]
+                logging.info(f'Predicted Value: {predicts_value}')
                 all_predictions.append(f'Predicted Value: {predicts_value}')  # Append each prediction to the list
 
-            return all_predictions  # Return the list of all prediction DataFrames
+            return all_predictions
 
         except Exception as e:
             logging.error(f"Error during prediction: {e}")
@@ -0,0 +1,146 @@
+import cProfile
+import json
+import logging
+import resource
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from constants import METRICS_DIR
+
+# Profiler receiving the stage metrics recorded through stage(), set while a PipelineProfiler is active
+_active_profiler = None
+
+
+def peak_rss_mb():
+    """
+    Returns the high-water mark of the process RSS in MiB; ru_maxrss is reported in KiB on Linux.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@contextmanager
+def stage(name):
+    """
+    Context manager recording the metrics of a pipeline stage in the active PipelineProfiler, if any.
+
+    The yielded dictionary takes the number of rows processed by the stage under 'rows'.
+
+    :param name: Name of the stage; repeated stages (e.g. per chunk) are aggregated under the same name.
+    """
+    if _active_profiler is None:
+        yield {}
+    else:
+        with _active_profiler.stage(name) as metrics:
+            yield metrics
+
+
+class PipelineProfiler:
+    """
+    Class to collect wall time, CPU time, rows processed and peak memory growth per pipeline stage and write them as
+    a JSON metrics report per run.
+
+    The peak memory growth of a stage is how far it raised the high-water mark of the process RSS, so it is zero for
+    a stage that stays below the peak of an earlier one. The deep mode additionally traces Python allocations with
+    tracemalloc, which gives the peak of every stage on its own, and profiles the whole run with cProfile.
+    """
+
+    def __init__(self, run_name='pipeline', metrics_dir=METRICS_DIR, deep=False):
+        """
+        Initialize PipelineProfiler object.
+
+        :param run_name: Name of the run, used as the prefix of the report files.
+        :param metrics_dir: Directory the reports are written to.
+        :param deep: Whether to enable tracemalloc and cProfile.
+        """
+        self.run_name = run_name
+        self.metrics_dir = metrics_dir
+        self.deep = deep
+        self.stages = {}
+        self.profile = cProfile.Profile() if deep else None
+        self.started_at = None
+        self.start_time = None
+        self.report_path = None
+
+    def __enter__(self):
+        global _active_profiler
+        _active_profiler = self
+        self.started_at = datetime.now(timezone.utc)
+        self.start_time = time.perf_counter()
+        if self.deep:
+            tracemalloc.start()
+            self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _active_profiler
+        _active_profiler = None
+        if self.deep:
+            self.profile.disable()
+        try:
+            self.report_path = self.write_report()
+        finally:
+            if self.deep:
+                tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Context manager measuring one execution of a stage.
+
+        :param name: Name of the stage.
+        """
+        metrics = {}
+        if self.deep:
+            tracemalloc.reset_peak()
+        rss_start = peak_rss_mb()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield metrics
+        finally:
+            record = self.stages.setdefault(name, {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'rows': 0,
+                                                   'peak_rss_growth_mb': 0.0})
+            record['calls'] += 1
+            record['wall_seconds'] += time.perf_counter() - wall_start
+            record['cpu_seconds'] += time.process_time() - cpu_start
+            record['rows'] += int(metrics.get('rows', 0))
+            record['peak_rss_growth_mb'] += peak_rss_mb() - rss_start
+            if self.deep:
+                traced_peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+                record['traced_peak_mb'] = max(record.get('traced_peak_mb', 0.0), traced_peak_mb)
+
+    def report(self):
+        """
+        Returns the metrics of the run.
+
+        :return: Dictionary with the run name, start time, total wall time and the metrics of every stage.
+        """
+        stages = {}
+        for name, record in self.stages.items():
+            stages[name] = dict(record)
+            if record['rows'] and record['wall_seconds']:
+                stages[name]['rows_per_second'] = record['rows'] / record['wall_seconds']
+        return {
+            'run_name': self.run_name,
+            'started_at': self.started_at.isoformat(),
+            'wall_seconds': time.perf_counter() - self.start_time,
+            'stages': stages,
+        }
+
+    def write_report(self):
+        """
+        Writes the JSON metrics report, and the cProfile statistics in deep mode, to the metrics directory.
+
+        :return: Path of the JSON report.
+        """
+        self.metrics_dir.mkdir(parents=True, exist_ok=True)
+        prefix = f"{self.run_name}_{self.started_at.strftime('%Y%m%dT%H%M%S')}"
+        report_path = self.metrics_dir / f'{prefix}.json'
+        with open(report_path, 'w') as file:
+            json.dump(self.report(), file, indent=2)
+        if self.deep:
+            self.profile.dump_stats(str(self.metrics_dir / f'{prefix}.prof'))
+        logging.info(f'Wrote metrics report to {report_path}')
+        return report_path
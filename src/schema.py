@@ -0,0 +1,57 @@
+import pandas as pd
+
+from constants import FILTERED_COLUMNS, COLUMN_MAPPING, EXPECTED_COLUMN, DROP_COLUMN, NULL_SENTINELS
+
+# Raw column holding the categorical feature and the prefix of its one-hot columns
+CATEGORICAL_COLUMN = 'OCEAN_PROXIMITY'
+DUMMY_PREFIX = f'{CATEGORICAL_COLUMN}_'
+
+# Raw CSV columns
+DUMMY_COLUMNS = [col for col in FILTERED_COLUMNS if col.startswith(DUMMY_PREFIX)]
+NUMERIC_COLUMNS = [col for col in FILTERED_COLUMNS if col not in DUMMY_COLUMNS]
+TARGET_COLUMN = 'MEDIAN_HOUSE_VALUE'
+
+# Categories known to the model, in one-hot column order
+CATEGORIES = [col[len(DUMMY_PREFIX):] for col in DUMMY_COLUMNS]
+
+# Columns of a single inference record, named as in EXPECTED_COLUMN
+INPUT_NUMERIC_COLUMNS = [COLUMN_MAPPING[col] for col in NUMERIC_COLUMNS]
+INPUT_CATEGORICAL_COLUMN = CATEGORICAL_COLUMN.lower()
+
+# Compact dtypes used when parsing the raw CSV
+RAW_DTYPES = {
+    **{col: 'float32' for col in NUMERIC_COLUMNS + [TARGET_COLUMN]},
+    CATEGORICAL_COLUMN: 'category',
+    **{col: 'category' for col in DROP_COLUMN if col != TARGET_COLUMN},
+}
+
+# Compact dtypes of the transformed features, keyed by EXPECTED_COLUMN names
+FEATURE_DTYPES = {
+    **{COLUMN_MAPPING[col]: 'float32' for col in NUMERIC_COLUMNS},
+    **{COLUMN_MAPPING[col]: 'uint8' for col in DUMMY_COLUMNS},
+}
+
+
+def read_raw_csv(input_data_path, **kwargs):
+    """
+    Reads a raw housing CSV with explicit compact dtypes instead of letting pandas infer them.
+
+    Sentinel values in numeric columns cannot be stored as float32, so they are parsed as NaN.
+
+    :param input_data_path: Path to the CSV file containing housing data.
+    :param kwargs: Additional keyword arguments passed to pd.read_csv (e.g. chunksize).
+    :return: DataFrame, or an iterator of DataFrames when chunksize is given.
+    """
+    na_values = {col: NULL_SENTINELS for col in NUMERIC_COLUMNS + [TARGET_COLUMN]}
+    return pd.read_csv(input_data_path, dtype=RAW_DTYPES, na_values=na_values, **kwargs)
+
+
+def conform_features(df):
+    """
+    Conforms one-hot encoded features to EXPECTED_COLUMN, filling absent categories with zeros and casting every
+    column to its compact dtype.
+
+    :param df: DataFrame with features named as in EXPECTED_COLUMN.
+    :return: DataFrame with exactly the EXPECTED_COLUMN columns and FEATURE_DTYPES dtypes.
+    """
+    return df.reindex(columns=EXPECTED_COLUMN, fill_value=0).astype(FEATURE_DTYPES)
@@ -0,0 +1,413 @@
+import argparse
+import asyncio
+import json
+import logging
+import queue
+from http import HTTPStatus
+
+import numpy as np
+import pandas as pd
+
+from constants import MODEL_PATH, DATABASE_NAME, EXPECTED_COLUMN, SERVER_HOST, SERVER_PORT, PREDICTION_BATCH_WINDOW, \
+    PREDICTION_MAX_BATCH_SIZE, PREDICTION_CACHE_SIZE, SERVER_MAX_BODY_SIZE, INFERENCE_ENGINE, configure_logging
+from src.cache import PredictionCache
+from src.encoder import FeatureEncoder
+from src.model import ModelHandler
+from src.writer import PredictionWriter, version_id
+
+
+class MicroBatcher:
+    """
+    Class to collect feature rows submitted by concurrent requests and score them with a single predict call.
+    """
+
+    def __init__(self, predict, window=PREDICTION_BATCH_WINDOW, max_batch_size=PREDICTION_MAX_BATCH_SIZE):
+        """
+        Initialize MicroBatcher object.
+
+        :param predict: Function scoring a float32 feature matrix; run in a worker thread.
+        :param window: Seconds to wait for more requests after the first one of a batch arrives.
+        :param max_batch_size: Maximum number of rows per predict call.
+        """
+        self.predict = predict
+        self.window = window
+        self.max_batch_size = max_batch_size
+        # Created on first use inside the event loop, as asyncio queues bind to the loop current at creation before
+        # Python 3.10
+        self.queue = None
+
+    def pending(self):
+        """
+        Returns the queue of submissions, creating it in the running event loop on first use.
+        """
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        return self.queue
+
+    async def submit(self, matrix):
+        """
+        Submits rows to be scored in the next batch.
+
+        :param matrix: float32 feature matrix laid out as EXPECTED_COLUMN.
+        :return: Predictions for the submitted rows.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.pending().put((matrix, future))
+        return await future
+
+    async def run(self):
+        """
+        Forms batches until cancelled: waits for a first submission, collects the submissions that arrive within the
+        batching window and resolves every submission with its slice of the predictions. When the coalesced predict
+        call fails, the submissions are scored one by one, so that only those that fail on their own get the error.
+        """
+        loop = asyncio.get_running_loop()
+        pending = self.pending()
+        while True:
+            items = [await pending.get()]
+            if self.window:
+                await asyncio.sleep(self.window)
+
+            rows = len(items[0][0])
+            while rows < self.max_batch_size and not pending.empty():
+                items.append(pending.get_nowait())
+                rows += len(items[-1][0])
+
+            try:
+                matrix = np.concatenate([matrix for matrix, _ in items])
+                predictions = await loop.run_in_executor(None, self.predict, matrix)
+            except Exception as e:
+                if len(items) == 1:
+                    self.resolve(items[0][1], exception=e)
+                else:
+                    for matrix, future in items:
+                        await self.score_alone(matrix, future)
+                continue
+
+            offset = 0
+            for matrix, future in items:
+                self.resolve(future, predictions[offset:offset + len(matrix)])
+                offset += len(matrix)
+
+    async def score_alone(self, matrix, future):
+        """
+        Scores the rows of one submission with a predict call of their own and resolves its future.
+        """
+        try:
+            predictions = await asyncio.get_running_loop().run_in_executor(None, self.predict, matrix)
+        except Exception as e:
+            self.resolve(future, exception=e)
+        else:
+            self.resolve(future, predictions)
+
+    @staticmethod
+    def resolve(future, predictions=None, exception=None):
+        """
+        Sets the predictions or the exception of a submission, unless its request was cancelled meanwhile.
+        """
+        if future.done():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(predictions)
+
+
+class PredictionServer:
+    """
+    Class to serve online predictions over HTTP with the model and feature encoder kept resident.
+
+    Endpoints:
+        GET /health             -> {"status": "ok", "cache": {...}}
+        POST /predict           record               -> {"prediction": value}
+        POST /predict/batch     [record, ...]        -> {"predictions": [value, ...]}
+
+    Concurrent requests are micro-batched into one predict call, and predictions are written to SQLite by a
+    PredictionWriter, off the request path.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, host=SERVER_HOST, port=SERVER_PORT, database_name=DATABASE_NAME,
+                 batch_window=PREDICTION_BATCH_WINDOW, max_batch_size=PREDICTION_MAX_BATCH_SIZE, cache=None,
+                 max_body_size=SERVER_MAX_BODY_SIZE):
+        """
+        Initialize PredictionServer object.
+
+        :param model_path: Path to the trained model file.
+        :param host: Interface to listen on.
+        :param port: Port to listen on; 0 picks a free port.
+        :param database_name: Name of the SQLite database predictions are written to.
+        :param batch_window: Seconds concurrent requests are collected into one predict call.
+        :param max_batch_size: Maximum number of rows per predict call.
+        :param cache: Optional PredictionCache for the model; its counters are reported by /health.
+        :param max_body_size: Largest request body in bytes; larger requests get 413 without their body being read.
+        """
+        self.model_path = str(model_path)
+        self.host = host
+        self.port = port
+        self.database_name = database_name
+        self.writer = None
+        self.model_version = None
+        self.model = None
+        self.encoder = None
+        self.cache = cache
+        self.max_body_size = max_body_size
+        self.batcher = MicroBatcher(self.predict, batch_window, max_batch_size)
+        self.server = None
+        self.tasks = []
+
+    def predict(self, matrix):
+        """
+        Scores a feature matrix with the resident model.
+
+        :param matrix: float32 feature matrix laid out as EXPECTED_COLUMN.
+        :return: NumPy array of predictions.
+        """
+        return ModelHandler().predict(pd.DataFrame(matrix, columns=EXPECTED_COLUMN, copy=False), self.model)
+
+    async def start(self):
+        """
+        Loads the model and encoder and starts listening, batching and writing.
+        """
+        self.model_version = version_id(self.model_path)
+        self.model = ModelHandler().load_model(self.model_path, compiled=INFERENCE_ENGINE == 'compiled')
+        self.encoder = FeatureEncoder.for_model(self.model_path)
+        self.writer = PredictionWriter(self.database_name)
+        self.tasks = [asyncio.create_task(self.batcher.run())]
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logging.info(f'Serving predictions on http://{self.host}:{self.port}')
+
+    async def stop(self):
+        """
+        Stops listening, then flushes the pending prediction writes.
+        """
+        self.server.close()
+        await self.server.wait_closed()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.writer.close)
+        except Exception as e:
+            logging.error(f"Error while writing predictions: {e}")
+
+    async def serve_forever(self):
+        """
+        Starts the server and serves until cancelled.
+        """
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def score(self, matrix):
+        """
+        Scores rows through the micro-batcher, skipping rows the resident model already predicted according to the
+        prediction cache, and queues the predictions for writing. When the writer's queue is full, the request waits
+        for room in a worker thread.
+
+        :param matrix: float32 feature matrix laid out as EXPECTED_COLUMN.
+        :return: NumPy array of predictions.
+        """
+        if self.cache is None:
+            predictions = await self.batcher.submit(matrix)
+        else:
+            predictions, missing, keys = self.cache.lookup(matrix, self.model_version)
+            if missing.any():
+                predictions[missing] = await self.batcher.submit(matrix[missing])
+                self.cache.store([key for key, miss in zip(keys, missing) if miss], predictions[missing])
+        try:
+            self.writer.put_nowait(predictions, self.model_version)
+        except queue.Full:
+            await asyncio.get_running_loop().run_in_executor(None, self.writer.put, predictions, self.model_version)
+        return predictions
+
+    async def route(self, method, path, body):
+        """
+        Dispatches a request to its endpoint.
+
+        :return: Tuple of (HTTPStatus, JSON-serializable payload).
+        """
+        if path == '/health' and method == 'GET':
+            if self.cache is None:
+                return HTTPStatus.OK, {'status': 'ok'}
+            return HTTPStatus.OK, {'status': 'ok', 'cache': self.cache.stats()}
+        if path not in ('/predict', '/predict/batch'):
+            return HTTPStatus.NOT_FOUND, {'error': f'unknown path {path}'}
+        if method != 'POST':
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'error': f'{method} is not allowed on {path}'}
+
+        try:
+            payload = json.loads(body)
+            if path == '/predict':
+                matrix = np.empty((1, len(EXPECTED_COLUMN)), dtype=np.float32)
+                self.encoder.encode(payload, out=matrix[0])
+            else:
+                records = payload['records'] if isinstance(payload, dict) else payload
+                if not isinstance(records, list) or not records:
+                    raise ValueError('expected a non-empty list of records')
+                matrix = self.encoder.encode_batch(records)
+        except (ValueError, KeyError, TypeError) as e:
+            return HTTPStatus.BAD_REQUEST, {'error': f'invalid input: {e!r}'}
+
+        predictions = await self.score(matrix)
+        if path == '/predict':
+            return HTTPStatus.OK, {'prediction': float(predictions[0])}
+        return HTTPStatus.OK, {'predictions': predictions.tolist()}
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serves HTTP/1.1 requests on one connection, keeping it alive until the client closes it.
+        """
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+
+                request_line, *header_lines = head.decode('latin-1').rstrip('\r\n').split('\r\n')
+                headers = {name.strip().lower(): value.strip()
+                           for name, value in (line.split(':', 1) for line in header_lines if ':' in line)}
+                content_length = headers.get('content-length', '0')
+                # Errors in the request line or the body length leave the end of the request unknown, so the
+                # connection cannot be reused
+                try:
+                    method, path, _ = request_line.split(' ')
+                except ValueError:
+                    await self.respond(writer, HTTPStatus.BAD_REQUEST,
+                                       {'error': f'invalid request line {request_line!r}'}, keep_alive=False)
+                    break
+                if not (content_length.isascii() and content_length.isdigit()):
+                    await self.respond(writer, HTTPStatus.BAD_REQUEST,
+                                       {'error': f'invalid Content-Length {content_length!r}'}, keep_alive=False)
+                    break
+                if int(content_length) > self.max_body_size:
+                    await self.respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                       {'error': f'request body exceeds {self.max_body_size} bytes'}, keep_alive=False)
+                    break
+                body = await reader.readexactly(int(content_length))
+
+                try:
+                    status, payload = await self.route(method, path, body)
+                except Exception as e:
+                    logging.error(f"Error during online prediction: {e}")
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive):
+        """
+        Writes a JSON response.
+
+        :param writer: StreamWriter of the connection.
+        :param status: HTTPStatus of the response.
+        :param payload: JSON-serializable response body.
+        :param keep_alive: Whether the connection stays open for further requests.
+        """
+        content = json.dumps(payload).encode()
+        writer.write(f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+                     f'Content-Type: application/json\r\n'
+                     f'Content-Length: {len(content)}\r\n'
+                     f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode() + content)
+        await writer.drain()
+
+
+class PredictionClient:
+    """
+    Minimal HTTP/1.1 client for PredictionServer that reuses one keep-alive connection.
+    """
+
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT):
+        """
+        Initialize PredictionClient object.
+
+        :param host: Host of the prediction server.
+        :param port: Port of the prediction server.
+        """
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def __aenter__(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+    async def request(self, method, path, payload=None):
+        """
+        Sends a request and reads its response.
+
+        :param method: HTTP method.
+        :param path: Request path.
+        :param payload: Optional JSON-serializable request body.
+        :return: Tuple of (status code, decoded JSON response).
+        """
+        content = b'' if payload is None else json.dumps(payload).encode()
+        self.writer.write(f'{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n'
+                          f'Content-Type: application/json\r\nContent-Length: {len(content)}\r\n\r\n'.encode()
+                          + content)
+        await self.writer.drain()
+
+        head = await self.reader.readuntil(b'\r\n\r\n')
+        status_line, *header_lines = head.decode('latin-1').rstrip('\r\n').split('\r\n')
+        headers = {name.strip().lower(): value.strip()
+                   for name, value in (line.split(':', 1) for line in header_lines if ':' in line)}
+        body = await self.reader.readexactly(int(headers.get('content-length', 0)))
+        return int(status_line.split(' ')[1]), json.loads(body)
+
+    async def predict(self, record):
+        """
+        Requests the prediction of a single record.
+        """
+        return (await self.request('POST', '/predict', record))[1]['prediction']
+
+    async def predict_batch(self, records):
+        """
+        Requests the predictions of a batch of records.
+        """
+        return (await self.request('POST', '/predict/batch', list(records)))[1]['predictions']
+
+
+def serve(model_path=MODEL_PATH, host=SERVER_HOST, port=SERVER_PORT, batch_window=PREDICTION_BATCH_WINDOW,
+          cache_size=PREDICTION_CACHE_SIZE):
+    """
+    Runs a PredictionServer until interrupted.
+
+    :param model_path: Path to the trained model file.
+    :param host: Interface to listen on.
+    :param port: Port to listen on.
+    :param batch_window: Seconds concurrent requests are collected into one predict call.
+    :param cache_size: Number of cached predictions; 0 disables the cache.
+    """
+    cache = PredictionCache(model_path, cache_size) if cache_size else None
+    server = PredictionServer(model_path, host, port, batch_window=batch_window, cache=cache)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve online predictions over HTTP.')
+    parser.add_argument('--model', default=str(MODEL_PATH))
+    parser.add_argument('--host', default=SERVER_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--batch-window', type=float, default=PREDICTION_BATCH_WINDOW)
+    parser.add_argument('--cache-size', type=int, default=PREDICTION_CACHE_SIZE, help='0 disables the cache')
+    args = parser.parse_args()
+
+    configure_logging()
+    serve(args.model, args.host, args.port, args.batch_window, args.cache_size)
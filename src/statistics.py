@@ -0,0 +1,477 @@
+import json
+import math
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+
+from constants import SKETCH_RELATIVE_ACCURACY, DRIFT_THRESHOLDS, NULL_SENTINELS
+from src.schema import NUMERIC_COLUMNS, CATEGORICAL_COLUMN, TARGET_COLUMN
+
+# Table holding the profile of every ETL run and its drift against the training profile
+STATISTICS_TABLE = 'etl_statistics'
+
+# Quantiles reported in summaries and compared between profiles
+PROFILE_QUANTILES = (0.05, 0.5, 0.95)
+
+
+class RunningMoments:
+    """
+    Class to accumulate the count, mean, variance, minimum and maximum of a stream of values.
+
+    Batches are reduced with NumPy and combined with the pairwise form of Welford's algorithm (Chan et al.), which is
+    also how partial moments from separate chunks or workers are merged, without losing precision on large counts.
+    """
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, minimum=math.inf, maximum=-math.inf):
+        """
+        Initialize RunningMoments object.
+
+        :param count: Number of values seen.
+        :param mean: Mean of the values seen.
+        :param m2: Sum of squared deviations from the mean.
+        :param minimum: Smallest value seen.
+        :param maximum: Largest value seen.
+        """
+        self.count = int(count)
+        self.mean = float(mean)
+        self.m2 = float(m2)
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+
+    def update(self, values):
+        """
+        Adds a batch of values without NaN.
+        """
+        if len(values):
+            batch_mean = float(values.mean())
+            self.merge(RunningMoments(len(values), batch_mean, float(np.square(values - batch_mean).sum()),
+                                      values.min(), values.max()))
+
+    def merge(self, other):
+        """
+        Adds the values accumulated by another RunningMoments.
+        """
+        count = self.count + other.count
+        if not other.count:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    @property
+    def variance(self):
+        """
+        Sample variance of the values seen.
+        """
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def to_dict(self):
+        """
+        Returns the state as a JSON-serializable dictionary.
+        """
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2,
+                'minimum': self.minimum if self.count else None, 'maximum': self.maximum if self.count else None}
+
+    @classmethod
+    def from_dict(cls, state):
+        """
+        Rebuilds a RunningMoments from to_dict output.
+        """
+        return cls(state['count'], state['mean'], state['m2'], state['minimum'] if state['count'] else math.inf,
+                   state['maximum'] if state['count'] else -math.inf)
+
+
+class QuantileSketch:
+    """
+    Class to estimate quantiles of a stream of values in bounded memory, with logarithmic buckets as in DDSketch.
+
+    A positive value x falls in bucket ceil(log(x) / log(gamma)) with gamma = (1 + a) / (1 - a), so every quantile is
+    estimated within a relative error a of a value of the stream. Negative values are kept in a mirrored set of buckets
+    and values close to zero in a separate count. Sketches with the same accuracy merge by adding bucket counts.
+    """
+
+    # Values closer to zero than this are counted in the zero bucket
+    MIN_VALUE = 1e-9
+
+    def __init__(self, relative_accuracy=SKETCH_RELATIVE_ACCURACY):
+        """
+        Initialize QuantileSketch object.
+
+        :param relative_accuracy: Relative error bound of the estimated quantiles.
+        """
+        self.relative_accuracy = relative_accuracy
+        self.log_gamma = math.log((1 + relative_accuracy) / (1 - relative_accuracy))
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+
+    @property
+    def count(self):
+        """
+        Number of values seen.
+        """
+        return sum(self.positive.values()) + sum(self.negative.values()) + self.zero_count
+
+    def add_to_buckets(self, buckets, values):
+        """
+        Counts positive values into their buckets with one bincount.
+        """
+        if not len(values):
+            return
+        indexes = np.ceil(np.log(values) / self.log_gamma).astype(np.int64)
+        offset = int(indexes.min())
+        counts = np.bincount(indexes - offset)
+        for index in np.flatnonzero(counts).tolist():
+            buckets[index + offset] = buckets.get(index + offset, 0) + int(counts[index])
+
+    def update(self, values):
+        """
+        Adds a batch of values without NaN.
+        """
+        self.add_to_buckets(self.positive, values[values > self.MIN_VALUE])
+        self.add_to_buckets(self.negative, -values[values < -self.MIN_VALUE])
+        self.zero_count += int(np.count_nonzero(np.abs(values) <= self.MIN_VALUE))
+
+    def merge(self, other):
+        """
+        Adds the values counted by another QuantileSketch with the same accuracy.
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("cannot merge sketches with different relative accuracies")
+        for buckets, other_buckets in ((self.positive, other.positive), (self.negative, other.negative)):
+            for index, count in other_buckets.items():
+                buckets[index] = buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+
+    def bucket_value(self, index):
+        """
+        Returns the value representing a positive bucket, within the relative accuracy of all values in it.
+        """
+        return 2 * math.exp(index * self.log_gamma) / (math.exp(self.log_gamma) + 1)
+
+    def quantile(self, q):
+        """
+        Estimates a quantile of the values seen.
+
+        :param q: Quantile between 0 and 1.
+        :return: Estimated value, or None when no value was seen.
+        """
+        count = self.count
+        if not count:
+            return None
+        rank = q * (count - 1)
+        seen = 0
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return -self.bucket_value(index)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return self.bucket_value(index)
+        return self.bucket_value(max(self.positive))
+
+    def to_dict(self):
+        """
+        Returns the state as a JSON-serializable dictionary.
+        """
+        return {'relative_accuracy': self.relative_accuracy, 'zero_count': self.zero_count,
+                'positive': {str(index): count for index, count in self.positive.items()},
+                'negative': {str(index): count for index, count in self.negative.items()}}
+
+    @classmethod
+    def from_dict(cls, state):
+        """
+        Rebuilds a QuantileSketch from to_dict output.
+        """
+        sketch = cls(state['relative_accuracy'])
+        sketch.zero_count = state['zero_count']
+        sketch.positive = {int(index): count for index, count in state['positive'].items()}
+        sketch.negative = {int(index): count for index, count in state['negative'].items()}
+        return sketch
+
+
+class ColumnStatistics:
+    """
+    Class to accumulate the count, null count, moments and quantile sketch of a numeric column.
+    """
+
+    def __init__(self, count=0, nulls=0, moments=None, sketch=None):
+        """
+        Initialize ColumnStatistics object.
+
+        :param count: Number of values seen, nulls included.
+        :param nulls: Number of null values seen.
+        :param moments: RunningMoments of the non-null values.
+        :param sketch: QuantileSketch of the non-null values.
+        """
+        self.count = count
+        self.nulls = nulls
+        self.moments = moments or RunningMoments()
+        self.sketch = sketch or QuantileSketch()
+
+    def update(self, series):
+        """
+        Adds the values of a pandas Series; NaN values count as nulls.
+        """
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = values[~np.isnan(values)]
+        self.count += len(values)
+        self.nulls += len(values) - len(valid)
+        self.moments.update(valid)
+        self.sketch.update(valid)
+
+    def merge(self, other):
+        """
+        Adds the statistics accumulated by another ColumnStatistics.
+        """
+        self.count += other.count
+        self.nulls += other.nulls
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+
+    @property
+    def null_rate(self):
+        """
+        Fraction of null values seen.
+        """
+        return self.nulls / self.count if self.count else 0.0
+
+    def summary(self):
+        """
+        Returns the count, null rate, mean, standard deviation, range and PROFILE_QUANTILES of the column.
+        """
+        return {'count': self.count, 'null_rate': self.null_rate, 'mean': self.moments.mean,
+                'std': math.sqrt(self.moments.variance), 'min': self.moments.to_dict()['minimum'],
+                'max': self.moments.to_dict()['maximum'],
+                **{f'p{round(q * 100):02d}': self.sketch.quantile(q) for q in PROFILE_QUANTILES}}
+
+    def to_dict(self):
+        """
+        Returns the state as a JSON-serializable dictionary.
+        """
+        return {'count': self.count, 'nulls': self.nulls, 'moments': self.moments.to_dict(),
+                'sketch': self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state):
+        """
+        Rebuilds a ColumnStatistics from to_dict output.
+        """
+        return cls(state['count'], state['nulls'], RunningMoments.from_dict(state['moments']),
+                   QuantileSketch.from_dict(state['sketch']))
+
+
+class DatasetProfile:
+    """
+    Class to profile raw housing data in one streaming pass: per-column statistics of the numeric columns and the
+    target, category frequencies of the categorical column, and the rows dropped by cleaning.
+
+    Profiles of separate chunks or workers are combined with merge, and profiles of different runs are compared with
+    compare to detect data quality problems and feature drift.
+    """
+
+    def __init__(self, columns=None, categories=None, category_nulls=0, rows=0, dropped=None):
+        """
+        Initialize DatasetProfile object.
+
+        :param columns: Dictionary of numeric column name to ColumnStatistics.
+        :param categories: Dictionary of category to number of rows.
+        :param category_nulls: Number of rows whose category is null or a null sentinel.
+        :param rows: Number of rows profiled.
+        :param dropped: Dictionary of rows dropped by cleaning per reason.
+        """
+        self.columns = columns or {col: ColumnStatistics() for col in NUMERIC_COLUMNS + [TARGET_COLUMN]}
+        self.categories = categories or {}
+        self.category_nulls = category_nulls
+        self.rows = rows
+        self.dropped = dropped or {}
+
+    def update(self, df):
+        """
+        Adds a chunk of raw rows, before cleaning.
+
+        :param df: DataFrame as read by read_raw_csv.
+        """
+        self.rows += len(df)
+        for col, statistics in self.columns.items():
+            statistics.update(df[col])
+
+        counts = df[CATEGORICAL_COLUMN].value_counts(dropna=False)
+        for category, count in counts[counts > 0].items():
+            if isinstance(category, str) and category not in NULL_SENTINELS:
+                self.categories[category] = self.categories.get(category, 0) + int(count)
+            else:
+                self.category_nulls += int(count)
+
+    def record_drops(self, drop_counts):
+        """
+        Adds the rows dropped by cleaning a chunk, per reason.
+        """
+        for reason, count in drop_counts.items():
+            self.dropped[reason] = self.dropped.get(reason, 0) + count
+
+    def merge(self, other):
+        """
+        Adds the rows profiled by another DatasetProfile.
+        """
+        self.rows += other.rows
+        for col, statistics in other.columns.items():
+            self.columns.setdefault(col, ColumnStatistics()).merge(statistics)
+        for category, count in other.categories.items():
+            self.categories[category] = self.categories.get(category, 0) + count
+        self.category_nulls += other.category_nulls
+        self.record_drops(other.dropped)
+
+    def category_frequencies(self):
+        """
+        Returns the share of every category among the non-null categories.
+        """
+        total = sum(self.categories.values())
+        return {category: count / total for category, count in self.categories.items()} if total else {}
+
+    def summary(self):
+        """
+        Returns a readable summary of the profile.
+        """
+        return {'rows': self.rows, 'dropped': self.dropped,
+                'columns': {col: statistics.summary() for col, statistics in self.columns.items()},
+                CATEGORICAL_COLUMN: {'null_rate': self.category_nulls / self.rows if self.rows else 0.0,
+                                     'frequencies': self.category_frequencies()}}
+
+    def compare(self, reference, thresholds=None):
+        """
+        Compares the profile against a reference profile, usually the one of the training data.
+
+        A column is reported when its null rate grows by more than the null_rate threshold, when its mean moves by
+        more than mean_shift reference standard deviations, or when one of PROFILE_QUANTILES moves by more than
+        quantile_shift times the reference spread between the outer quantiles. The categorical column is reported
+        when the total variation distance between the category frequencies exceeds category_shift, and for every
+        category absent from the reference.
+
+        :param reference: DatasetProfile to compare against.
+        :param thresholds: Optional overrides of DRIFT_THRESHOLDS.
+        :return: List of dictionaries with column, metric, value, reference and threshold, one per finding.
+        """
+        thresholds = {**DRIFT_THRESHOLDS, **(thresholds or {})}
+        findings = []
+
+        def report(column, metric, value, reference_value, threshold):
+            findings.append({'column': column, 'metric': metric, 'value': value, 'reference': reference_value,
+                             'threshold': threshold})
+
+        for col, statistics in self.columns.items():
+            expected = reference.columns.get(col)
+            if expected is None or not expected.moments.count or not statistics.moments.count:
+                continue
+            if statistics.null_rate - expected.null_rate > thresholds['null_rate']:
+                report(col, 'null_rate', statistics.null_rate, expected.null_rate, thresholds['null_rate'])
+
+            std = math.sqrt(expected.moments.variance)
+            if std and abs(statistics.moments.mean - expected.moments.mean) / std > thresholds['mean_shift']:
+                report(col, 'mean', statistics.moments.mean, expected.moments.mean, thresholds['mean_shift'])
+
+            spread = expected.sketch.quantile(PROFILE_QUANTILES[-1]) - expected.sketch.quantile(PROFILE_QUANTILES[0])
+            for q in PROFILE_QUANTILES:
+                value, expected_value = statistics.sketch.quantile(q), expected.sketch.quantile(q)
+                if abs(value - expected_value) > thresholds['quantile_shift'] * (spread or abs(expected_value)):
+                    report(col, f'p{round(q * 100):02d}', value, expected_value, thresholds['quantile_shift'])
+
+        null_rate = self.category_nulls / self.rows if self.rows else 0.0
+        expected_null_rate = reference.category_nulls / reference.rows if reference.rows else 0.0
+        if null_rate - expected_null_rate > thresholds['null_rate']:
+            report(CATEGORICAL_COLUMN, 'null_rate', null_rate, expected_null_rate, thresholds['null_rate'])
+
+        frequencies, expected_frequencies = self.category_frequencies(), reference.category_frequencies()
+        if frequencies and expected_frequencies:
+            distance = sum(abs(frequencies.get(category, 0.0) - expected_frequencies.get(category, 0.0))
+                           for category in set(frequencies) | set(expected_frequencies)) / 2
+            if distance > thresholds['category_shift']:
+                report(CATEGORICAL_COLUMN, 'frequencies', distance, 0.0, thresholds['category_shift'])
+            for category in sorted(set(frequencies) - set(expected_frequencies)):
+                report(CATEGORICAL_COLUMN, f'unseen category {category}', frequencies[category], 0.0, 0.0)
+        return findings
+
+    def to_dict(self):
+        """
+        Returns the state as a JSON-serializable dictionary.
+        """
+        return {'rows': self.rows, 'dropped': self.dropped, 'category_nulls': self.category_nulls,
+                'categories': self.categories,
+                'columns': {col: statistics.to_dict() for col, statistics in self.columns.items()}}
+
+    @classmethod
+    def from_dict(cls, state):
+        """
+        Rebuilds a DatasetProfile from to_dict output.
+        """
+        return cls({col: ColumnStatistics.from_dict(column) for col, column in state['columns'].items()},
+                   dict(state['categories']), state['category_nulls'], state['rows'], dict(state['dropped']))
+
+
+class ProfileStore:
+    """
+    Class to record the profile of every ETL run and the training profile runs are compared against.
+    """
+
+    def __init__(self, conn):
+        """
+        Initialize ProfileStore object and create its table if needed.
+
+        :param conn: SQLite connection, usually inside a DatabaseHandler.transaction scope.
+        """
+        self.conn = conn
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS {STATISTICS_TABLE} ('
+                          'run_id TEXT PRIMARY KEY, table_name TEXT, source TEXT, recorded_at TEXT, '
+                          'training INTEGER DEFAULT 0, profile TEXT, drift TEXT)')
+
+    def save(self, table_name, source, profile, drift):
+        """
+        Records the profile of a run and its findings against the training profile.
+
+        :return: Identifier of the run.
+        """
+        run_id = uuid.uuid4().hex
+        self.conn.execute(f'INSERT INTO {STATISTICS_TABLE} VALUES (?, ?, ?, ?, 0, ?, ?)',
+                          (run_id, table_name, source, datetime.now(timezone.utc).isoformat(),
+                           json.dumps(profile.to_dict()), json.dumps(drift)))
+        return run_id
+
+    def mark_training(self, run_id):
+        """
+        Makes the profile of a run the training profile later runs are compared against.
+        """
+        self.conn.execute(f'UPDATE {STATISTICS_TABLE} SET training = 1 WHERE run_id = ?', (run_id,))
+
+    def training_profile(self):
+        """
+        Returns the most recent training profile, or None.
+        """
+        row = self.conn.execute(f'SELECT profile FROM {STATISTICS_TABLE} WHERE training = 1 '
+                                'ORDER BY recorded_at DESC, rowid DESC LIMIT 1').fetchone()
+        return DatasetProfile.from_dict(json.loads(row[0])) if row else None
+
+    def runs(self, table_name=None):
+        """
+        Returns the recorded runs, most recent first, with their summary and findings.
+
+        :param table_name: Optional table the runs loaded.
+        :return: List of dictionaries with run_id, table_name, source, recorded_at, training, summary and drift.
+        """
+        query = f'SELECT run_id, table_name, source, recorded_at, training, profile, drift FROM {STATISTICS_TABLE}'
+        params = ()
+        if table_name is not None:
+            query += ' WHERE table_name = ?'
+            params = (table_name,)
+        rows = self.conn.execute(query + ' ORDER BY recorded_at DESC, rowid DESC', params).fetchall()
+        return [{'run_id': run_id, 'table_name': name, 'source': source, 'recorded_at': recorded_at,
+                 'training': bool(training), 'summary': DatasetProfile.from_dict(json.loads(profile)).summary(),
+                 'drift': json.loads(drift)}
+                for run_id, name, source, recorded_at, training, profile, drift in rows]
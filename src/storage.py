@@ -0,0 +1,312 @@
+import os
+import shutil
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import numpy as np
+
+from constants import COLUMN_MAPPING, STORAGE_BACKEND, PARQUET_DIR, PARQUET_ROW_GROUP_SIZE, CHUNK_SIZE
+from src.schema import CATEGORIES, DUMMY_COLUMNS, INPUT_CATEGORICAL_COLUMN
+
+# pyarrow modules, imported by the first ParquetBackend since pyarrow.dataset alone takes a noticeable time to import
+pa = pc = ds = pq = None
+
+# Filter operators supported by every backend, with their SQL spelling
+FILTER_OPERATORS = {'==': '=', '!=': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>=', 'in': 'IN', 'not in': 'NOT IN'}
+
+# One-hot column of every category, so that filters can be written against the categorical input column
+CATEGORY_COLUMNS = {category: COLUMN_MAPPING[col] for category, col in zip(CATEGORIES, DUMMY_COLUMNS)}
+
+
+def expand_filters(filters):
+    """
+    Validates filters and rewrites equality filters on the categorical input column (ocean_proximity) into filters
+    on its one-hot column, which is what the transformed tables store.
+
+    :param filters: Iterable of (column, operator, value) tuples that must all hold, or None.
+    :return: List of (column, operator, value) tuples.
+    """
+    expanded = []
+    for col, op, value in filters or ():
+        if op not in FILTER_OPERATORS:
+            raise ValueError(f"unsupported filter operator '{op}'")
+        if col == INPUT_CATEGORICAL_COLUMN:
+            if op not in ('==', '!=') or value not in CATEGORY_COLUMNS:
+                raise ValueError(f"{INPUT_CATEGORICAL_COLUMN} only supports == and != on a known category")
+            col, op, value = CATEGORY_COLUMNS[value], '==', int(op == '==')
+        expanded.append((col, op, value))
+    return expanded
+
+
+def sql_filters(filters):
+    """
+    Translates filters into a SQL WHERE clause with parameters.
+
+    :param filters: Iterable of (column, operator, value) tuples that must all hold, or None.
+    :return: Tuple of (WHERE clause or empty string, list of parameters).
+    """
+    clauses, params = [], []
+    for col, op, value in expand_filters(filters):
+        if op in ('in', 'not in'):
+            values = list(value)
+            clauses.append(f'"{col}" {FILTER_OPERATORS[op]} ({", ".join("?" for _ in values)})')
+            params.extend(values)
+        else:
+            clauses.append(f'"{col}" {FILTER_OPERATORS[op]} ?')
+            params.append(value)
+    return (f' WHERE {" AND ".join(clauses)}' if clauses else ''), params
+
+
+def import_pyarrow():
+    """
+    Imports the pyarrow modules used by ParquetBackend.
+
+    :return: Whether pyarrow is installed.
+    """
+    global pa, pc, ds, pq
+    if pa is None:
+        try:
+            import pyarrow as pa
+            import pyarrow.compute as pc
+            import pyarrow.dataset as ds
+            import pyarrow.parquet as pq
+        except ImportError:
+            return False
+    return True
+
+
+def create_storage(backend=STORAGE_BACKEND):
+    """
+    Creates the storage backend configured for table data.
+
+    :param backend: 'sqlite' or 'parquet'.
+    :return: StorageBackend, or None for SQLite, which DatabaseHandler implements itself.
+    """
+    if backend == 'sqlite':
+        return None
+    if backend == 'parquet':
+        return ParquetBackend()
+    raise ValueError(f"Unknown storage backend '{backend}'")
+
+
+class StorageBackend(ABC):
+    """
+    Interface of the storage backends DatabaseHandler delegates table data to instead of SQLite.
+
+    Tables are append-only sequences of rows; rows are numbered from 1 in insertion order, and that number stands in
+    for the SQLite rowid in iter_chunks.
+    """
+
+    @abstractmethod
+    def write(self, df, table_name, if_exists='replace'):
+        """
+        Writes a DataFrame to a table.
+
+        :param df: DataFrame to be saved.
+        :param table_name: Name of the table.
+        :param if_exists: Behaviour when the table already exists ('replace' or 'append').
+        """
+
+    @abstractmethod
+    def read(self, table_name, columns=None, filters=None):
+        """
+        Reads a table into a DataFrame.
+
+        :param table_name: Name of the table.
+        :param columns: Columns to read; defaults to every column.
+        :param filters: Iterable of (column, operator, value) tuples that must all hold.
+        :return: DataFrame.
+        """
+
+    @abstractmethod
+    def read_numpy(self, table_name, columns, filters=None, dtype=np.float32):
+        """
+        Reads columns of a table into a C-contiguous NumPy matrix.
+
+        :param table_name: Name of the table.
+        :param columns: Columns to read, in matrix column order.
+        :param filters: Iterable of (column, operator, value) tuples that must all hold.
+        :param dtype: dtype of the matrix.
+        :return: NumPy matrix with one row per table row.
+        """
+
+    @abstractmethod
+    def iter_chunks(self, table_name, columns, chunksize=CHUNK_SIZE, after_rowid=0):
+        """
+        Reads a table in bounded chunks in insertion order.
+
+        :return: Generator of DataFrames with a 'source_rowid' column followed by the requested columns.
+        """
+
+    @abstractmethod
+    def max_value(self, table_name, column, default=0):
+        """
+        Returns the largest value of a column, or a default when the table is missing or empty.
+        """
+
+    @abstractmethod
+    def row_count(self, table_name):
+        """
+        Returns the number of rows of a table, or 0 when the table is missing.
+        """
+
+    @abstractmethod
+    def exists(self, table_name):
+        """
+        Returns whether a table exists.
+        """
+
+    @abstractmethod
+    def drop(self, table_name):
+        """
+        Drops a table if it exists.
+        """
+
+
+class ParquetBackend(StorageBackend):
+    """
+    Columnar storage backend keeping every table as a directory of Parquet files, one file per write.
+
+    Reads only decode the requested columns, filters are pushed down to the Parquet row group statistics, and
+    numeric column buffers are viewed by NumPy without a copy, so building a feature matrix costs a single copy.
+    """
+
+    def __init__(self, root_dir=PARQUET_DIR, row_group_size=PARQUET_ROW_GROUP_SIZE):
+        """
+        Initialize ParquetBackend object.
+
+        :param root_dir: Directory holding one subdirectory per table.
+        :param row_group_size: Maximum number of rows per Parquet row group, the unit of predicate pushdown.
+        """
+        if not import_pyarrow():
+            raise ImportError("The parquet storage backend requires pyarrow: pip install pyarrow")
+        self.root_dir = Path(root_dir)
+        self.row_group_size = row_group_size
+
+    def table_dir(self, table_name):
+        """
+        Returns the directory of a table.
+        """
+        return self.root_dir / table_name
+
+    def files(self, table_name):
+        """
+        Returns the Parquet files of a table in insertion order.
+        """
+        return sorted(self.table_dir(table_name).glob('part-*.parquet'))
+
+    def exists(self, table_name):
+        """
+        Returns whether a table has at least one Parquet file.
+        """
+        return bool(self.files(table_name))
+
+    def dataset(self, table_name):
+        """
+        Opens a table as a pyarrow dataset with its files in insertion order.
+        """
+        files = self.files(table_name)
+        if not files:
+            raise FileNotFoundError(f"no such table: {table_name}")
+        return ds.dataset([str(path) for path in files], format='parquet')
+
+    def write(self, df, table_name, if_exists='replace'):
+        """
+        Writes a DataFrame as a new Parquet file of a table, after removing the table's files on replace.
+
+        :param df: DataFrame to be saved.
+        :param table_name: Name of the table.
+        :param if_exists: Behaviour when the table already exists ('replace' or 'append'); appended data must have
+                          the schema of the table.
+        """
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        files = self.files(table_name)
+        if files and if_exists == 'replace':
+            self.drop(table_name)
+            files = []
+        elif files and not pq.read_schema(files[0]).remove_metadata().equals(table.schema.remove_metadata()):
+            raise ValueError(f"table '{table_name}' does not match the schema of the data")
+
+        table_dir = self.table_dir(table_name)
+        table_dir.mkdir(parents=True, exist_ok=True)
+        part = int(files[-1].stem.split('-')[1]) + 1 if files else 0
+        path = table_dir / f'part-{part:08d}.parquet'
+
+        # Write under a temporary name so that readers never see a partial file
+        partial_path = path.with_suffix('.partial')
+        pq.write_table(table, partial_path, row_group_size=self.row_group_size)
+        os.replace(partial_path, path)
+
+    def scan(self, table_name, columns=None, filters=None):
+        """
+        Reads the requested columns of the rows matching the filters into an Arrow table.
+        """
+        filters = expand_filters(filters)
+        expression = pq.filters_to_expression(filters) if filters else None
+        return self.dataset(table_name).to_table(columns=columns, filter=expression)
+
+    def read(self, table_name, columns=None, filters=None):
+        """
+        Reads the requested columns of the rows matching the filters into a DataFrame.
+        """
+        return self.scan(table_name, columns, filters).to_pandas()
+
+    def read_numpy(self, table_name, columns, filters=None, dtype=np.float32):
+        """
+        Reads the requested columns of the rows matching the filters into a C-contiguous NumPy matrix.
+
+        Every Arrow chunk of a numeric column without nulls is viewed by NumPy in place and copied once, straight
+        into its slice of the matrix, instead of being concatenated into a column array first.
+        """
+        table = self.scan(table_name, columns, filters)
+        matrix = np.empty((table.num_rows, len(columns)), dtype=dtype)
+        for i, col in enumerate(columns):
+            start = 0
+            for chunk in table.column(col).chunks:
+                # A view of the Arrow buffer unless the chunk has nulls or is not numeric
+                matrix[start:start + len(chunk), i] = chunk.to_numpy(zero_copy_only=False)
+                start += len(chunk)
+        return matrix
+
+    def iter_chunks(self, table_name, columns, chunksize=CHUNK_SIZE, after_rowid=0):
+        """
+        Reads a table file by file in batches of at most chunksize rows, skipping the files before after_rowid
+        without decoding them.
+
+        :return: Generator of DataFrames with a 'source_rowid' column followed by the requested columns.
+        """
+        rowid = 0
+        for path in self.files(table_name):
+            parquet_file = pq.ParquetFile(path)
+            if rowid + parquet_file.metadata.num_rows <= after_rowid:
+                rowid += parquet_file.metadata.num_rows
+                continue
+            for batch in parquet_file.iter_batches(batch_size=chunksize, columns=list(columns)):
+                start = max(after_rowid - rowid, 0)
+                if start < batch.num_rows:
+                    chunk = batch.slice(start).to_pandas()
+                    chunk.insert(0, 'source_rowid', np.arange(rowid + start + 1, rowid + batch.num_rows + 1))
+                    yield chunk
+                rowid += batch.num_rows
+
+    def max_value(self, table_name, column, default=0):
+        """
+        Returns the largest value of a column, reading only that column, or a default when the table is missing or
+        empty.
+        """
+        if not self.exists(table_name):
+            return default
+        value = pc.max(self.dataset(table_name).to_table(columns=[column]).column(column)).as_py()
+        return default if value is None else value
+
+    def row_count(self, table_name):
+        """
+        Returns the number of rows of a table from the Parquet footers, without reading any data.
+        """
+        return sum(pq.ParquetFile(path).metadata.num_rows for path in self.files(table_name))
+
+    def drop(self, table_name):
+        """
+        Removes the directory of a table if it exists.
+        """
+        shutil.rmtree(self.table_dir(table_name), ignore_errors=True)
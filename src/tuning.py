@@ -0,0 +1,256 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import sklearn
+from joblib import Parallel, delayed
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import KFold, ParameterGrid
+
+from constants import TUNING_CONFIG, TUNING_CACHE_DIR, TRAINING_CONFIG, RANDOM_STATE, MODEL_PATH
+from src.model import ModelHandler
+
+
+def data_hash(X, y):
+    """
+    Computes a digest of a training set, used in the cache keys of the trials run on it.
+
+    :param X: Features of the training data.
+    :param y: Target variable of the training data.
+    :return: Hex digest of the feature values, column names and targets.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([str(col) for col in getattr(X, 'columns', [])]).encode())
+    digest.update(np.ascontiguousarray(X, dtype=np.float32).tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+def training_config(backend, params):
+    """
+    Builds the ModelHandler.train configuration of a candidate on top of TRAINING_CONFIG.
+
+    :param backend: Training backend, as in TRAINING_CONFIG.
+    :param params: Estimator parameters of the candidate.
+    :return: Configuration dictionary.
+    """
+    return {'backend': backend, backend: {**TRAINING_CONFIG[backend], **params}}
+
+
+def fit_fold(X, y, train_index, test_index, backend, params, cache, key):
+    """
+    Fits a candidate on one fold, scores it on the held-out rows and caches the result. Runs in a worker process,
+    single-threaded since the folds already run in parallel.
+
+    :return: Dictionary with the mean absolute error on the held-out rows and the fit time.
+    """
+    start_time = time.perf_counter()
+    config = {**training_config(backend, params), 'n_jobs': 1, 'max_threads': 1}
+    model = ModelHandler().train(X[train_index], y[train_index], config)
+    predictions = ModelHandler().predict(X[test_index], model)
+    result = {'mae': float(mean_absolute_error(y[test_index], predictions)),
+              'fit_seconds': time.perf_counter() - start_time}
+    cache.put(key, result)
+    return result
+
+
+class TrialCache:
+    """
+    Class to store the result of every fold of every trial on disk, one JSON file per fold.
+    """
+
+    def __init__(self, cache_dir=TUNING_CACHE_DIR):
+        """
+        Initialize TrialCache object.
+
+        :param cache_dir: Directory holding the cached results.
+        """
+        self.cache_dir = Path(cache_dir)
+
+    def path(self, key):
+        """
+        Returns the path of the cached result of a fold.
+        """
+        return self.cache_dir / f'{key}.json'
+
+    def get(self, key):
+        """
+        Returns the cached result of a fold, or None.
+        """
+        try:
+            with open(self.path(key)) as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, key, result):
+        """
+        Caches the result of a fold. The file is written under a temporary name first, so that an interrupted write
+        never leaves a partial result behind.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        partial_path = self.path(key).with_suffix(f'.{os.getpid()}.partial')
+        with open(partial_path, 'w') as file:
+            json.dump(result, file)
+        os.replace(partial_path, self.path(key))
+
+
+class HyperparameterSearch:
+    """
+    Class to tune the estimator parameters of a training backend with k-fold cross-validation, either over the whole
+    parameter grid or by successive halving.
+
+    Folds are fitted in parallel processes and every finished fold is cached on disk under a key made of the data
+    hash, the parameters and the fold, so an interrupted or extended search never refits a finished fold.
+    """
+
+    def __init__(self, backend=None, param_grid=None, config=None, cache_dir=TUNING_CACHE_DIR,
+                 random_state=RANDOM_STATE):
+        """
+        Initialize HyperparameterSearch object.
+
+        :param backend: Training backend to tune; defaults to the one of TRAINING_CONFIG.
+        :param param_grid: Dictionary of parameter name to candidate values; defaults to the grid of TUNING_CONFIG.
+        :param config: Optional overrides of TUNING_CONFIG (cv_folds, n_jobs, halving_factor, min_samples).
+        :param cache_dir: Directory of the fold result cache.
+        :param random_state: Seed of the fold assignment and of the successive halving row order.
+        """
+        self.backend = backend or TRAINING_CONFIG['backend']
+        self.config = {**TUNING_CONFIG, **(config or {})}
+        self.param_grid = param_grid or self.config['param_grid'][self.backend]
+        self.cache = TrialCache(cache_dir)
+        self.random_state = random_state
+        self.results = []
+        self.best_params = None
+        self.best_score = None
+        self.cached_folds = 0
+        self.fitted_folds = 0
+
+    def trial_key(self, digest, params, n_samples, fold):
+        """
+        Returns the cache key of one fold of a trial. The key holds the estimator parameters merged with their
+        TRAINING_CONFIG defaults, as fitted, and the scikit-learn version, so changing either refits the fold.
+        """
+        payload = {'data': digest, 'n_samples': n_samples, 'backend': self.backend,
+                   'params': training_config(self.backend, params)[self.backend], 'sklearn': sklearn.__version__,
+                   'cv_folds': self.config['cv_folds'], 'fold': fold, 'random_state': self.random_state}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def evaluate(self, X, y, candidates):
+        """
+        Cross-validates candidates on the given rows, fitting the folds missing from the cache in parallel.
+
+        :param X: float32 feature matrix.
+        :param y: Target values.
+        :param candidates: List of parameter dictionaries.
+        :return: List of dictionaries with params, n_samples, mae_mean, mae_std and fit_seconds, best first.
+        """
+        digest = data_hash(X, y)
+        folds = list(KFold(self.config['cv_folds'], shuffle=True, random_state=self.random_state).split(X))
+
+        fold_results = {}
+        tasks = []
+        for i, params in enumerate(candidates):
+            for fold, (train_index, test_index) in enumerate(folds):
+                key = self.trial_key(digest, params, len(X), fold)
+                cached = self.cache.get(key)
+                if cached is not None:
+                    fold_results[i, fold] = cached
+                else:
+                    tasks.append(((i, fold), delayed(fit_fold)(X, y, train_index, test_index, self.backend, params,
+                                                               self.cache, key)))
+        self.cached_folds += len(fold_results)
+        self.fitted_folds += len(tasks)
+        logging.info(f'Cross-validating {len(candidates)} candidates on {len(X)} rows: '
+                     f'{len(fold_results)} folds cached, {len(tasks)} to fit')
+
+        if tasks:
+            outputs = Parallel(n_jobs=self.config['n_jobs'])(task for _, task in tasks)
+            for (index, _), result in zip(tasks, outputs):
+                fold_results[index] = result
+
+        results = []
+        for i, params in enumerate(candidates):
+            maes = [fold_results[i, fold]['mae'] for fold in range(len(folds))]
+            results.append({'params': params, 'n_samples': len(X), 'mae_mean': float(np.mean(maes)),
+                            'mae_std': float(np.std(maes)),
+                            'fit_seconds': sum(fold_results[i, fold]['fit_seconds'] for fold in range(len(folds)))})
+        return sorted(results, key=lambda result: result['mae_mean'])
+
+    def grid_search(self, X, y):
+        """
+        Cross-validates every candidate of the parameter grid on all rows.
+
+        :return: Results of the candidates, best first.
+        """
+        results = self.evaluate(X, y, list(ParameterGrid(self.param_grid)))
+        self.results.extend(results)
+        return results
+
+    def successive_halving(self, X, y):
+        """
+        Cross-validates every candidate on min_samples rows, then repeatedly keeps the best 1/halving_factor of the
+        candidates and gives them halving_factor times more rows, until all rows are used or one candidate is left.
+
+        :return: Results of the candidates of the last round, best first.
+        """
+        factor = self.config['halving_factor']
+        candidates = list(ParameterGrid(self.param_grid))
+        # Rows are taken from one fixed order, so every round's rows contain those of the previous round
+        order = np.random.default_rng(self.random_state).permutation(len(X))
+        n_samples = min(max(self.config['min_samples'], self.config['cv_folds']), len(X))
+
+        while True:
+            rows = np.sort(order[:n_samples])
+            results = self.evaluate(X[rows], y[rows], candidates)
+            self.results.extend(results)
+            if n_samples == len(X) or len(candidates) == 1:
+                return results
+            candidates = [result['params'] for result in results[:math.ceil(len(candidates) / factor)]]
+            n_samples = min(n_samples * factor, len(X))
+
+    def run(self, X, y, search='grid'):
+        """
+        Runs a search and records the best candidate.
+
+        :param X: Features of the training data.
+        :param y: Target variable of the training data.
+        :param search: 'grid' or 'halving'.
+        :return: Dictionary with the best parameters, their cross-validated MAE, every result and the fold counts.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        y = np.asarray(y, dtype=np.float64)
+        if search == 'grid':
+            results = self.grid_search(X, y)
+        elif search == 'halving':
+            results = self.successive_halving(X, y)
+        else:
+            raise ValueError(f"unknown search '{search}'")
+
+        self.best_params = results[0]['params']
+        self.best_score = results[0]['mae_mean']
+        logging.info(f'Best parameters {self.best_params} with a cross-validated MAE of {self.best_score:.1f} '
+                     f'({self.fitted_folds} folds fitted, {self.cached_folds} from cache)')
+        return {'best_params': self.best_params, 'best_mae': self.best_score, 'results': self.results,
+                'fitted_folds': self.fitted_folds, 'cached_folds': self.cached_folds}
+
+    def fit_best(self, X, y, model_path=MODEL_PATH):
+        """
+        Fits the best candidate on all the given rows and saves it with ModelHandler.save_model.
+
+        :param X: Features of the training data.
+        :param y: Target variable of the training data.
+        :param model_path: Path the model is saved to.
+        :return: Trained model.
+        """
+        if self.best_params is None:
+            raise ValueError("no search has been run")
+        model = ModelHandler().train(X, y, training_config(self.backend, self.best_params))
+        Path(model_path).parent.mkdir(parents=True, exist_ok=True)
+        ModelHandler().save_model(model, str(model_path))
+        return model
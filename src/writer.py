@@ -0,0 +1,207 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from constants import DATABASE_NAME, WRITER_QUEUE_SIZE, WRITER_FLUSH_ROWS, WRITER_FLUSH_INTERVAL
+from src.cache import version_id
+from src.database import DatabaseHandler
+
+# Queue markers asking the writer thread to write its pending batches, or to write them and stop
+FLUSH = object()
+STOP = object()
+
+
+def predicted_values(predictions):
+    """
+    Returns the predicted values of a batch as a one-dimensional NumPy array.
+
+    :param predictions: Array of predicted values, or DataFrame with a 'Predicted_Value' column.
+    :return: NumPy array of predicted values.
+    """
+    if isinstance(predictions, pd.DataFrame):
+        return predictions['Predicted_Value'].to_numpy()
+    return np.asarray(predictions).ravel()
+
+
+def stamp_predictions(predictions, version=None, predicted_at=None):
+    """
+    Builds the frame of a prediction batch with the model version and the time the batch was made.
+
+    :param predictions: Array of predicted values, or DataFrame with a 'Predicted_Value' column.
+    :param version: Model version identifier, usually from version_id.
+    :param predicted_at: ISO 8601 time the batch was made; defaults to now, in UTC.
+    :return: DataFrame with 'Predicted_Value', 'model_version' and 'predicted_at' columns.
+    """
+    values = predicted_values(predictions)
+    if predicted_at is None:
+        predicted_at = datetime.now(timezone.utc).isoformat()
+    return pd.DataFrame({'Predicted_Value': values,
+                         'model_version': np.full(len(values), version, dtype=object),
+                         'predicted_at': np.full(len(values), predicted_at, dtype=object)}, copy=False)
+
+
+class PredictionWriter:
+    """
+    Class to write prediction batches to the database from a background thread, so that scoring does not wait for
+    SQLite commits.
+
+    Batches are queued on a bounded queue and coalesced into one transaction once WRITER_FLUSH_ROWS rows are pending
+    or the oldest pending batch has waited WRITER_FLUSH_INTERVAL seconds. put blocks while the queue is full, which
+    slows producers down to the rate the database accepts. close, also run at interpreter exit, writes every queued
+    batch before it returns. Use the writer as a context manager to close it.
+    """
+
+    def __init__(self, database_name=DATABASE_NAME, table_name='predictions', max_queue_size=WRITER_QUEUE_SIZE,
+                 flush_rows=WRITER_FLUSH_ROWS, flush_interval=WRITER_FLUSH_INTERVAL):
+        """
+        Initialize PredictionWriter object and start its writer thread.
+
+        :param database_name: Name of the SQLite database predictions are written to.
+        :param table_name: Name of the table where predictions will be saved.
+        :param max_queue_size: Number of batches queued before put blocks.
+        :param flush_rows: Number of pending rows that triggers a write.
+        :param flush_interval: Seconds the oldest pending batch waits at most before it is written.
+        """
+        self.database_handler = DatabaseHandler(database_name)
+        self.table_name = table_name
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(max_queue_size)
+        self.error = None
+        self.closed = False
+        # Guards closed together with the queue, so that no batch is queued after STOP
+        self.lock = threading.Lock()
+        self.stats = {'batches': 0, 'rows': 0, 'writes': 0, 'failed_rows': 0}
+        self.thread = threading.Thread(target=self.run, name='prediction-writer', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def __enter__(self):
+        """
+        Returns the writer, closed when the block exits.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Closes the writer, writing every queued batch.
+        """
+        self.close()
+
+    def put(self, predictions, version=None, block=True, timeout=None):
+        """
+        Queues a batch of predictions to be written.
+
+        :param predictions: Array of predicted values, or DataFrame with a 'Predicted_Value' column.
+        :param version: Model version identifier stored with the predictions.
+        :param block: Wait for room in the queue when it is full.
+        :param timeout: Seconds to wait for room; None waits as long as needed.
+        :raises queue.Full: When the queue stays full, as with queue.Queue.put.
+        """
+        # The batch frame is built by the writer thread, once per write, to keep put cheap for producers
+        batch = (predicted_values(predictions), version, datetime.now(timezone.utc).isoformat())
+        with self.lock:
+            if self.closed:
+                raise ValueError("cannot queue predictions on a closed writer")
+            self.queue.put(batch, block, timeout)
+
+    def put_nowait(self, predictions, version=None):
+        """
+        Queues a batch of predictions without waiting, raising queue.Full when the queue is full.
+        """
+        self.put(predictions, version, block=False)
+
+    def flush(self):
+        """
+        Waits until every batch queued so far is written, and raises the first write error since the last flush.
+        Every batch of a closed writer is already written.
+        """
+        with self.lock:
+            if not self.closed:
+                self.queue.put(FLUSH)
+        self.queue.join()
+        self.raise_error()
+
+    def close(self):
+        """
+        Writes every queued batch, stops the writer thread and raises the first write error since the last flush.
+        Closing a closed writer does nothing.
+        """
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.queue.put(STOP)
+        atexit.unregister(self.close)
+        self.thread.join()
+        self.raise_error()
+
+    def raise_error(self):
+        """
+        Raises the first write error since the last call, if any.
+        """
+        error, self.error = self.error, None
+        if error is not None:
+            raise Exception(f"Writing predictions failed: {error}")
+
+    def run(self):
+        """
+        Writer thread loop: collects queued batches and writes them once a size or time threshold is reached, on a
+        flush request, or before stopping.
+        """
+        pending = []
+        pending_rows = 0
+        deadline = None
+        while True:
+            try:
+                item = self.queue.get(timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, tuple):
+                pending.append(item)
+                pending_rows += len(item[0])
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if pending_rows < self.flush_rows:
+                    continue
+
+            # Reached on the size threshold, the time threshold and the FLUSH and STOP markers
+            if pending:
+                self.write(pending)
+                for _ in pending:
+                    self.queue.task_done()
+            pending, pending_rows, deadline = [], 0, None
+            if item is FLUSH or item is STOP:
+                self.queue.task_done()
+            if item is STOP:
+                return
+
+    def write(self, batches):
+        """
+        Writes batches in one transaction; failures are logged and kept for the next flush or close.
+
+        :param batches: List of (predicted values, model version, prediction time) tuples, as queued by put.
+        """
+        values, versions, predicted_at = zip(*batches)
+        lengths = [len(batch_values) for batch_values in values]
+        predictions_df = pd.DataFrame({'Predicted_Value': np.concatenate(values),
+                                       'model_version': np.repeat(np.array(versions, dtype=object), lengths),
+                                       'predicted_at': np.repeat(np.array(predicted_at, dtype=object), lengths)},
+                                      copy=False)
+        try:
+            self.database_handler.save_predictions_to_database(predictions_df, table_name=self.table_name)
+            self.stats['writes'] += 1
+            self.stats['batches'] += len(batches)
+            self.stats['rows'] += len(predictions_df)
+        except Exception as e:
+            logging.error(f"Error while writing predictions: {e}")
+            self.stats['failed_rows'] += len(predictions_df)
+            if self.error is None:
+                self.error = e
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from src.cache import PredictionCache, version_id
+
+
+class TestPredictionCache(unittest.TestCase):
+    """
+    Unit tests for the PredictionCache class.
+    """
+
+    def setUp(self):
+        """
+        Set up the test environment with a stand-in model file and a feature matrix.
+        """
+        self.model_dir = tempfile.mkdtemp()
+        self.model_path = os.path.join(self.model_dir, 'model.joblib')
+        with open(self.model_path, 'wb') as file:
+            file.write(b'model')
+        self.matrix = np.arange(12, dtype=np.float32).reshape(4, 3)
+        self.predict = mock.Mock(side_effect=lambda matrix: matrix.sum(axis=1))
+
+    def test_only_misses_are_predicted(self):
+        """
+        Test that cached rows are served from the cache and only the other rows are passed to the model.
+        """
+        cache = PredictionCache(self.model_path)
+        cache.predict(self.matrix[:2], self.predict)
+        predictions = cache.predict(self.matrix, self.predict)
+
+        np.testing.assert_array_equal(predictions, self.matrix.sum(axis=1))
+        np.testing.assert_array_equal(self.predict.call_args[0][0], self.matrix[2:])
+        self.assertDictEqual(cache.stats(), {'hits': 2, 'misses': 4, 'hit_rate': 2 / 6, 'size': 4})
+
+    def test_lru_and_ttl_eviction(self):
+        """
+        Test that the least recently used row is evicted first and expired rows are predicted again.
+        """
+        cache = PredictionCache(self.model_path, max_size=2)
+        cache.predict(self.matrix[[0, 1]], self.predict)
+        cache.predict(self.matrix[[0, 2]], self.predict)
+        self.assertTrue(cache.lookup(self.matrix[[1]])[1].all())
+
+        cache = PredictionCache(self.model_path, ttl=10)
+        with mock.patch('src.cache.time.monotonic', side_effect=[0, 0, 5, 20]):
+            cache.predict(self.matrix[:1], self.predict)
+            self.assertFalse(cache.lookup(self.matrix[:1])[1].any())
+            self.assertTrue(cache.lookup(self.matrix[:1])[1].all())
+
+    def test_invalidated_when_model_changes(self):
+        """
+        Test that rewriting the model file clears the cached predictions.
+        """
+        cache = PredictionCache(self.model_path)
+        cache.predict(self.matrix, self.predict)
+        with open(self.model_path, 'wb') as file:
+            file.write(b'new model')
+
+        self.assertTrue(cache.lookup(self.matrix)[1].all())
+
+    def test_keyed_on_given_version(self):
+        """
+        Test that predictions are keyed on the version of the model that made them rather than the model file, and
+        that a missing model file keeps the last version.
+        """
+        cache = PredictionCache(self.model_path)
+        cache.predict(self.matrix, self.predict, version='resident')
+        with open(self.model_path, 'wb') as file:
+            file.write(b'retrained model')
+        self.assertFalse(cache.lookup(self.matrix, 'resident')[1].any())
+        self.assertTrue(cache.lookup(self.matrix, 'reloaded')[1].all())
+
+        cache = PredictionCache(self.model_path)
+        cache.predict(self.matrix, self.predict)
+        os.remove(self.model_path)
+        self.assertFalse(cache.lookup(self.matrix)[1].any())
+
+    def test_explicit_and_default_versions_share_entries(self):
+        """
+        Test that callers passing the model's version_id, like predict_batch and the server, and callers relying on
+        the model file's version keep each other's hits.
+        """
+        cache = PredictionCache(self.model_path)
+        cache.predict(self.matrix, self.predict, version_id(self.model_path))
+        for _ in range(2):
+            self.assertFalse(cache.lookup(self.matrix)[1].any())
+            self.assertFalse(cache.lookup(self.matrix, version_id(self.model_path))[1].any())
+        self.assertEqual(cache.stats()['hits'], 16)
+        self.assertEqual(self.predict.call_count, 1)
+
+    def tearDown(self):
+        """
+        Clean up by removing the model file.
+        """
+        shutil.rmtree(self.model_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
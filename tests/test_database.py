@@ -1,9 +1,14 @@
+import os
+import shutil
 import sqlite3
+import tempfile
+import threading
 import unittest
 
+import numpy as np
 import pandas as pd
 
-from src.database import DatabaseHandler
+from src.database import ConnectionPool, DatabaseHandler, close_pools, decimal_float64, get_pool, haversine_km
 
 
 class TestDatabase(unittest.TestCase):
@@ -40,5 +45,228 @@ class TestDatabase(unittest.TestCase):
         self.conn.close()
 
 
+class TestConnectionPool(unittest.TestCase):
+    """
+    Unit tests for the pooled connections and transaction scopes of the DatabaseHandler class.
+    """
+
+    def setUp(self):
+        """
+        Set up the test environment with a database file in a temporary directory.
+        """
+        self.database_dir = tempfile.mkdtemp()
+        self.database_name = os.path.join(self.database_dir, 'test.db')
+
+    def test_pool_reuses_connections_with_pragmas(self):
+        """
+        Test that connections are returned to the shared pool and use the bulk-write pragmas.
+        """
+        with DatabaseHandler(self.database_name) as handler:
+            conn = handler.connection
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)
+
+        with DatabaseHandler(self.database_name) as handler:
+            self.assertIs(handler.connection, conn)
+
+    def test_close_pool_with_connections_in_use(self):
+        """
+        Test that closing a pool closes the connections in use once they are released, and keeps its size accurate.
+        """
+        pool = get_pool(self.database_name)
+        idle_conn, busy_conn = pool.acquire(), pool.acquire()
+        pool.release(idle_conn)
+        pool.close()
+        self.assertEqual(pool.size, 1)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            idle_conn.execute('SELECT 1')
+
+        pool.release(busy_conn)
+        self.assertEqual(pool.size, 0)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            busy_conn.execute('SELECT 1')
+
+        with pool.connection() as conn:
+            self.assertEqual(conn.execute('SELECT 1').fetchone()[0], 1)
+        self.assertEqual(pool.size, 0)
+
+    def test_pool_waits_for_a_released_connection(self):
+        """
+        Test that acquire blocks while every connection is in use and times out if none is released.
+        """
+        pool = ConnectionPool(self.database_name, max_size=1)
+        conn = pool.acquire()
+        with self.assertRaises(Exception):
+            pool.acquire(timeout=0.05)
+
+        threading.Timer(0.05, pool.release, (conn,)).start()
+        self.assertIs(pool.acquire(timeout=5), conn)
+        pool.release(conn)
+        pool.close()
+
+    def test_float32_values_are_stored_as_decimals(self):
+        """
+        Test that float32 columns are written as rounded decimals by bulk_load and save_to_database, and that
+        those values convert back to the same float32 values.
+        """
+        handler = DatabaseHandler(self.database_name)
+        values = np.array([-122.23, 37.88, 8.3252, 0.0, np.nan], dtype=np.float32)
+        df = pd.DataFrame({'longitude': values})
+        handler.bulk_load(df)
+        handler.save_to_database(df, table_name='saved_data')
+
+        for table_name in ('transformed_data', 'saved_data'):
+            stored = handler.load_from_database(table_name=table_name)['longitude'].to_numpy()
+            np.testing.assert_array_equal(stored, [-122.23, 37.88, 8.3252, 0.0, np.nan])
+            np.testing.assert_array_equal(stored.astype(np.float32), values)
+
+    def test_save_predictions_in_one_transaction(self):
+        """
+        Test that several prediction frames are appended in one commit and rolled back together on error.
+        """
+        handler = DatabaseHandler(self.database_name)
+        frames = [pd.DataFrame({'Predicted_Value': [1.0, 2.0]}), pd.DataFrame({'Predicted_Value': [3.0]})]
+        handler.save_predictions_to_database(frames)
+        self.assertEqual(len(handler.load_from_database(table_name='predictions')), 3)
+
+        with self.assertRaises(Exception):
+            handler.save_predictions_to_database(frames + [pd.DataFrame({'Unknown_Column': [4.0]})])
+        self.assertEqual(len(handler.load_from_database(table_name='predictions')), 3)
+
+    def test_nested_transaction_is_rolled_back_with_the_outer_one(self):
+        """
+        Test that writes made through a connection already in a transaction are committed or rolled back with the
+        enclosing transaction, and that a failed nested block only undoes its own writes.
+        """
+        handler = DatabaseHandler(self.database_name)
+        frame = pd.DataFrame({'Predicted_Value': [1.0]})
+        handler.save_predictions_to_database([frame])
+
+        with self.assertRaises(RuntimeError):
+            with handler.transaction() as conn:
+                handler.save_predictions_to_database([frame], connection=conn)
+                raise RuntimeError('outer failure')
+        self.assertEqual(len(handler.load_from_database(table_name='predictions')), 1)
+
+        with handler.transaction() as conn:
+            handler.save_predictions_to_database([frame], connection=conn)
+            with self.assertRaises(Exception):
+                handler.save_predictions_to_database([pd.DataFrame({'Unknown_Column': [2.0]})], connection=conn)
+        self.assertEqual(len(handler.load_from_database(table_name='predictions')), 2)
+
+    def test_bulk_load(self):
+        """
+        Test that bulk_load writes a typed table in batches, replaces its rows and builds the requested index.
+        """
+        handler = DatabaseHandler(self.database_name)
+        df = pd.DataFrame({'median_income': [8.3, 7.2, 5.6], 'ocean_proximity_INLAND': [0, 1, 0]})
+        handler.bulk_load(df, batch_size=2, index_columns=['ocean_proximity_INLAND'])
+        handler.bulk_load(df.iloc[:2], batch_size=2, index_columns=['ocean_proximity_INLAND'])
+
+        pd.testing.assert_frame_equal(handler.load_from_database(), df.iloc[:2])
+        with handler.connect() as conn:
+            column_types = [row[2] for row in conn.execute('PRAGMA table_info("transformed_data")')]
+            index_names = [row[1] for row in conn.execute('PRAGMA index_list("transformed_data")')]
+        self.assertListEqual(column_types, ['REAL', 'INTEGER'])
+        self.assertListEqual(index_names, ['idx_transformed_data_ocean_proximity_INLAND'])
+
+    def tearDown(self):
+        """
+        Clean up by closing the pooled connections and removing the database directory.
+        """
+        close_pools()
+        shutil.rmtree(self.database_dir)
+
+
+class TestSpatialIndex(unittest.TestCase):
+    """
+    Unit tests for the spatial index and regional queries of the DatabaseHandler class.
+    """
+
+    def setUp(self):
+        """
+        Set up the test environment with points on a coarse grid, so that many share coordinates, loaded into a
+        database file in a temporary directory.
+        """
+        self.database_dir = tempfile.mkdtemp()
+        self.handler = DatabaseHandler(os.path.join(self.database_dir, 'test.db'))
+        rng = np.random.default_rng(0)
+        self.df = pd.DataFrame({'longitude': np.round(rng.uniform(-124, -114, 3000), 1).astype('float32'),
+                                'latitude': np.round(rng.uniform(32, 42, 3000), 1).astype('float32'),
+                                'median_income': rng.uniform(0, 15, 3000).astype('float32')})
+        self.handler.bulk_load(self.df, batch_size=1000)
+        # The values as stored, rounded to decimals rather than widened from float32
+        self.stored = self.df.apply(lambda col: decimal_float64(col.to_numpy()))
+
+    def expected_box(self, box, df=None):
+        """
+        Returns the rowids of the rows within a box, inclusive, by a full scan of the stored values.
+        """
+        df = self.stored if df is None else df
+        inside = df['longitude'].between(box[0], box[2]) & df['latitude'].between(box[1], box[3])
+        return sorted((np.flatnonzero(inside) + 1).tolist())
+
+    def test_box_query_uses_index(self):
+        """
+        Test that box queries return the rows of a full scan, including rows on the edges, through the index.
+        """
+        point = (float(self.stored['longitude'][0]), float(self.stored['latitude'][0]))
+        for box in [(-120, 35, -119, 36), point + point, (-180, -90, 180, 90), (0, 0, 1, 1)]:
+            result = self.handler.query_box(*box, columns=['median_income'])
+            self.assertListEqual(sorted(result['source_rowid'].tolist()), self.expected_box(box))
+            self.assertListEqual(list(result.columns), ['source_rowid', 'median_income'])
+
+        with self.handler.connect() as conn:
+            plan = ' '.join(row[3] for row in conn.execute(
+                'EXPLAIN QUERY PLAN SELECT COUNT(*) FROM transformed_data WHERE CAST(("latitude" + 90) * 100 '
+                'AS INTEGER) IN (12500, 12501) AND "longitude" BETWEEN -120 AND -119'))
+        self.assertIn('idx_transformed_data_spatial', plan)
+
+    def test_radius_and_nearest(self):
+        """
+        Test that radius and nearest-k queries match a brute-force search by great-circle distance.
+        """
+        distances = haversine_km(-119.0, 36.0, self.stored['longitude'], self.stored['latitude'])
+        within = self.handler.query_radius(-119.0, 36.0, 50)
+        self.assertListEqual(sorted(within['source_rowid'].tolist()),
+                             sorted((np.flatnonzero(distances <= 50) + 1).tolist()))
+        self.assertTrue(within['distance_km'].is_monotonic_increasing)
+
+        for k in (1, 25, 5000):
+            nearest = self.handler.query_nearest(-119.0, 36.0, k, columns=['median_income'], initial_radius_km=0.1)
+            np.testing.assert_allclose(nearest['distance_km'], np.sort(distances)[:k])
+        self.assertEqual(len(self.handler.query_nearest(-119.0, 36.0, 0)), 0)
+
+    def test_index_follows_writes(self):
+        """
+        Test that the index stays current after appends, deletes, updates and a recreated table.
+        """
+        self.handler.bulk_load(self.df.iloc[:500], if_exists='append')
+        with self.handler.transaction() as conn:
+            conn.execute('DELETE FROM transformed_data WHERE rowid <= 1000')
+            conn.execute('UPDATE transformed_data SET latitude = 35.5, longitude = -119.5 WHERE rowid = 2000')
+        df = pd.concat([self.stored, self.stored.iloc[:500]], ignore_index=True)
+        df.loc[:999, ['longitude', 'latitude']] = np.nan
+        df.loc[1999, ['longitude', 'latitude']] = [-119.5, 35.5]
+        box = (-120, 35, -119, 36)
+        self.assertListEqual(sorted(self.handler.query_box(*box)['source_rowid'].tolist()), self.expected_box(box, df))
+
+        with self.handler.transaction() as conn:
+            conn.execute('DROP TABLE transformed_data')
+            self.handler.append_rows(conn, self.df.iloc[:100], 'transformed_data')
+        self.assertListEqual(sorted(self.handler.query_box(*box)['source_rowid'].tolist()),
+                             self.expected_box(box, self.stored.iloc[:100]))
+        with self.handler.connect() as conn:
+            index_names = [row[1] for row in conn.execute('PRAGMA index_list("transformed_data")')]
+        self.assertListEqual(index_names, ['idx_transformed_data_spatial'])
+
+    def tearDown(self):
+        """
+        Clean up by closing the pooled connections and removing the database directory.
+        """
+        close_pools()
+        shutil.rmtree(self.database_dir)
+
+
 if __name__ == '__main__':
     unittest.main()
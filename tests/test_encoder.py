@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from src.encoder import FeatureEncoder
+from src.predictor import PredictionRunner
+
+
+class TestEncoder(unittest.TestCase):
+    """
+    Unit tests for the FeatureEncoder class.
+    """
+
+    def test_encode_matches_encode_batch(self):
+        """
+        Test that encoding records one by one gives the same rows as encoding them as a batch.
+        """
+        encoder = FeatureEncoder()
+        input_data = PredictionRunner().given_input_data()
+        rows = np.vstack([encoder.encode(data).copy() for data in input_data])
+        np.testing.assert_array_equal(rows, encoder.encode_batch(input_data))
+
+    def test_fit_ignores_unknown_and_unseen_categories(self):
+        """
+        Test that categories outside the schema or not seen during fitting encode as all zeros.
+        """
+        encoder = FeatureEncoder().fit(['INLAND', 'OUT OF REACH'])
+        self.assertListEqual(list(encoder.category_index), ['INLAND'])
+
+        data_1, data_2, _ = PredictionRunner().given_input_data()
+        self.assertEqual(encoder.encode(data_1)[8:].sum(), 0)
+        self.assertEqual(encoder.encode(data_2)[8:].sum(), 1)
+
+    def test_save_and_load_next_to_model(self):
+        """
+        Test that an encoder persisted next to a model file is loaded back with the same categories.
+        """
+        model_path = os.path.join(tempfile.mkdtemp(), 'model.joblib')
+        encoder = FeatureEncoder().fit(['ISLAND', 'NEAR BAY'])
+        encoder.save(FeatureEncoder.path_for_model(model_path))
+
+        loaded_encoder = FeatureEncoder.for_model(model_path)
+        self.assertDictEqual(loaded_encoder.category_index, encoder.category_index)
+        os.remove(FeatureEncoder.path_for_model(model_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,7 @@ import unittest
 import pandas as pd
 
 from src.etl import DataProcessor
+from src.schema import FEATURE_DTYPES
 
 
 class TestETL(unittest.TestCase):
@@ -56,6 +57,55 @@ class TestETL(unittest.TestCase):
                             'ocean_proximity_ISLAND', 'ocean_proximity_NEAR BAY',
                             'ocean_proximity_NEAR OCEAN']
         self.assertListEqual(list(X_train.columns), expected_columns)
+        self.assertDictEqual({col: str(dtype) for col, dtype in X_train.dtypes.items()}, FEATURE_DTYPES)
+
+    def test_stream_data_matches_prepare_data(self):
+        """
+        Test that the chunked stream_data method writes the same rows as prepare_data.
+        """
+        DataProcessor().prepare_data(self.mock_csv, self.conn)
+        expected_df = pd.read_sql("SELECT * FROM transformed_data", self.conn)
+
+        rows_written = DataProcessor().stream_data(self.mock_csv, self.conn, chunksize=2)
+        streamed_df = pd.read_sql("SELECT * FROM transformed_data", self.conn)
+
+        self.assertEqual(rows_written, len(expected_df))
+        pd.testing.assert_frame_equal(expected_df, streamed_df)
+
+    def test_clean_data_drop_counts(self):
+        """
+        Test that clean_data drops NaN and 'Null' rows, reports them per reason and tolerates duplicate index labels.
+        """
+        df = pd.DataFrame({'ROOMS': [880.0, None, 1467.0, 2000.0],
+                           'OCEAN_PROXIMITY': ['NEAR BAY', 'INLAND', 'Null', 'ISLAND']},
+                          index=[0, 0, 1, 1])
+        cleaned_df, drop_counts = DataProcessor().clean_data(df)
+
+        self.assertDictEqual(drop_counts, {'nan': 1, 'sentinel': 1})
+        self.assertListEqual(list(cleaned_df['OCEAN_PROXIMITY']), ['NEAR BAY', 'ISLAND'])
+
+    def test_incremental_data(self):
+        """
+        Test that incremental_data skips an unchanged file and only applies new, changed and removed rows.
+        """
+        changes = DataProcessor().incremental_data(self.mock_csv, self.conn)
+        self.assertDictEqual(changes, {'inserted': 5, 'deleted': 0, 'unchanged': False})
+        self.assertTrue(DataProcessor().incremental_data(self.mock_csv, self.conn)['unchanged'])
+
+        # Change one row, drop another and add a new one
+        mock_df = pd.read_csv(self.mock_csv)
+        mock_df.loc[0, 'MEDIAN_INCOME'] = 9.0
+        mock_df = pd.concat([mock_df.drop(index=1), mock_df.iloc[[2]]])
+        mock_df.to_csv(self.mock_csv, index=False)
+
+        changes = DataProcessor().incremental_data(self.mock_csv, self.conn)
+        self.assertDictEqual(changes, {'inserted': 2, 'deleted': 2, 'unchanged': False})
+
+        incremental_df = pd.read_sql("SELECT * FROM transformed_data", self.conn)
+        DataProcessor().prepare_data(self.mock_csv, self.conn)
+        expected_df = pd.read_sql("SELECT * FROM transformed_data", self.conn)
+        pd.testing.assert_frame_equal(incremental_df.sort_values(list(incremental_df.columns)).reset_index(drop=True),
+                                      expected_df.sort_values(list(expected_df.columns)).reset_index(drop=True))
 
     def tearDown(self):
         """
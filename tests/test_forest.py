@@ -0,0 +1,226 @@
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor
+
+from src.forest import CompiledForest, float32_thresholds
+from src.model import ModelHandler
+
+
+def make_data(n_rows=500, n_features=5):
+    """
+    Builds a regression problem whose features take few distinct values, so that many rows fall on split thresholds.
+    """
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.integers(0, 20, (n_rows, n_features)) * 0.1, columns=[f'f{i}' for i in range(n_features)])
+    y = X['f0'] * 10 + X['f1'] ** 2 + rng.random(n_rows)
+    return X, y
+
+
+class TestCompiledForest(unittest.TestCase):
+    """
+    Unit tests for the CompiledForest class.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Train a small forest shared by the tests.
+        """
+        cls.X, cls.y = make_data()
+        cls.model = RandomForestRegressor(n_estimators=7, max_depth=6, random_state=0).fit(cls.X, cls.y)
+
+    def test_matches_sklearn(self):
+        """
+        Test that predictions match sklearn for forests and single trees, including unbounded depth.
+        """
+        X_test, _ = make_data(300)
+        models = [self.model, DecisionTreeRegressor(random_state=0).fit(self.X, self.y),
+                  RandomForestRegressor(n_estimators=3, random_state=0).fit(self.X, self.y)]
+        for model in models:
+            np.testing.assert_allclose(CompiledForest.from_estimator(model).predict(X_test), model.predict(X_test),
+                                       rtol=1e-12)
+
+    def test_missing_values_match_sklearn(self):
+        """
+        Test that NaN inputs follow sklearn's missing value routing, for forests fitted with and without NaN.
+        """
+        X_test = make_data(300)[0].mask(np.random.default_rng(1).random((300, 5)) < 0.2)
+        X_missing = self.X.mask(np.random.default_rng(2).random(self.X.shape) < 0.2)
+        models = [self.model, RandomForestRegressor(n_estimators=5, random_state=0).fit(X_missing, self.y),
+                  DecisionTreeRegressor(random_state=0).fit(X_missing, self.y)]
+        for model in models:
+            np.testing.assert_allclose(CompiledForest.from_estimator(model).predict(X_test), model.predict(X_test),
+                                       rtol=1e-12)
+
+    def test_tiles(self):
+        """
+        Test that splitting a batch into tiles of rows and trees does not change the predictions.
+        """
+        compiled = CompiledForest.from_estimator(self.model)
+        expected = compiled.predict(self.X)
+        for tile_size in [1, 64, 1000]:
+            with patch('src.forest.TILE_SIZE', tile_size):
+                np.testing.assert_allclose(compiled.predict(self.X), expected, rtol=1e-12)
+        self.assertEqual(compiled.predict(self.X.iloc[:1]).shape, (1,))
+        self.assertEqual(compiled.predict(self.X.iloc[:0]).shape, (0,))
+
+    def test_thresholds_are_rounded_down(self):
+        """
+        Test that float32 thresholds split float32 values like the float64 thresholds they come from.
+        """
+        thresholds = np.array([0.1, 0.30000001192092896, 1 / 3, 2.5])
+        rounded = float32_thresholds(thresholds)
+        # rounded is the largest float32 that goes left of each threshold, the next float32 goes right
+        self.assertTrue(np.all(rounded.astype(np.float64) <= thresholds))
+        self.assertTrue(np.all(np.nextafter(rounded, np.float32(np.inf)).astype(np.float64) > thresholds))
+
+    def test_invalid_input(self):
+        """
+        Test that unsupported models and inputs with the wrong number of features are rejected.
+        """
+        with self.assertRaises(ValueError):
+            CompiledForest.from_estimator(HistGradientBoostingRegressor(max_iter=2).fit(self.X, self.y))
+        with self.assertRaises(ValueError):
+            CompiledForest.from_estimator(self.model).predict(self.X.iloc[:, :3])
+
+    def test_model_handler_loads_compiled_model(self):
+        """
+        Test that ModelHandler compiles forests on load, caches them apart from the estimator and keeps other models.
+        """
+        model_dir = tempfile.mkdtemp()
+        try:
+            model_path = os.path.join(model_dir, 'model.joblib')
+            ModelHandler().save_model(self.model, model_path)
+            compiled = ModelHandler().load_model(model_path, compiled=True)
+            self.assertIsInstance(compiled, CompiledForest)
+            self.assertIs(ModelHandler().load_model(model_path, compiled=True), compiled)
+            self.assertIsInstance(ModelHandler().load_model(model_path), RandomForestRegressor)
+            np.testing.assert_allclose(ModelHandler().predict(self.X, compiled), self.model.predict(self.X))
+
+            boosting = HistGradientBoostingRegressor(max_iter=2).fit(self.X, self.y)
+            self.assertIs(ModelHandler().compile_model(boosting), boosting)
+        finally:
+            ModelHandler.clear_cache()
+            shutil.rmtree(model_dir)
+
+
+
+class TestArtifact(unittest.TestCase):
+    """
+    Unit tests for the compact CompiledForest artifact.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Train a small forest shared by the tests.
+        """
+        cls.X, cls.y = make_data()
+        cls.model = RandomForestRegressor(n_estimators=5, max_depth=5, random_state=0).fit(cls.X, cls.y)
+        cls.expected = cls.model.predict(cls.X)
+
+    def setUp(self):
+        """
+        Set up the test environment with a temporary model directory.
+        """
+        self.model_dir = tempfile.mkdtemp()
+        self.artifact_path = os.path.join(self.model_dir, 'model.forest')
+
+    def tearDown(self):
+        """
+        Clean up the temporary model directory.
+        """
+        ModelHandler.clear_cache()
+        shutil.rmtree(self.model_dir)
+
+    def test_round_trip(self):
+        """
+        Test that a saved forest is memory-mapped on load with compact dtypes and predicts like the original model.
+        """
+        CompiledForest.from_estimator(self.model).save(self.artifact_path)
+        forest = CompiledForest.load(self.artifact_path)
+        self.assertFalse(forest.threshold.flags.writeable)
+        self.assertEqual((forest.feature.dtype, forest.left.dtype, forest.value.dtype),
+                         (np.uint8, np.int32, np.float32))
+        np.testing.assert_allclose(forest.predict(self.X), self.expected, rtol=1e-6)
+
+        X_missing = self.X.mask(np.random.default_rng(1).random(self.X.shape) < 0.2)
+        np.testing.assert_allclose(forest.predict(X_missing), self.model.predict(X_missing), rtol=1e-6)
+
+    def test_version_1_artifacts_reject_missing_values(self):
+        """
+        Test that artifacts written before the direction of missing values was stored still load, and reject NaN
+        inputs instead of routing them.
+        """
+        with patch('src.forest.ARTIFACT_VERSION', 1):
+            CompiledForest.from_estimator(self.model).save(self.artifact_path)
+        forest = CompiledForest.load(self.artifact_path)
+        self.assertIsNone(forest.missing_right)
+        np.testing.assert_allclose(forest.predict(self.X), self.expected, rtol=1e-6)
+        with self.assertRaises(ValueError):
+            forest.predict(self.X.mask(self.X > 1.5))
+
+    def test_quantized_leaves(self):
+        """
+        Test that quantized leaf values stay within half a quantization step of the original ones.
+        """
+        leaf_range = self.model.predict(self.X).max() - self.model.predict(self.X).min()
+        for leaf_bits in (8, 16):
+            self.assertTrue(ModelHandler().export_model(self.model, self.artifact_path, leaf_bits))
+            predictions = CompiledForest.load(self.artifact_path).predict(self.X)
+            np.testing.assert_allclose(predictions, self.expected, atol=2 * leaf_range / 2 ** leaf_bits)
+        with self.assertRaises(IOError):
+            CompiledForest.from_estimator(self.model).save(self.artifact_path, leaf_bits=4)
+
+    def test_corrupt_files_are_rejected(self):
+        """
+        Test that files with a changed payload, another version or another format fail to load.
+        """
+        CompiledForest.from_estimator(self.model).save(self.artifact_path)
+        with open(self.artifact_path, 'r+b') as file:
+            data = bytearray(file.read())
+            file.seek(len(data) - 1)
+            file.write(bytes([data[-1] ^ 1]))
+        with self.assertRaises(IOError):
+            CompiledForest.load(self.artifact_path)
+        CompiledForest.load(self.artifact_path, verify=False)
+
+        with patch('src.forest.ARTIFACT_VERSION', 3):
+            CompiledForest.from_estimator(self.model).save(self.artifact_path)
+        with self.assertRaises(IOError):
+            CompiledForest.load(self.artifact_path)
+
+        joblib_path = os.path.join(self.model_dir, 'model.joblib')
+        ModelHandler().save_model(self.model, joblib_path)
+        self.assertFalse(CompiledForest.is_artifact(joblib_path))
+        with self.assertRaises(IOError):
+            CompiledForest.load(joblib_path)
+
+    def test_model_handler_prefers_current_artifact(self):
+        """
+        Test that a compiled load uses the artifact exported next to the model unless the model file is newer.
+        """
+        model_path = os.path.join(self.model_dir, 'model.joblib')
+        ModelHandler().save_model(self.model, model_path)
+        self.assertEqual(CompiledForest.path_for_model(model_path), Path(self.artifact_path))
+        ModelHandler().export_model(self.model, self.artifact_path)
+        self.assertFalse(ModelHandler().load_model(model_path, compiled=True).value.flags.writeable)
+        self.assertIsInstance(ModelHandler().load_model(self.artifact_path), CompiledForest)
+
+        model_mtime = os.stat(self.artifact_path).st_mtime_ns + 10 ** 9
+        os.utime(model_path, ns=(model_mtime, model_mtime))
+        self.assertTrue(ModelHandler().load_model(model_path, compiled=True).value.flags.writeable)
+        self.assertFalse(ModelHandler().export_model(HistGradientBoostingRegressor(max_iter=2).fit(self.X, self.y),
+                                                     self.artifact_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
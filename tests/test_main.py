@@ -0,0 +1,105 @@
+import sqlite3
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from constants import EXPECTED_COLUMN
+from main import DataPipeline, build_parser, run_predict
+from src.database import DatabaseHandler
+from src.model import ModelHandler
+
+
+class TestDataPipeline(unittest.TestCase):
+    """
+    Unit tests for the DataPipeline class.
+    """
+
+    def setUp(self):
+        """
+        Set up the test environment with transformed data in an in-memory database and a small trained model.
+        """
+        rng = np.random.default_rng(0)
+        self.features = pd.DataFrame(rng.random((7, len(EXPECTED_COLUMN))), columns=EXPECTED_COLUMN)
+        self.conn = sqlite3.connect(':memory:')
+        DatabaseHandler().bulk_load(self.features, self.conn)
+
+        self.pipeline = DataPipeline()
+        self.pipeline.model = RandomForestRegressor(n_estimators=3, random_state=0).fit(self.features, rng.random(7))
+
+    def test_score_table_resumes_after_crash(self):
+        """
+        Test that score_table commits chunk by chunk and a rerun only scores the rows after the last committed chunk.
+        """
+        predict = ModelHandler.predict
+        with mock.patch.object(ModelHandler, 'predict', autospec=True,
+                               side_effect=[predict(ModelHandler(), self.features[:3], self.pipeline.model),
+                                            ValueError('crash')]):
+            with self.assertRaises(ValueError):
+                self.pipeline.score_table(chunksize=3, connection=self.conn)
+
+        self.assertEqual(self.pipeline.score_table(chunksize=3, connection=self.conn), 4)
+
+        scored_df = pd.read_sql("SELECT * FROM scored_predictions", self.conn)
+        self.assertListEqual(list(scored_df['source_rowid']), list(range(1, 8)))
+        np.testing.assert_allclose(scored_df['Predicted_Value'], self.pipeline.model.predict(self.features))
+
+    def test_score_region(self):
+        """
+        Test that score_region scores exactly the rows within the box.
+        """
+        scores = self.pipeline.score_region((0, 0, 0.6, 0.6), connection=self.conn)
+        inside = self.features['longitude'].between(0, 0.6) & self.features['latitude'].between(0, 0.6)
+        self.assertListEqual(list(scores['source_rowid']), list(np.flatnonzero(inside) + 1))
+        np.testing.assert_allclose(scores['Predicted_Value'], self.pipeline.model.predict(self.features[inside]))
+
+    def tearDown(self):
+        """
+        Clean up by closing the database connection.
+        """
+        self.conn.close()
+
+
+class TestCommandLine(unittest.TestCase):
+    """
+    Unit tests for the main.py subcommands.
+    """
+
+    def imported_modules(self, module):
+        """
+        Imports a module in a fresh interpreter and returns the names of the modules that ended up loaded.
+        """
+        script = f'import sys, {module}; print(" ".join(sys.modules))'
+        return subprocess.run([sys.executable, '-c', script], cwd=Path(__file__).parent.parent, check=True,
+                              capture_output=True, text=True).stdout.split()
+
+    def test_entry_point_imports_are_lazy(self):
+        """
+        Test that importing main loads neither pandas nor sklearn, and that the ETL does not load sklearn.
+        """
+        modules = self.imported_modules('main')
+        self.assertNotIn('pandas', modules)
+        self.assertNotIn('sklearn', modules)
+        self.assertNotIn('sklearn', self.imported_modules('src.etl'))
+
+    def test_subcommands(self):
+        """
+        Test that subcommands are parsed with their options and dispatched to their handler.
+        """
+        parser = build_parser()
+        args = parser.parse_args(['predict', '--model', 'other.joblib'])
+        self.assertIs(args.func, run_predict)
+        self.assertEqual(args.model, 'other.joblib')
+        self.assertTrue(parser.parse_args(['score', '--restart']).restart)
+        self.assertIsNone(parser.parse_args([]).func)
+        with self.assertRaises(SystemExit), mock.patch('sys.stderr'):
+            parser.parse_args(['etl', '--mode', 'unknown'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,14 @@
+import os
+import shutil
+import tempfile
 import unittest
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestRegressor
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
 
+from constants import TRAINING_CONFIG
 from src.model import ModelHandler
 
 PROJECT_ROOT = Path(__file__).parent.parent
@@ -32,5 +37,148 @@ class TestModel(unittest.TestCase):
         self.assertTrue(len(prediction) > 0)
 
 
+class TestModelTraining(unittest.TestCase):
+    """
+    Unit tests for the training configuration of the ModelHandler class.
+    """
+
+    def setUp(self):
+        """
+        Set up the test environment by generating random training data.
+        """
+        rng = np.random.default_rng(0)
+        self.X = rng.random((100, 13))
+        self.y = rng.random(100)
+
+    def test_train_parallel_random_forest(self):
+        """
+        Test that the random forest backend trains with the configured n_jobs and thread limit.
+        """
+        config = {'n_jobs': 2, 'max_threads': 1, 'random_forest': {'n_estimators': 5, 'max_depth': 3}}
+        model = ModelHandler().train(self.X, self.y, config)
+        self.assertIsInstance(model, RandomForestRegressor)
+        self.assertEqual(model.n_jobs, 2)
+
+    def test_train_warm_start(self):
+        """
+        Test that passing a fitted forest grows it with new trees instead of rebuilding it.
+        """
+        config = {'random_forest': {'n_estimators': 5, 'max_depth': 3}, 'warm_start_estimators': 3}
+        model = ModelHandler().train(self.X, self.y, config)
+        first_trees = list(model.estimators_)
+
+        grown = ModelHandler().train(self.X[:50], self.y[:50], config, model=model)
+        self.assertEqual(len(grown.estimators_), 8)
+        for grown_tree, first_tree in zip(grown.estimators_[:5], first_trees):
+            np.testing.assert_array_equal(grown_tree.tree_.threshold, first_tree.tree_.threshold)
+
+        # The given model may be shared through the model cache, so it is left as it was
+        self.assertListEqual(model.estimators_, first_trees)
+        self.assertEqual(model.n_estimators, 5)
+        self.assertFalse(model.warm_start)
+
+    def test_estimator_overrides_keep_backend_defaults(self):
+        """
+        Test that overriding one estimator parameter keeps the other defaults of the backend.
+        """
+        model = ModelHandler().train(self.X, self.y, {'random_forest': {'n_estimators': 3}})
+        self.assertEqual(model.n_estimators, 3)
+        self.assertEqual(model.max_depth, TRAINING_CONFIG['random_forest']['max_depth'])
+
+    def test_train_hist_gradient_boosting(self):
+        """
+        Test that the histogram-based gradient boosting backend can be selected.
+        """
+        config = {'backend': 'hist_gradient_boosting', 'hist_gradient_boosting': {'max_iter': 5}}
+        model = ModelHandler().train(self.X, self.y, config)
+        self.assertIsInstance(model, HistGradientBoostingRegressor)
+
+    def test_train_unknown_backend(self):
+        """
+        Test that an unknown backend raises a ValueError.
+        """
+        with self.assertRaises(ValueError):
+            ModelHandler().train(self.X, self.y, {'backend': 'unknown'})
+
+
+class TestModelCache(unittest.TestCase):
+    """
+    Unit tests for the process-level model cache and the memory-mapped model format.
+    """
+
+    def setUp(self):
+        """
+        Set up the test environment by training a small model and clearing the model cache.
+        """
+        rng = np.random.default_rng(0)
+        self.X = rng.random((100, 13))
+        self.model = RandomForestRegressor(n_estimators=3, max_depth=3, random_state=0).fit(self.X, rng.random(100))
+        self.model_dir = tempfile.mkdtemp()
+        ModelHandler.clear_cache()
+
+    def model_path(self, name='model.joblib'):
+        """
+        Returns a path for a model file inside the temporary directory.
+        """
+        return os.path.join(self.model_dir, name)
+
+    def test_load_model_returns_cached_model(self):
+        """
+        Test that repeated loads of an unchanged file return the same estimator and a rewritten file is reloaded.
+        """
+        ModelHandler().save_model(self.model, self.model_path())
+        first_model = ModelHandler().load_model(self.model_path())
+        self.assertIs(ModelHandler().load_model(self.model_path()), first_model)
+
+        ModelHandler().save_model(self.model, self.model_path())
+        os.utime(self.model_path(), ns=(0, 0))
+        self.assertIsNot(ModelHandler().load_model(self.model_path()), first_model)
+
+    def test_load_stats_count_warm_and_cold_loads(self):
+        """
+        Test that loads served from the cache and loads from the file are counted and timed separately.
+        """
+        ModelHandler().save_model(self.model, self.model_path())
+        before = ModelHandler.load_stats()
+        for _ in range(3):
+            ModelHandler().load_model(self.model_path())
+        ModelHandler().load_model(self.model_path(), use_cache=False)
+
+        after = ModelHandler.load_stats()
+        self.assertEqual(after['cold_loads'] - before['cold_loads'], 2)
+        self.assertEqual(after['warm_loads'] - before['warm_loads'], 2)
+        self.assertGreater(after['cold_ms'], 0)
+        self.assertGreater(after['warm_ms'], 0)
+
+    def test_load_model_evicts_least_recently_used(self):
+        """
+        Test that the cache keeps at most MODEL_CACHE_SIZE models and evicts the least recently used one.
+        """
+        from src import model as model_module
+
+        for i in range(model_module.MODEL_CACHE_SIZE + 1):
+            ModelHandler().save_model(self.model, self.model_path(f'model_{i}.joblib'))
+            ModelHandler().load_model(self.model_path(f'model_{i}.joblib'))
+
+        cached_paths = [key[0] for key in model_module._MODEL_CACHE]
+        self.assertEqual(len(cached_paths), model_module.MODEL_CACHE_SIZE)
+        self.assertNotIn(self.model_path('model_0.joblib'), cached_paths)
+
+    def test_memory_mapped_model(self):
+        """
+        Test that an uncompressed model loaded with mmap_mode='r' predicts like the original.
+        """
+        ModelHandler().save_model(self.model, self.model_path(), compress=0)
+        mapped_model = ModelHandler().load_model(self.model_path(), mmap_mode='r')
+        np.testing.assert_allclose(mapped_model.predict(self.X), self.model.predict(self.X))
+
+    def tearDown(self):
+        """
+        Clean up by clearing the model cache and removing the model files.
+        """
+        ModelHandler.clear_cache()
+        shutil.rmtree(self.model_dir)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from constants import EXPECTED_COLUMN
+from src.model import ModelHandler
+from src.parallel import ParallelScorer
+
+
+class TestParallelScorer(unittest.TestCase):
+    """
+    Unit tests for the ParallelScorer class.
+    """
+
+    def setUp(self):
+        """
+        Set up the test environment by saving a small model in the memory-mappable format.
+        """
+        rng = np.random.default_rng(0)
+        self.X = pd.DataFrame(rng.random((50, len(EXPECTED_COLUMN))), columns=EXPECTED_COLUMN)
+        self.model = RandomForestRegressor(n_estimators=3, max_depth=4, random_state=0).fit(self.X, rng.random(50))
+        self.model_dir = tempfile.mkdtemp()
+        self.model_path = os.path.join(self.model_dir, 'model.joblib')
+        ModelHandler().save_model(self.model, self.model_path, compress=0)
+
+    def test_predict_matches_model_in_order(self):
+        """
+        Test that sharded parallel predictions are reassembled in input order and match a single predict call.
+        """
+        with ParallelScorer(self.model_path, n_workers=2, shard_size=7) as scorer:
+            np.testing.assert_allclose(scorer.predict(self.X), self.model.predict(self.X))
+            np.testing.assert_allclose(scorer.predict(self.X.to_numpy()[:3]), self.model.predict(self.X[:3]))
+
+    def tearDown(self):
+        """
+        Clean up by removing the model file.
+        """
+        shutil.rmtree(self.model_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+import main
+from constants import TRAIN_DATA_PATH
+from src.database import DatabaseHandler, close_pools
+from src.etl import DataProcessor
+from src.model import ModelHandler
+from src.pipeline import StageGraph
+
+
+class TestStageGraph(unittest.TestCase):
+    """
+    Unit tests for the StageGraph class.
+    """
+
+    def setUp(self):
+        """
+        Set up the test environment with a temporary state database and a graph of mocked stages.
+        """
+        self.database_dir = tempfile.mkdtemp()
+        self.fingerprint = 'v1'
+        self.extract = mock.Mock(return_value=[1, 2, 3])
+        self.load = mock.Mock(side_effect=lambda rows: {'rows': len(rows)})
+        self.total = mock.Mock(side_effect=sum)
+        self.graph = self.build_graph()
+
+    def build_graph(self):
+        """
+        Build a graph where two persistent targets share the output of one extract stage.
+        """
+        graph = StageGraph(os.path.join(self.database_dir, 'state.db'))
+        graph.add('extract', self.extract, fingerprint=lambda: self.fingerprint)
+        graph.add('load', self.load, ['extract'], persistent=True)
+        graph.add('total', self.total, ['extract'], persistent=True)
+        return graph
+
+    def tearDown(self):
+        """
+        Clean up the temporary state database.
+        """
+        close_pools()
+        shutil.rmtree(self.database_dir)
+
+    def test_intermediates_are_shared(self):
+        """
+        Test that a stage consumed by several targets runs once and its output is passed to each of them.
+        """
+        outputs = self.graph.run()
+        self.assertEqual(self.graph.targets(), ['load', 'total'])
+        self.assertEqual(outputs['load'], {'rows': 3})
+        self.assertEqual(outputs['total'], 6)
+        self.extract.assert_called_once_with()
+        self.assertEqual(self.graph.executed, ['extract', 'load', 'total'])
+
+    def test_unchanged_stages_are_skipped(self):
+        """
+        Test that persistent stages are skipped with their recorded output until their inputs change.
+        """
+        self.graph.run()
+        outputs = self.build_graph().run()
+        self.assertEqual(outputs['total'], 6)
+        self.extract.assert_called_once_with()
+
+        graph = self.build_graph()
+        graph.run(force=True)
+        self.assertEqual(graph.skipped, [])
+
+        self.fingerprint = 'v2'
+        graph = self.build_graph()
+        graph.run()
+        self.assertEqual(graph.executed, ['extract', 'load', 'total'])
+        self.assertEqual(self.extract.call_count, 3)
+
+    def test_invalid_graph(self):
+        """
+        Test that stages cannot depend on unknown stages or be defined twice.
+        """
+        with self.assertRaises(ValueError):
+            self.graph.add('score', self.total, ['predict'])
+        with self.assertRaises(ValueError):
+            self.graph.add('load', self.load, ['extract'])
+
+
+class TestPipelineGraph(unittest.TestCase):
+    """
+    Integration tests for the stage graph of DataPipeline.
+    """
+
+    def setUp(self):
+        """
+        Set up the test environment with a sample of the housing data and a small model trained on it.
+        """
+        self.data_dir = tempfile.mkdtemp()
+        self.data_path = os.path.join(self.data_dir, 'housing.csv')
+        self.model_path = os.path.join(self.data_dir, 'model.joblib')
+        self.database_name = os.path.join(self.data_dir, 'test.db')
+        pd.read_csv(TRAIN_DATA_PATH, nrows=300).to_csv(self.data_path, index=False)
+
+        self.X, y = DataProcessor().extract_data(self.data_path)
+        self.model = ModelHandler().train(self.X, y, {'backend': 'random_forest', 'random_forest': {'n_estimators': 3}})
+        ModelHandler().save_model(self.model, self.model_path)
+
+    def tearDown(self):
+        """
+        Clean up the temporary data directory.
+        """
+        close_pools()
+        shutil.rmtree(self.data_dir)
+
+    def test_rows_are_evaluated_once_and_reruns_are_skipped(self):
+        """
+        Test that every row is scored by the model once per run, and that a rerun on unchanged inputs only runs the
+        sample predictions.
+        """
+        predict = ModelHandler.predict
+        with mock.patch.object(main, 'TRAIN_DATA_PATH', self.data_path), \
+                mock.patch.object(main, 'MODEL_PATH', self.model_path), \
+                mock.patch.object(ModelHandler, 'predict', autospec=True, side_effect=predict) as predict_mock:
+            graph = main.DataPipeline(database_name=self.database_name).build_graph()
+            graph.reset()
+            outputs = graph.run()
+
+            sample_rows = len(outputs['sample_predictions'])
+            evaluated_rows = sum(len(call.args[1]) for call in predict_mock.call_args_list)
+            self.assertEqual(evaluated_rows, len(self.X) + sample_rows)
+            self.assertEqual(set(outputs['evaluate']), {'train_error', 'test_error'})
+
+            scored_df = DatabaseHandler(self.database_name).load_from_database(table_name='scored_predictions')
+            np.testing.assert_array_equal(scored_df['source_rowid'], np.arange(1, len(self.X) + 1))
+            np.testing.assert_allclose(scored_df['Predicted_Value'], self.model.predict(self.X))
+
+            graph = main.DataPipeline(database_name=self.database_name).build_graph()
+            graph.run()
+            self.assertEqual(graph.executed, ['model', 'sample_predictions'])
+            self.assertEqual(graph.skipped, ['load', 'evaluate', 'score'])
+
+    def test_save_scores_follows_table_rowids(self):
+        """
+        Test that scores are saved against the rowids of the transformed data table, which need not start at 1, and
+        that a prediction count that does not match the table is rejected.
+        """
+        handler = DatabaseHandler(self.database_name)
+        handler.bulk_load(self.X)
+        with handler.transaction() as conn:
+            conn.execute('DELETE FROM transformed_data WHERE rowid <= 2')
+
+        pipeline = main.DataPipeline(database_name=self.database_name)
+        pipeline.save_scores(np.arange(len(self.X) - 2.0))
+        scored_df = handler.load_from_database(table_name='scored_predictions')
+        np.testing.assert_array_equal(scored_df['source_rowid'], np.arange(3, len(self.X) + 1))
+        with self.assertRaises(ValueError):
+            pipeline.save_scores(np.arange(len(self.X), dtype=float))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,21 @@
+import os
+import shutil
+import sqlite3
+import tempfile
 import unittest
+from unittest import mock
 
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from constants import EXPECTED_COLUMN
+from src.cache import PredictionCache
+from src.database import DatabaseHandler, close_pools
+from src.encoder import FeatureEncoder
+from src.model import ModelHandler
 from src.predictor import PredictionRunner
+from src.writer import PredictionWriter, version_id
 
 
 class TestPredictor(unittest.TestCase):
@@ -8,6 +23,19 @@ class TestPredictor(unittest.TestCase):
     Unit tests for the PredictionRunner class.
     """
 
+    def setUp(self):
+        """
+        Set up the test environment by training a small model on random data and creating an in-memory database.
+        """
+        rng = np.random.default_rng(0)
+        features = pd.DataFrame(rng.random((200, len(EXPECTED_COLUMN))), columns=EXPECTED_COLUMN)
+        model = RandomForestRegressor(n_estimators=5, max_depth=4, random_state=0).fit(features, rng.random(200))
+
+        handle, self.model_path = tempfile.mkstemp(suffix='.joblib')
+        os.close(handle)
+        ModelHandler().save_model(model, self.model_path)
+        self.conn = sqlite3.connect(':memory:')
+
     def test_prepare_input_data(self):
         """
         Test the prepare_input_data method of the PredictionRunner class.
@@ -19,6 +47,91 @@ class TestPredictor(unittest.TestCase):
         self.assertIsNotNone(prepared_data)
         self.assertIn('ocean_proximity_NEAR OCEAN', prepared_data.columns)
 
+    def test_encode_batch_matches_prepare_input_data(self):
+        """
+        Test that encode_batch produces the same features as prepare_input_data, for records and columnar input.
+        """
+        runner = PredictionRunner()
+        input_data = runner.given_input_data()
+        expected = np.vstack([runner.prepare_input_data(data).to_numpy(dtype=np.float32) for data in input_data])
+
+        np.testing.assert_array_equal(runner.encode_batch(input_data), expected)
+        np.testing.assert_array_equal(runner.encode_batch(pd.DataFrame(list(input_data))), expected)
+
+    def test_predict_batch(self):
+        """
+        Test that predict_batch scores all records at once and saves every prediction to the database.
+        """
+        runner = PredictionRunner()
+        input_data = runner.given_input_data()
+        predictions = runner.predict_batch(input_data, self.model_path, self.conn)
+
+        model = ModelHandler().load_model(self.model_path)
+        expected = [ModelHandler().predict(runner.prepare_input_data(data), model)[0] for data in input_data]
+        np.testing.assert_allclose(predictions, expected)
+
+        saved_df = pd.read_sql("SELECT * FROM predictions", self.conn)
+        self.assertEqual(len(saved_df), len(input_data))
+
+    def test_predict_batch_with_cache(self):
+        """
+        Test that predict_batch serves repeated records from the prediction cache.
+        """
+        runner = PredictionRunner()
+        cache = PredictionCache(self.model_path)
+        first_predictions = runner.predict_batch(runner.given_input_data(), self.model_path, self.conn, cache)
+        second_predictions = runner.predict_batch(runner.given_input_data(), self.model_path, self.conn, cache)
+
+        np.testing.assert_allclose(first_predictions, second_predictions)
+        self.assertEqual(cache.stats()['hits'], 3)
+
+    def test_predict_batch_with_writer(self):
+        """
+        Test that predict_batch queues predictions on the runner's writer, stamped with the model version.
+        """
+        database_dir = tempfile.mkdtemp()
+        try:
+            database_name = os.path.join(database_dir, 'test.db')
+            with PredictionWriter(database_name, flush_interval=60) as writer:
+                runner = PredictionRunner(writer=writer)
+                predictions = runner.predict_batch(runner.given_input_data(), self.model_path)
+                self.assertEqual(writer.stats['rows'], 0)
+
+            saved_df = DatabaseHandler(database_name).load_from_database(table_name='predictions')
+            np.testing.assert_allclose(saved_df['Predicted_Value'], predictions)
+            self.assertEqual(set(saved_df['model_version']), {version_id(self.model_path)})
+        finally:
+            close_pools()
+            shutil.rmtree(database_dir)
+
+    def test_encoder_is_cached_until_rewritten(self):
+        """
+        Test that the encoder persisted next to the model is loaded once per runner and reloaded when rewritten.
+        """
+        encoder_path = FeatureEncoder.path_for_model(self.model_path)
+        FeatureEncoder().fit(['INLAND']).save(encoder_path)
+        try:
+            runner = PredictionRunner()
+            with mock.patch.object(FeatureEncoder, 'load', wraps=FeatureEncoder.load) as load:
+                runner.predict_batch(runner.given_input_data(), self.model_path, self.conn)
+                runner.predict_batch(runner.given_input_data(), self.model_path, self.conn)
+                self.assertEqual(load.call_count, 1)
+
+                FeatureEncoder().fit(['NEAR OCEAN']).save(encoder_path)
+                os.utime(encoder_path, ns=(0, os.stat(encoder_path).st_mtime_ns + 1))
+                self.assertEqual(list(runner.load_encoder(self.model_path).category_index), ['NEAR OCEAN'])
+                self.assertEqual(load.call_count, 2)
+            self.assertIs(runner.load_encoder(), runner.load_encoder())
+        finally:
+            os.remove(encoder_path)
+
+    def tearDown(self):
+        """
+        Clean up by removing the model file and closing the database connection.
+        """
+        os.remove(self.model_path)
+        self.conn.close()
+
 
 if __name__ == '__main__':
     unittest.main()
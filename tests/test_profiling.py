@@ -0,0 +1,83 @@
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from src.profiling import PipelineProfiler, stage
+
+
+class TestPipelineProfiler(unittest.TestCase):
+    """
+    Unit tests for the PipelineProfiler class.
+    """
+
+    def setUp(self):
+        """
+        Set up the test environment with a temporary metrics directory.
+        """
+        self.metrics_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        """
+        Clean up the temporary metrics directory.
+        """
+        shutil.rmtree(self.metrics_dir)
+
+    def test_stages_are_aggregated(self):
+        """
+        Test that repeated stages are aggregated under their name and the report is written on exit.
+        """
+        with PipelineProfiler('test', self.metrics_dir) as profiler:
+            for rows in (10, 20):
+                with stage('cleaning') as metrics:
+                    metrics['rows'] = rows
+            with stage('split'):
+                pass
+
+        with open(profiler.report_path) as file:
+            report = json.load(file)
+        self.assertEqual(report['run_name'], 'test')
+        self.assertEqual(report['stages']['cleaning']['calls'], 2)
+        self.assertEqual(report['stages']['cleaning']['rows'], 30)
+        self.assertIn('rows_per_second', report['stages']['cleaning'])
+        self.assertEqual(report['stages']['split']['rows'], 0)
+        self.assertGreaterEqual(report['stages']['split']['peak_rss_growth_mb'], 0)
+
+    def test_peak_rss_growth_is_per_stage(self):
+        """
+        Test that a stage below the peak of an earlier stage reports no growth instead of the earlier peak.
+        """
+        with mock.patch('src.profiling.peak_rss_mb', side_effect=[100.0, 150.0, 150.0, 150.0]):
+            with PipelineProfiler('test', self.metrics_dir) as profiler:
+                with stage('load'):
+                    pass
+                with stage('split'):
+                    pass
+
+        self.assertEqual(profiler.stages['load']['peak_rss_growth_mb'], 50.0)
+        self.assertEqual(profiler.stages['split']['peak_rss_growth_mb'], 0.0)
+
+    def test_deep_mode_writes_profile(self):
+        """
+        Test that the deep mode records traced memory and writes the cProfile statistics.
+        """
+        with PipelineProfiler('deep', self.metrics_dir, deep=True) as profiler:
+            with stage('encoding') as metrics:
+                metrics['rows'] = len([0] * 1000)
+
+        self.assertIn('traced_peak_mb', profiler.stages['encoding'])
+        self.assertTrue(profiler.report_path.with_suffix('.prof').exists())
+
+    def test_stage_without_profiler(self):
+        """
+        Test that stages are no-ops when no profiler is active.
+        """
+        with stage('cleaning') as metrics:
+            metrics['rows'] = 5
+        self.assertEqual(metrics, {'rows': 5})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from constants import EXPECTED_COLUMN
+from src.database import DatabaseHandler, close_pools
+from src.model import ModelHandler
+from src.predictor import PredictionRunner
+from src.server import MicroBatcher, PredictionClient, PredictionServer
+
+
+class TestPredictionServer(unittest.TestCase):
+    """
+    Unit tests for the PredictionServer class, run against localhost.
+    """
+
+    def setUp(self):
+        """
+        Set up the test environment with a small model and a database in a temporary directory.
+        """
+        rng = np.random.default_rng(0)
+        features = pd.DataFrame(rng.random((100, len(EXPECTED_COLUMN))), columns=EXPECTED_COLUMN)
+        self.model = RandomForestRegressor(n_estimators=3, max_depth=4, random_state=0).fit(features, rng.random(100))
+        self.work_dir = tempfile.mkdtemp()
+        self.model_path = os.path.join(self.work_dir, 'model.joblib')
+        self.database_name = os.path.join(self.work_dir, 'test.db')
+        ModelHandler().save_model(self.model, self.model_path)
+
+        self.input_data = PredictionRunner().given_input_data()
+        self.expected = self.model.predict(pd.DataFrame(PredictionRunner().encode_batch(self.input_data),
+                                                       columns=EXPECTED_COLUMN))
+
+    def run_server(self, client_coroutine, **kwargs):
+        """
+        Starts a server on a free port, runs the client coroutine against it and stops the server. The server is built
+        outside the event loop, as serve does.
+        """
+        server = PredictionServer(self.model_path, port=0, database_name=self.database_name, **kwargs)
+
+        async def run():
+            await server.start()
+            try:
+                return await client_coroutine(server.port)
+            finally:
+                await server.stop()
+        return asyncio.run(run())
+
+    def test_single_and_batch_predictions(self):
+        """
+        Test that concurrent single requests and a batch request return the model's predictions and are saved.
+        """
+        async def client(port):
+            async def predict(record):
+                async with PredictionClient(port=port) as prediction_client:
+                    return await prediction_client.predict(record)
+
+            single = await asyncio.gather(*(predict(record) for record in self.input_data))
+            async with PredictionClient(port=port) as prediction_client:
+                batch = await prediction_client.predict_batch(self.input_data)
+                status, _ = await prediction_client.request('POST', '/predict', {'longitude': 1.0})
+            return single, batch, status
+
+        single, batch, status = self.run_server(client, batch_window=0.01)
+        np.testing.assert_allclose(single, self.expected, rtol=1e-6)
+        np.testing.assert_allclose(batch, self.expected, rtol=1e-6)
+        self.assertEqual(status, 400)
+
+        saved_df = DatabaseHandler(self.database_name).load_from_database(table_name='predictions')
+        self.assertEqual(len(saved_df), 2 * len(self.input_data))
+
+    def test_invalid_content_length(self):
+        """
+        Test that a request with a malformed Content-Length gets a 400 response before the connection is closed.
+        """
+        self.assertEqual(self.run_server(self.raw_requests(
+            [b'POST /predict HTTP/1.1\r\nContent-Length: abc\r\n\r\n',
+             b'POST /predict HTTP/1.1\r\nContent-Length: -1\r\n\r\n'])), [b'400', b'400'])
+
+    def test_malformed_and_oversized_requests(self):
+        """
+        Test that a malformed request line gets a 400 response and a body over the size limit a 413 response.
+        """
+        statuses = self.run_server(self.raw_requests(
+            [b'GARBAGE\r\n\r\n', b'POST /predict HTTP/1.1\r\nContent-Length: 1025\r\n\r\n']), max_body_size=1024)
+        self.assertEqual(statuses, [b'400', b'413'])
+
+    def test_bad_batch_does_not_fail_its_neighbours(self):
+        """
+        Test that an empty batch is rejected before scoring, and that a submission failing in a coalesced predict
+        call only fails its own request.
+        """
+        async def client(port):
+            async with PredictionClient(port=port) as prediction_client:
+                return await prediction_client.request('POST', '/predict/batch', [])
+
+        self.assertEqual(self.run_server(client)[0], 400)
+
+        def predict(matrix):
+            if np.isnan(matrix).any():
+                raise ValueError('NaN in input')
+            return matrix.sum(axis=1)
+
+        async def submit_concurrently():
+            batcher = MicroBatcher(predict, window=0.01)
+            task = asyncio.create_task(batcher.run())
+            try:
+                return await asyncio.gather(batcher.submit(np.ones((2, 3), dtype=np.float32)),
+                                            batcher.submit(np.full((1, 3), np.nan, dtype=np.float32)),
+                                            return_exceptions=True)
+            finally:
+                task.cancel()
+
+        good, bad = asyncio.run(submit_concurrently())
+        np.testing.assert_array_equal(good, [3, 3])
+        self.assertIsInstance(bad, ValueError)
+
+    @staticmethod
+    def raw_requests(requests):
+        """
+        Returns a client coroutine sending every raw request on a connection of its own and collecting the status
+        codes of the responses.
+        """
+        async def client(port):
+            statuses = []
+            for request in requests:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.write(request)
+                await writer.drain()
+                statuses.append((await reader.read()).split(b' ')[1])
+                writer.close()
+                await writer.wait_closed()
+            return statuses
+        return client
+
+    def tearDown(self):
+        """
+        Clean up by closing the pooled connections and removing the temporary directory.
+        """
+        close_pools()
+        shutil.rmtree(self.work_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
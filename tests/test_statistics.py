@@ -0,0 +1,152 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.etl import DataProcessor
+from src.statistics import RunningMoments, QuantileSketch, DatasetProfile, ProfileStore
+from src.schema import NUMERIC_COLUMNS, CATEGORICAL_COLUMN, TARGET_COLUMN, read_raw_csv
+
+
+def make_raw_data(n_rows=1000, shift=0.0, seed=0):
+    """
+    Builds raw housing data with a few missing values and null sentinels; shift moves every numeric column.
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({col: rng.normal(100, 10, n_rows) + shift * 10 for col in NUMERIC_COLUMNS})
+    df['LONGITUDE'] = -df['LONGITUDE']
+    df.loc[::50, 'ROOMS'] = np.nan
+    df[CATEGORICAL_COLUMN] = rng.choice(['NEAR BAY', 'INLAND', '<1H OCEAN'], n_rows, p=[0.5, 0.3, 0.2])
+    df.loc[::100, CATEGORICAL_COLUMN] = 'Null'
+    df[TARGET_COLUMN] = rng.normal(200_000, 50_000, n_rows)
+    df['AGENCY'] = 'Agency'
+    return df
+
+
+class TestStatistics(unittest.TestCase):
+    """
+    Unit tests for the streaming statistics of src.statistics.
+    """
+
+    def setUp(self):
+        """
+        Set up the test environment with raw data written to a temporary CSV file.
+        """
+        self.data_dir = tempfile.mkdtemp()
+        self.csv_path = os.path.join(self.data_dir, 'housing.csv')
+        make_raw_data().to_csv(self.csv_path, index=False)
+        self.conn = sqlite3.connect(':memory:')
+
+    def tearDown(self):
+        """
+        Clean up the database connection and the temporary files.
+        """
+        self.conn.close()
+        os.remove(self.csv_path)
+        os.rmdir(self.data_dir)
+
+    def test_moments_merge(self):
+        """
+        Test that moments accumulated in batches and merged match NumPy on the whole data.
+        """
+        values = np.random.default_rng(1).normal(1e6, 3, 10_000)
+        moments, other = RunningMoments(), RunningMoments()
+        for batch in np.array_split(values[:7000], 7):
+            moments.update(batch)
+        other.update(values[7000:])
+        moments.merge(other)
+        moments.merge(RunningMoments())
+
+        self.assertEqual(moments.count, len(values))
+        self.assertAlmostEqual(moments.mean, values.mean(), places=6)
+        self.assertAlmostEqual(moments.variance, values.var(ddof=1), places=6)
+        self.assertEqual((moments.minimum, moments.maximum), (values.min(), values.max()))
+        self.assertEqual(RunningMoments.from_dict(moments.to_dict()).to_dict(), moments.to_dict())
+
+    def test_sketch_accuracy(self):
+        """
+        Test that quantiles of merged sketches stay within the relative accuracy of the exact quantiles.
+        """
+        values = np.random.default_rng(2).normal(0, 100, 20_000)
+        sketch, other = QuantileSketch(0.01), QuantileSketch(0.01)
+        sketch.update(values[:5000])
+        other.update(values[5000:])
+        sketch.merge(QuantileSketch.from_dict(other.to_dict()))
+
+        self.assertEqual(sketch.count, len(values))
+        for q in (0.01, 0.25, 0.5, 0.75, 0.99):
+            exact = np.quantile(values, q, method='lower')
+            self.assertLessEqual(abs(sketch.quantile(q) - exact), 0.01 * abs(exact) + 1e-9)
+        self.assertIsNone(QuantileSketch().quantile(0.5))
+        with self.assertRaises(ValueError):
+            sketch.merge(QuantileSketch(0.05))
+
+    def test_profile_chunks_merge(self):
+        """
+        Test that profiles of chunks merge into the profile of the whole file, with null rates and categories.
+        """
+        whole = DatasetProfile()
+        whole.update(read_raw_csv(self.csv_path))
+        merged = DatasetProfile()
+        for chunk in read_raw_csv(self.csv_path, chunksize=300):
+            partial = DatasetProfile()
+            partial.update(chunk)
+            merged.merge(partial)
+
+        self.assertEqual(merged.rows, 1000)
+        self.assertEqual(merged.columns['ROOMS'].nulls, 20)
+        self.assertEqual(merged.category_nulls, 10)
+        self.assertEqual(merged.categories, whole.categories)
+        self.assertEqual(sum(merged.categories.values()), 990)
+        for col, statistics in whole.columns.items():
+            self.assertEqual(merged.columns[col].sketch.to_dict(), statistics.sketch.to_dict())
+            self.assertAlmostEqual(merged.columns[col].moments.mean, statistics.moments.mean, places=6)
+        self.assertEqual(DatasetProfile.from_dict(merged.to_dict()).summary(), merged.summary())
+
+    def test_drift(self):
+        """
+        Test that a profile does not drift from itself and that shifted data and new categories are reported.
+        """
+        reference, shifted = DatasetProfile(), DatasetProfile()
+        reference.update(make_raw_data())
+        drifted = make_raw_data(shift=1.0, seed=3)
+        drifted.loc[:99, CATEGORICAL_COLUMN] = 'ISLAND'
+        shifted.update(drifted)
+
+        self.assertEqual(reference.compare(reference), [])
+        findings = {(finding['column'], finding['metric']) for finding in shifted.compare(reference)}
+        self.assertIn(('MEDIAN_AGE', 'mean'), findings)
+        self.assertIn(('MEDIAN_AGE', 'p50'), findings)
+        self.assertIn((CATEGORICAL_COLUMN, 'unseen category ISLAND'), findings)
+        self.assertNotIn((TARGET_COLUMN, 'mean'), findings)
+
+    def test_runs_are_recorded(self):
+        """
+        Test that every ETL mode records its statistics and that runs are compared against the training profile.
+        """
+        processor = DataProcessor()
+        processor.prepare_data(self.csv_path, self.conn)
+        processor.mark_training_profile(self.conn)
+        self.assertEqual(processor.stream_data(self.csv_path, self.conn, chunksize=300), 980)
+
+        make_raw_data(shift=1.0).to_csv(self.csv_path, index=False)
+        processor.incremental_data(self.csv_path, self.conn)
+
+        runs = ProfileStore(self.conn).runs('transformed_data')
+        self.assertEqual(len(runs), 3)
+        self.assertIn('mean', {finding['metric'] for finding in runs[0]['drift']})
+        self.assertEqual([run['training'] for run in runs].count(True), 1)
+        self.assertEqual(runs[-1]['summary']['dropped'], {'nan': 20, 'sentinel': 0})
+        streamed, extracted = runs[-2]['summary'], runs[-1]['summary']
+        self.assertEqual(streamed[CATEGORICAL_COLUMN], extracted[CATEGORICAL_COLUMN])
+        for col, summary in extracted['columns'].items():
+            self.assertEqual(streamed['columns'][col]['p50'], summary['p50'])
+            self.assertAlmostEqual(streamed['columns'][col]['std'], summary['std'], places=6)
+        self.assertEqual(runs[-2]['drift'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
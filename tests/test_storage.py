@@ -0,0 +1,161 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.database import DatabaseHandler, close_pools
+from src.storage import ParquetBackend, StorageBackend, expand_filters, import_pyarrow
+
+
+def make_features():
+    """
+    Builds a small frame with a numeric column and the one-hot columns of two categories.
+    """
+    return pd.DataFrame({
+        'median_income': np.arange(6, dtype=np.float32),
+        'ocean_proximity_INLAND': np.array([1, 0, 1, 0, 1, 0], dtype=np.uint8),
+        'ocean_proximity_NEAR BAY': np.array([0, 1, 0, 1, 0, 1], dtype=np.uint8),
+    })
+
+
+class TestFilters(unittest.TestCase):
+    """
+    Unit tests for the storage filters.
+    """
+
+    def test_category_filters_are_expanded(self):
+        """
+        Test that filters on the categorical input column are rewritten to its one-hot column.
+        """
+        self.assertEqual(expand_filters([('ocean_proximity', '==', 'INLAND'), ('median_income', '>', 3)]),
+                         [('ocean_proximity_INLAND', '==', 1), ('median_income', '>', 3)])
+        self.assertEqual(expand_filters([('ocean_proximity', '!=', 'INLAND')]), [('ocean_proximity_INLAND', '==', 0)])
+        with self.assertRaises(ValueError):
+            expand_filters([('ocean_proximity', '>', 'INLAND')])
+
+    def test_sqlite_projection_and_filters(self):
+        """
+        Test that the SQLite path of DatabaseHandler applies column projection and filters.
+        """
+        database_dir = tempfile.mkdtemp()
+        try:
+            handler = DatabaseHandler(os.path.join(database_dir, 'test.db'))
+            handler.bulk_load(make_features())
+            df = handler.load_from_database(columns=['median_income'], filters=[('ocean_proximity', '==', 'INLAND')])
+            self.assertListEqual(df['median_income'].tolist(), [0.0, 2.0, 4.0])
+
+            matrix = handler.load_matrix(['median_income', 'ocean_proximity_INLAND'],
+                                         filters=[('median_income', 'in', [1, 2])])
+            np.testing.assert_array_equal(matrix, np.array([[1, 0], [2, 1]], dtype=np.float32))
+        finally:
+            close_pools()
+            shutil.rmtree(database_dir)
+
+
+@unittest.skipIf(not import_pyarrow(), 'pyarrow is not installed')
+class TestParquetBackend(unittest.TestCase):
+    """
+    Unit tests for the ParquetBackend class and DatabaseHandler delegating to it.
+    """
+
+    def setUp(self):
+        """
+        Set up the test environment with a temporary storage directory and a handler using it.
+        """
+        self.storage_dir = tempfile.mkdtemp()
+        self.storage = ParquetBackend(self.storage_dir, row_group_size=2)
+        self.handler = DatabaseHandler(os.path.join(self.storage_dir, 'test.db'), storage=self.storage)
+        self.df = make_features()
+
+    def tearDown(self):
+        """
+        Clean up the temporary storage directory.
+        """
+        close_pools()
+        shutil.rmtree(self.storage_dir)
+
+    def test_write_and_read(self):
+        """
+        Test that a table round-trips with its dtypes, and that replace and append behave like the SQLite path.
+        """
+        self.handler.bulk_load(self.df)
+        pd.testing.assert_frame_equal(self.handler.load_from_database(), self.df)
+
+        self.handler.save_to_database(self.df, if_exists='append')
+        self.assertEqual(len(self.handler.load_from_database()), 12)
+        self.handler.bulk_load(self.df)
+        self.assertEqual(len(self.handler.load_from_database()), 6)
+
+        with self.assertRaises(Exception):
+            self.handler.bulk_load(self.df[['median_income']], if_exists='append')
+
+    def test_projection_filters_and_numpy(self):
+        """
+        Test that only the requested columns of matching rows are read, also into a NumPy matrix.
+        """
+        self.handler.bulk_load(self.df)
+        df = self.handler.load_from_database(columns=['median_income'],
+                                             filters=[('ocean_proximity', '==', 'NEAR BAY'), ('median_income', '<', 5)])
+        self.assertListEqual(list(df.columns), ['median_income'])
+        self.assertListEqual(df['median_income'].tolist(), [1.0, 3.0])
+
+        matrix = self.handler.load_matrix(['median_income', 'ocean_proximity_INLAND'])
+        self.assertEqual(matrix.dtype, np.float32)
+        self.assertTrue(matrix.flags['C_CONTIGUOUS'])
+        np.testing.assert_array_equal(matrix[:, 0], self.df['median_income'])
+
+    def test_numpy_matrix_across_files_and_nulls(self):
+        """
+        Test that a matrix is assembled from every file and row group of a table, with NaN for nulls.
+        """
+        missing_df = self.df.assign(median_income=np.full(len(self.df), np.nan, dtype=np.float32))
+        self.handler.bulk_load(self.df)
+        self.handler.save_to_database(missing_df, if_exists='append')
+
+        matrix = self.handler.load_matrix(['median_income', 'ocean_proximity_NEAR BAY'], dtype=np.float64)
+        expected = pd.concat([self.df, missing_df])
+        np.testing.assert_array_equal(matrix, expected[['median_income', 'ocean_proximity_NEAR BAY']].to_numpy())
+
+    def test_backends_implement_the_interface(self):
+        """
+        Test that a backend missing part of the StorageBackend interface cannot be created.
+        """
+        class PartialBackend(StorageBackend):
+            def exists(self, table_name):
+                return False
+
+        with self.assertRaises(TypeError):
+            PartialBackend()
+
+    def test_iter_chunks_resumes_after_rowid(self):
+        """
+        Test that chunks are numbered in insertion order across files and can resume after a row.
+        """
+        self.handler.bulk_load(self.df)
+        self.handler.bulk_load(self.df, if_exists='append')
+
+        chunks = list(self.handler.iter_chunks(['median_income'], chunksize=4, after_rowid=5))
+        rowids = np.concatenate([chunk['source_rowid'] for chunk in chunks])
+        np.testing.assert_array_equal(rowids, np.arange(6, 13))
+        self.assertEqual(chunks[0]['median_income'].iloc[0], 5.0)
+        self.assertEqual(self.handler.max_value('median_income'), 5.0)
+
+        self.handler.drop_table()
+        self.assertEqual(self.handler.max_value('median_income', default=-1), -1)
+        self.assertListEqual(list(self.handler.iter_chunks(['median_income'])), [])
+
+    def test_predictions_are_appended(self):
+        """
+        Test that prediction batches are appended to the predictions table.
+        """
+        predictions = pd.DataFrame({'Predicted_Value': [1.0, 2.0]})
+        self.handler.save_predictions_to_database([predictions, predictions])
+        self.handler.save_predictions_to_database(predictions)
+        self.assertEqual(len(self.handler.load_from_database(table_name='predictions')), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from src.model import ModelHandler
+from src.tuning import HyperparameterSearch, data_hash
+
+PARAM_GRID = {'n_estimators': [3], 'max_depth': [1, 2, 4, 6]}
+CONFIG = {'cv_folds': 2, 'n_jobs': 1, 'halving_factor': 2, 'min_samples': 50}
+
+
+def make_data(n_rows=200):
+    """
+    Builds a small regression problem whose target grows with the first feature.
+    """
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.random((n_rows, 3)), columns=['a', 'b', 'c'])
+    y = 100 * X['a'] + rng.random(n_rows)
+    return X, y
+
+
+class TestHyperparameterSearch(unittest.TestCase):
+    """
+    Unit tests for the HyperparameterSearch class.
+    """
+
+    def setUp(self):
+        """
+        Set up the test environment with a temporary cache directory.
+        """
+        self.cache_dir = tempfile.mkdtemp()
+        self.X, self.y = make_data()
+
+    def tearDown(self):
+        """
+        Clean up the temporary cache directory.
+        """
+        shutil.rmtree(self.cache_dir)
+
+    def make_search(self, param_grid=PARAM_GRID):
+        """
+        Returns a random forest search over the given grid using the temporary cache.
+        """
+        return HyperparameterSearch('random_forest', param_grid, CONFIG, self.cache_dir)
+
+    def test_grid_search(self):
+        """
+        Test that every candidate is cross-validated and the best one is the deepest tree on this data.
+        """
+        summary = self.make_search().run(self.X, self.y)
+        self.assertEqual(len(summary['results']), 4)
+        self.assertEqual(summary['fitted_folds'], 8)
+        self.assertEqual(summary['best_params']['max_depth'], 6)
+        self.assertEqual(summary['best_mae'], min(result['mae_mean'] for result in summary['results']))
+
+    def test_cached_folds_are_not_refitted(self):
+        """
+        Test that a rerun reads every fold from the cache and that an extended grid only fits the new candidates.
+        """
+        first = self.make_search().run(self.X, self.y)
+        with patch('src.tuning.fit_fold', side_effect=AssertionError('fold refitted')):
+            second = self.make_search().run(self.X, self.y)
+        self.assertEqual(second['cached_folds'], 8)
+        self.assertEqual(second['best_params'], first['best_params'])
+
+        extended = self.make_search({**PARAM_GRID, 'max_depth': [1, 2, 4, 6, 8]}).run(self.X, self.y)
+        self.assertEqual((extended['fitted_folds'], extended['cached_folds']), (2, 8))
+
+        self.y.iloc[0] += 1
+        self.assertEqual(self.make_search().run(self.X, self.y)['fitted_folds'], 8)
+
+    def test_trial_key_covers_base_parameters(self):
+        """
+        Test that the trial key changes with the TRAINING_CONFIG defaults the candidate is merged with and with the
+        scikit-learn version.
+        """
+        search = self.make_search()
+        key = search.trial_key('digest', {'max_depth': 2}, 100, 0)
+        with patch.dict('src.tuning.TRAINING_CONFIG', {'random_forest': {'min_samples_leaf': 5}}):
+            self.assertNotEqual(search.trial_key('digest', {'max_depth': 2}, 100, 0), key)
+        with patch('src.tuning.sklearn.__version__', '0.0'):
+            self.assertNotEqual(search.trial_key('digest', {'max_depth': 2}, 100, 0), key)
+        self.assertEqual(search.trial_key('digest', {'max_depth': 2}, 100, 0), key)
+
+    def test_successive_halving(self):
+        """
+        Test that each round keeps half of the candidates and doubles their rows.
+        """
+        search = self.make_search()
+        results = search.run(self.X, self.y, search='halving')['results']
+        self.assertListEqual([result['n_samples'] for result in results], [50] * 4 + [100] * 2 + [200])
+        self.assertEqual(search.best_params, results[-1]['params'])
+
+        with self.assertRaises(ValueError):
+            search.run(self.X, self.y, search='random')
+
+    def test_fit_best_saves_model(self):
+        """
+        Test that the best candidate is fitted on all rows and saved through ModelHandler.
+        """
+        search = self.make_search()
+        with self.assertRaises(ValueError):
+            search.fit_best(self.X, self.y)
+        search.run(self.X, self.y)
+
+        model_path = os.path.join(self.cache_dir, 'models', 'model.joblib')
+        model = search.fit_best(self.X, self.y, model_path)
+        loaded = ModelHandler().load_model(model_path)
+        self.assertEqual(loaded.max_depth, search.best_params['max_depth'])
+        np.testing.assert_allclose(ModelHandler().predict(self.X, loaded), ModelHandler().predict(self.X, model))
+
+    def test_data_hash(self):
+        """
+        Test that the data hash changes with the values and the column names.
+        """
+        self.assertEqual(data_hash(self.X, self.y), data_hash(self.X.copy(), self.y.copy()))
+        self.assertNotEqual(data_hash(self.X, self.y), data_hash(self.X.rename(columns={'a': 'd'}), self.y))
+        self.assertNotEqual(data_hash(self.X, self.y), data_hash(self.X, self.y + 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from src.database import DatabaseHandler, close_pools
+from src.writer import PredictionWriter
+
+
+def wait_for(condition, timeout=5):
+    """
+    Polls a condition until it holds or the timeout expires, and returns its last value.
+    """
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+class TestPredictionWriter(unittest.TestCase):
+    """
+    Unit tests for the PredictionWriter class.
+    """
+
+    def setUp(self):
+        """
+        Set up the test environment with a database file in a temporary directory.
+        """
+        self.database_dir = tempfile.mkdtemp()
+        self.database_name = os.path.join(self.database_dir, 'test.db')
+        self.handler = DatabaseHandler(self.database_name)
+
+    def saved(self):
+        """
+        Returns the predictions table, or an empty frame when it does not exist yet.
+        """
+        if not self.handler.row_count(table_name='predictions'):
+            return pd.DataFrame()
+        return self.handler.load_from_database(table_name='predictions')
+
+    def test_batches_are_coalesced_and_stamped(self):
+        """
+        Test that queued batches are written in one transaction with their model version and timestamp.
+        """
+        with PredictionWriter(self.database_name, flush_interval=60) as writer:
+            for i in range(10):
+                writer.put(np.full(3, float(i)), version='v1')
+            self.assertTrue(self.saved().empty)
+            writer.flush()
+            self.assertEqual(writer.stats, {'batches': 10, 'rows': 30, 'writes': 1, 'failed_rows': 0})
+
+        saved_df = self.saved()
+        self.assertListEqual(list(saved_df.columns), ['Predicted_Value', 'model_version', 'predicted_at'])
+        np.testing.assert_array_equal(saved_df['Predicted_Value'], np.repeat(np.arange(10.0), 3))
+        self.assertEqual(set(saved_df['model_version']), {'v1'})
+        self.assertTrue(pd.to_datetime(saved_df['predicted_at']).notna().all())
+
+    def test_size_and_time_thresholds(self):
+        """
+        Test that pending batches are written once enough rows are queued, or once the oldest has waited long enough.
+        """
+        with PredictionWriter(self.database_name, flush_rows=5, flush_interval=60) as writer:
+            writer.put(np.zeros(3))
+            writer.put(np.zeros(3))
+            self.assertTrue(wait_for(lambda: writer.stats['rows'] == 6))
+
+        with PredictionWriter(self.database_name, flush_interval=0.05) as writer:
+            writer.put(np.zeros(2))
+            self.assertTrue(wait_for(lambda: writer.stats['rows'] == 2))
+        self.assertEqual(len(self.saved()), 8)
+
+    def test_backpressure_and_shutdown(self):
+        """
+        Test that put blocks while the queue is full and that close writes every queued batch.
+        """
+        database_busy = threading.Event()
+        save = DatabaseHandler.save_predictions_to_database
+
+        def slow_save(handler, *args, **kwargs):
+            database_busy.wait()
+            return save(handler, *args, **kwargs)
+
+        with mock.patch.object(DatabaseHandler, 'save_predictions_to_database', slow_save):
+            writer = PredictionWriter(self.database_name, max_queue_size=2, flush_rows=1)
+            writer.put(np.zeros(1))
+            self.assertTrue(wait_for(lambda: writer.queue.qsize() == 0))
+            writer.put(np.zeros(1))
+            writer.put(np.zeros(1))
+            with self.assertRaises(queue.Full):
+                writer.put(np.zeros(1), timeout=0.05)
+
+            database_busy.set()
+            writer.close()
+        self.assertEqual(len(self.saved()), 3)
+        with self.assertRaises(ValueError):
+            writer.put(np.zeros(1))
+
+    def test_close_while_producing(self):
+        """
+        Test that every batch accepted while the writer closes is written, and that flush returns once it is closed.
+        """
+        writer = PredictionWriter(self.database_name, flush_rows=10)
+        accepted = []
+
+        def produce():
+            try:
+                while True:
+                    writer.put(np.zeros(1))
+                    accepted.append(1)
+            except ValueError:
+                pass
+
+        producers = [threading.Thread(target=produce) for _ in range(4)]
+        for producer in producers:
+            producer.start()
+        self.assertTrue(wait_for(lambda: len(accepted) > 100))
+        writer.close()
+        for producer in producers:
+            producer.join()
+
+        flushing = threading.Thread(target=writer.flush, daemon=True)
+        flushing.start()
+        flushing.join(timeout=5)
+        self.assertFalse(flushing.is_alive())
+        self.assertEqual(len(self.saved()), len(accepted))
+
+    def test_write_errors_surface_on_close(self):
+        """
+        Test that a failed write is reported by close instead of being lost.
+        """
+        writer = PredictionWriter(self.database_name)
+        with mock.patch.object(DatabaseHandler, 'save_predictions_to_database', side_effect=Exception('disk full')):
+            writer.put(np.zeros(4))
+            with self.assertRaises(Exception):
+                writer.close()
+        self.assertEqual(writer.stats['failed_rows'], 4)
+
+    def test_existing_table_is_migrated(self):
+        """
+        Test that a predictions table written before versions were recorded gets the new columns.
+        """
+        self.handler.save_predictions_to_database(pd.DataFrame({'Predicted_Value': [1.0, 2.0]}))
+        with PredictionWriter(self.database_name) as writer:
+            writer.put(np.array([3.0]), version='v2')
+
+        saved_df = self.saved()
+        self.assertListEqual(list(saved_df['Predicted_Value']), [1.0, 2.0, 3.0])
+        self.assertListEqual(saved_df['model_version'].isna().tolist(), [True, True, False])
+        self.assertEqual(saved_df['model_version'].iloc[2], 'v2')
+
+    def tearDown(self):
+        """
+        Clean up by closing the pooled connections and removing the database directory.
+        """
+        close_pools()
+        shutil.rmtree(self.database_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()